@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, UserProfile
+from .models import ApiToken, CustomUser, UserProfile
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
@@ -12,4 +12,15 @@ class CustomUserAdmin(UserAdmin):
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'website']
-    search_fields = ['user__username', 'user__email']
\ No newline at end of file
+    search_fields = ['user__username', 'user__email']
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'prefix', 'is_active', 'created_at', 'last_used_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'prefix', 'user__username']
+    # Token wydawany jest komendą create_api_token - w panelu tylko podgląd i wyłączanie
+    readonly_fields = ['user', 'prefix', 'key_hash', 'created_at', 'last_used_at']
+    
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,368 @@
+"""
+API detekcji dla klientów maszynowych
+
+Uwierzytelnianie tokenem (nagłówek "Authorization: Token <klucz>") zamiast
+sesji, jeden lub wiele obrazów w jednym żądaniu i wyniki w formacie
+wybranym nagłówkiem Accept:
+
+    application/json     - lista obrazów z listą obiektów (domyślnie)
+    application/x-npz    - tablice NumPy (np.load), bez serializacji pickle
+    application/msgpack  - MessagePack z tablicami jako surowymi bajtami
+
+Obraz z naniesionymi wykryciami nie jest generowany, chyba że klient poprosi
+o niego parametrem annotated=1.
+"""
+import base64
+import io
+import json
+import logging
+import os
+from datetime import timedelta
+from functools import wraps
+
+import numpy as np
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+
+from . import dedup, rendering
+from .detected_objects import replace_objects
+from .labels import COCO_CLASSES
+from .metrics import metrics
+from .models import ApiToken, DetectionImage
+from .uploads import check_image, check_upload_size
+
+logger = logging.getLogger(__name__)
+
+API_IMAGES = metrics.counter(
+    'detection_api_images_total', 'Obrazy przetworzone przez API według formatu odpowiedzi i wyniku'
+)
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'npz': 'application/x-npz',
+    'msgpack': 'application/msgpack',
+}
+_ACCEPT_FORMATS = {
+    'application/json': 'json',
+    'application/x-npz': 'npz',
+    'application/msgpack': 'msgpack',
+    'application/x-msgpack': 'msgpack',
+    'application/*': 'json',
+    '*/*': 'json',
+}
+# Zapis last_used_at najwyżej raz na minutę na token
+LAST_USED_INTERVAL = timedelta(minutes=1)
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def get_options():
+    options = {
+        'max_images': 32,
+        'max_upload_size': settings.DETECTION_MAX_UPLOAD_SIZE,
+    }
+    options.update(getattr(settings, 'DETECTION_API', {}))
+    return options
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def authenticate(request):
+    """
+    Aktywny token z nagłówka Authorization ("Token" lub "Bearer"); None gdy brak
+    """
+    scheme, _, key = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if scheme.lower() not in ('token', 'bearer') or not key.strip():
+        return None
+    token = (
+        ApiToken.objects
+        .select_related('user')
+        .filter(key_hash=ApiToken.hash_key(key.strip()), is_active=True, user__is_active=True)
+        .first()
+    )
+    if token is not None:
+        now = timezone.now()
+        if token.last_used_at is None or now - token.last_used_at > LAST_USED_INTERVAL:
+            ApiToken.objects.filter(pk=token.pk).update(last_used_at=now)
+    return token
+
+
+def token_required(view):
+    """
+    Widok API: uwierzytelnienie tokenem, bez sesji i ochrony CSRF
+    """
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = authenticate(request)
+        if token is None:
+            response = JsonResponse({'error': 'Brak lub niepoprawny token API'}, status=401)
+            response['WWW-Authenticate'] = 'Token'
+            return response
+        request.user = token.user
+        request.api_token = token
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def negotiate(accept):
+    """
+    Format odpowiedzi z nagłówka Accept (z uwzględnieniem q); None gdy żaden
+    obsługiwany format nie jest akceptowany
+    """
+    if not accept:
+        return 'json'
+    candidates = []
+    for position, item in enumerate(accept.split(',')):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        fmt = _ACCEPT_FORMATS.get(media_type.lower())
+        if fmt == 'msgpack' and _msgpack() is None:
+            continue
+        if fmt and quality > 0:
+            candidates.append((-quality, position, fmt))
+    return min(candidates)[2] if candidates else None
+
+
+def _parse_threshold(value):
+    if value in (None, ''):
+        return settings.DETECTION_CONFIDENCE_THRESHOLD
+    try:
+        threshold = float(value)
+    except ValueError:
+        raise ApiError("Parametr threshold musi być liczbą")
+    if not 0.0 < threshold <= 1.0:
+        raise ApiError("Parametr threshold musi należeć do przedziału (0, 1]")
+    return threshold
+
+
+def _parse_model(value):
+    from .forms import available_models
+
+    if not value:
+        return settings.DETECTION_DEFAULT_MODEL
+    if value not in dict(available_models()):
+        raise ApiError(f"Nieznany model: {value}")
+    return value
+
+
+def _validate(uploaded_file, options):
+    check_upload_size(uploaded_file, options['max_upload_size'])
+    check_image(uploaded_file)
+
+
+def detect_uploads(user, files, model_name=None, threshold=None, annotated=False):
+    """
+    Detekcja dla listy przesłanych plików wykonywana w żądaniu (wspólna
+    inferencja dla całej listy); zwraca wyniki w kolejności plików
+    """
+    from .pipeline import run_detection_batch
+
+    options = get_options()
+    if not files:
+        raise ApiError("Brak obrazów (pole 'image')")
+    if len(files) > options['max_images']:
+        raise ApiError(f"Można przesłać maksymalnie {options['max_images']} obrazów naraz", status=413)
+    model_name = _parse_model(model_name)
+    threshold = _parse_threshold(threshold)
+
+    entries = []
+    for uploaded_file in files:
+        entry = {'name': uploaded_file.name, 'image': None, 'error': ''}
+        entries.append(entry)
+        try:
+            _validate(uploaded_file, options)
+        except ValueError as e:
+            entry['error'] = str(e)
+            continue
+
+        # Wiersz ze statusem 'running' - worker kolejki go nie przejmie
+        detection_image = DetectionImage(
+            user=user,
+            original_image=uploaded_file,
+            original_filename=os.path.basename(uploaded_file.name),
+            content_hash=getattr(uploaded_file, 'content_hash', None) or dedup.hash_upload(uploaded_file),
+            model_name=model_name,
+            confidence_threshold=threshold,
+            status=DetectionImage.STATUS_RUNNING,
+            started_at=timezone.now(),
+        )
+        dedup.share_original(detection_image)
+        dedup.reuse_result(detection_image)
+        detection_image.save()
+        entry['image'] = detection_image
+
+    images = [entry['image'] for entry in entries if entry['image'] is not None]
+    reused = [image for image in images if image.result_reused]
+    if reused:
+        replace_objects(reused)
+    pending = [image for image in images if not image.result_reused]
+    try:
+        outcomes = run_detection_batch(pending) if pending else []
+    except Exception as e:
+        # Błąd modelu (inferencja wspólna dla paczki) - wiersze nie mogą
+        # zostać w stanie 'running' do następnego requeue_stale
+        logger.exception("Błąd detekcji w żądaniu API")
+        DetectionImage.objects.filter(id__in=[image.id for image in pending]).update(
+            status=DetectionImage.STATUS_FAILED, error_message=str(e), processed_at=timezone.now()
+        )
+        raise ApiError(f"Błąd detekcji: {e}", status=500)
+    for detection_image, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            detection_image.status = DetectionImage.STATUS_FAILED
+            detection_image.error_message = str(outcome)
+            detection_image.processed_at = timezone.now()
+            detection_image.save(update_fields=['status', 'error_message', 'processed_at'])
+
+    return [_result(entry, annotated) for entry in entries]
+
+
+def _result(entry, annotated, variant=''):
+    detection_image = entry['image']
+    result = {
+        'name': entry['name'],
+        'id': None,
+        'status': DetectionImage.STATUS_FAILED,
+        'error': entry['error'],
+        'reused': False,
+        'image_size': [0, 0],
+        'processing_time': 0.0,
+        'class_id': np.zeros(0, dtype=np.int32),
+        'score': np.zeros(0, dtype=np.float32),
+        'box': np.zeros((0, 4), dtype=np.float32),
+        'annotated': None,
+    }
+    if detection_image is None:
+        return result
+
+    objects = detection_image.detection_results.get('objects', [])
+    result.update({
+        'id': detection_image.id,
+        'status': detection_image.status,
+        'error': detection_image.error_message,
+        'reused': detection_image.result_reused,
+        'image_size': list(detection_image.detection_results.get('image_size', [0, 0])),
+        'processing_time': detection_image.processing_time,
+        'class_id': np.array([obj['class_id'] for obj in objects], dtype=np.int32),
+        'score': np.array([obj['confidence'] for obj in objects], dtype=np.float32),
+        'box': np.array([obj['bbox'] for obj in objects], dtype=np.float32).reshape(-1, 4),
+    })
+    if annotated and detection_image.status == DetectionImage.STATUS_DONE:
+        result['annotated'], _ = rendering.get_rendered(detection_image, variant=variant)
+    return result
+
+
+def stored_result(detection_image, annotated=False, variant=''):
+    """
+    Wynik zapisanego przetworzenia w postaci zwracanej przez detect_uploads
+    (variant - podgląd z innym progiem, wyniki już podmienione w obiekcie)
+    """
+    return _result(
+        {'name': detection_image.display_name, 'image': detection_image, 'error': ''}, annotated, variant
+    )
+
+
+def to_json(results):
+    images = []
+    for result in results:
+        images.append({
+            'id': result['id'],
+            'name': result['name'],
+            'status': result['status'],
+            'error': result['error'],
+            'reused': result['reused'],
+            'image_size': result['image_size'],
+            'processing_time': result['processing_time'],
+            'objects': [
+                {
+                    'class_id': int(class_id),
+                    'class_name': COCO_CLASSES.get(int(class_id), 'unknown'),
+                    'confidence': float(score),
+                    'bbox': box.tolist(),
+                }
+                for class_id, score, box in zip(result['class_id'], result['score'], result['box'])
+            ],
+            'annotated': base64.b64encode(result['annotated']).decode() if result['annotated'] else None,
+        })
+    return json.dumps({'images': images}).encode()
+
+
+def to_npz(results):
+    """
+    Tablice na obraz (id, name, status, ...) i połączone wykrycia z indeksem
+    obrazu w polu 'image'; obrazy z wykryciami jako annotated_<indeks>
+    """
+    counts = [len(result['class_id']) for result in results]
+    arrays = {
+        'id': np.array([result['id'] or 0 for result in results], dtype=np.int64),
+        'name': np.array([result['name'] for result in results], dtype=np.str_),
+        'status': np.array([result['status'] for result in results], dtype=np.str_),
+        'error': np.array([result['error'] for result in results], dtype=np.str_),
+        'reused': np.array([result['reused'] for result in results], dtype=bool),
+        'image_size': np.array([result['image_size'] for result in results], dtype=np.int32).reshape(-1, 2),
+        'processing_time': np.array([result['processing_time'] for result in results], dtype=np.float32),
+        'image': np.repeat(np.arange(len(results), dtype=np.int32), counts),
+        'class_id': np.concatenate([result['class_id'] for result in results]),
+        'score': np.concatenate([result['score'] for result in results]),
+        'box': np.concatenate([result['box'] for result in results]),
+    }
+    for index, result in enumerate(results):
+        if result['annotated']:
+            arrays[f'annotated_{index}'] = np.frombuffer(result['annotated'], dtype=np.uint8)
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def to_msgpack(results):
+    """
+    Wykrycia jako surowe bajty little-endian: class_id int32, score float32,
+    box float32 (N x 4)
+    """
+    images = []
+    for result in results:
+        images.append({
+            'id': result['id'],
+            'name': result['name'],
+            'status': result['status'],
+            'error': result['error'],
+            'reused': result['reused'],
+            'image_size': result['image_size'],
+            'processing_time': result['processing_time'],
+            'count': len(result['class_id']),
+            'class_id': result['class_id'].astype('<i4').tobytes(),
+            'score': result['score'].astype('<f4').tobytes(),
+            'box': result['box'].astype('<f4').tobytes(),
+            'annotated': result['annotated'],
+        })
+    return _msgpack().packb({'images': images}, use_bin_type=True)
+
+
+SERIALIZERS = {'json': to_json, 'npz': to_npz, 'msgpack': to_msgpack}
+
+
+def serialize(results, fmt):
+    for result in results:
+        API_IMAGES.inc(format=fmt, status=result['status'])
+    response = HttpResponse(SERIALIZERS[fmt](results), content_type=CONTENT_TYPES[fmt])
+    response['Vary'] = 'Accept'
+    return response
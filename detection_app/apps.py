@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class DetectionAppConfig(AppConfig):
+    name = 'detection_app'
+
+    def ready(self):
+        # Sygnały liczników odwołań do plików magazynu
+        from . import blobs  # noqa: F401
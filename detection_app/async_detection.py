@@ -0,0 +1,225 @@
+"""
+Asynchroniczne widoki detekcji: ograniczona pula wątków i strumień postępu
+
+Pod ASGI widoki async nie zajmują wątku na czas oczekiwania - inferencja
+(praca CPU) trafia do puli o stałej liczbie wątków z limitem oczekujących
+zadań, zapytania ORM wykonywane są przez wersje async (aget, acount), a
+postęp zadania wysyłany jest do przeglądarki jako Server-Sent Events zamiast
+odpytywania endpointu statusu.
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+
+from . import jobs
+from .metrics import metrics
+from .models import DetectionImage
+
+STATUS_FIELDS = ('id', 'user_id', 'status', 'objects_detected', 'processing_time', 'error_message')
+
+
+class ExecutorBusy(Exception):
+    """
+    Pula osiągnęła limit oczekujących zadań
+    """
+
+
+def get_options():
+    options = {
+        # Wątki wykonujące inferencję dla widoków (tryb bez workera)
+        'executor_workers': 2,
+        # Zadania przyjęte ponad tę liczbę są odrzucane (ExecutorBusy)
+        'max_pending': 16,
+        'poll_interval': 0.5,
+        # Maksymalny czas jednego strumienia postępu w sekundach
+        'stream_timeout': 300,
+        # Komentarz SSE co tyle sekund utrzymuje połączenie przez proxy
+        'heartbeat': 15,
+    }
+    options.update(getattr(settings, 'DETECTION_ASYNC_VIEWS', {}))
+    return options
+
+
+class InferenceExecutor:
+    """
+    Pula wątków z ograniczoną liczbą zadań oczekujących i wykonywanych
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='detection-async')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def submit(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusy("Zbyt wiele zadań detekcji w toku")
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(function, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def pending(self):
+        return self._pending
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            options = get_options()
+            _executor = InferenceExecutor(options['executor_workers'], options['max_pending'])
+        return _executor
+
+
+metrics.gauge(
+    'detection_async_pending', 'Zadania w puli wątków widoków asynchronicznych',
+    function=lambda: _executor.pending() if _executor is not None else 0,
+)
+
+
+def _run_claimed(image_id):
+    """
+    Detekcja w wątku puli; None, gdy zadanie przejął już ktoś inny
+    """
+    try:
+        # Bez workera kolejki porzucone zadania przywraca pula widoków
+        jobs.requeue_stale_periodically()
+        detection_image = jobs.claim(image_id)
+        if detection_image is None:
+            return None
+        return jobs.process_job(detection_image)
+    finally:
+        close_old_connections()
+
+
+def start_detection(image_id):
+    """
+    Zlecenie detekcji w puli, o ile obrazów nie przetwarza worker kolejki
+    (DETECTION_ASYNC = False); zwraca future albo None
+    """
+    if settings.DETECTION_ASYNC:
+        return None
+    return get_executor().submit(_run_claimed, image_id)
+
+
+def _authenticated(request):
+    # Leniwy request.user odpytuje bazę - tylko poza pętlą zdarzeń
+    return request.user.is_authenticated
+
+
+def async_login_required(view):
+    """
+    Odpowiednik login_required dla widoków async
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(_authenticated)(request):
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def status_payload(detection_image):
+    return {
+        'id': detection_image.id,
+        'status': detection_image.status,
+        'finished': detection_image.is_finished,
+        'objects_detected': detection_image.objects_detected,
+        'processing_time': detection_image.processing_time,
+        'error': detection_image.error_message,
+    }
+
+
+async def get_status(image_id, user):
+    """
+    Stan zadania (DetectionImage.DoesNotExist dla cudzego lub usuniętego obrazu)
+    """
+    detection_image = await DetectionImage.objects.only(*STATUS_FIELDS).aget(id=image_id, user=user)
+    payload = status_payload(detection_image)
+    if detection_image.status == DetectionImage.STATUS_QUEUED:
+        payload['queue_position'] = await DetectionImage.objects.filter(
+            status=DetectionImage.STATUS_QUEUED, id__lt=image_id
+        ).acount()
+    return payload
+
+
+def sse_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def _result_payload(image_id, status):
+    detection_image = await DetectionImage.objects.only('id', 'detection_results').aget(id=image_id)
+    return {
+        **status,
+        'objects': (detection_image.detection_results or {}).get('objects', []),
+        'results_url': reverse('object_detection_process', args=[image_id]),
+    }
+
+
+async def progress_events(image_id, user):
+    """
+    Strumień SSE: zdarzenie 'status' przy każdej zmianie stanu i 'result' z
+    wykryciami po zakończeniu (albo 'timeout' po stream_timeout sekundach)
+    """
+    options = get_options()
+    started = last_sent = time.monotonic()
+    last_status = None
+    submitted = False
+    while True:
+        try:
+            status = await get_status(image_id, user)
+        except DetectionImage.DoesNotExist:
+            yield sse_event('error', {'id': image_id, 'error': 'Obraz nie istnieje'})
+            return
+
+        # Bez workera zadanie zlecane jest puli (ponownie, gdy była pełna)
+        if status['status'] == DetectionImage.STATUS_QUEUED and not submitted:
+            try:
+                start_detection(image_id)
+                submitted = True
+            except ExecutorBusy:
+                pass
+
+        now = time.monotonic()
+        if status != last_status:
+            yield sse_event('status', status)
+            last_status, last_sent = status, now
+        if status['finished']:
+            yield sse_event('result', await _result_payload(image_id, status))
+            return
+        if now - started > options['stream_timeout']:
+            yield sse_event('timeout', status)
+            return
+        if now - last_sent > options['heartbeat']:
+            yield ': ping\n\n'
+            last_sent = now
+        await asyncio.sleep(options['poll_interval'])
+
+
+def event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx nie buforuje strumienia
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,212 @@
+"""
+Wymienne środowiska uruchomieniowe detektora
+
+Każdy backend ładuje model z lokalnego pliku i zwraca z detect_batch ten sam
+słownik tablic NumPy co ObjectDetector:
+
+    detection_boxes    float32 (N, K, 4) - [ymin, xmin, ymax, xmax] w [0, 1]
+    detection_scores   float32 (N, K)
+    detection_classes  float32 (N, K)    - identyfikatory COCO (od 1)
+    num_detections     float32 (N,)
+
+dzięki czemu postprocess, batching i potok nie zależą od backendu. Backend
+wybierany jest kluczem 'backend' w settings.DETECTION_MODELS.
+"""
+import os
+import threading
+
+import cv2
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+
+OUTPUT_KEYS = ('detection_boxes', 'detection_scores', 'detection_classes', 'num_detections')
+
+
+class DetectorBackend:
+    """
+    Wspólny interfejs backendów: detect_batch i warmup
+    """
+    name = None
+
+    def __init__(self, path, **options):
+        if not os.path.exists(path):
+            raise ImproperlyConfigured(f"Brak pliku modelu: {path}")
+        self.path = path
+        self.options = options
+        # Przesunięcie indeksów klas - modele TFLite numerują klasy COCO od 0
+        self.class_offset = options.get('class_offset', 0)
+
+    def detect_batch(self, images):
+        raise NotImplementedError
+
+    def warmup(self, input_size=(320, 320)):
+        height, width = input_size
+        self.detect_batch(np.zeros((1, height, width, 3), dtype=np.uint8))
+
+    def _normalize(self, boxes, scores, classes, num_detections=None):
+        boxes = np.asarray(boxes, dtype=np.float32)
+        scores = np.asarray(scores, dtype=np.float32)
+        classes = np.asarray(classes, dtype=np.float32) + self.class_offset
+        if num_detections is None:
+            num_detections = np.full(len(scores), scores.shape[1], dtype=np.float32)
+        return {
+            'detection_boxes': boxes,
+            'detection_scores': scores,
+            'detection_classes': classes,
+            'num_detections': np.asarray(num_detections, dtype=np.float32).reshape(-1),
+        }
+
+
+class SavedModelBackend(DetectorBackend):
+    """
+    Katalog TensorFlow SavedModel (eksport TF2 Object Detection API)
+    """
+    name = 'saved_model'
+
+    def __init__(self, path, **options):
+        super().__init__(path, **options)
+        import tensorflow as tf
+
+        self._tf = tf
+        model = tf.saved_model.load(path)
+        signatures = getattr(model, 'signatures', {})
+        self._model = model
+        self._signature = signatures.get('serving_default') if signatures else None
+
+    def detect_batch(self, images):
+        tensor = self._tf.convert_to_tensor(images, dtype=self._tf.uint8)
+        if self._signature is not None:
+            (input_name,) = self._signature.structured_input_signature[1].keys()
+            results = self._signature(**{input_name: tensor})
+        else:
+            results = self._model(tensor)
+        return self._normalize(*(results[key].numpy() for key in OUTPUT_KEYS))
+
+
+class TFLiteBackend(DetectorBackend):
+    """
+    Interpreter TFLite z delegatem XNNPACK i konfigurowalną liczbą wątków
+
+    Obsługuje modele SSD z operacją TFLite_Detection_PostProcess (wyjścia:
+    ramki, klasy, pewności, liczba wykryć). Interpreter ma stały rozmiar
+    paczki 1, więc obrazy paczki wykonywane są kolejno.
+    """
+    name = 'tflite'
+
+    # Kolejność wyjść operacji TFLite_Detection_PostProcess
+    DEFAULT_OUTPUTS = {'boxes': 0, 'classes': 1, 'scores': 2, 'num_detections': 3}
+
+    def __init__(self, path, num_threads=None, use_xnnpack=True, **options):
+        options.setdefault('class_offset', 1)
+        super().__init__(path, **options)
+        try:
+            from tflite_runtime import interpreter as tflite
+        except ImportError:
+            import tensorflow.lite as tflite
+
+        kwargs = {'model_path': path, 'num_threads': num_threads or os.cpu_count()}
+        if not use_xnnpack:
+            # XNNPACK jest domyślnym delegatem - wyłączenie tylko do porównań
+            kwargs['experimental_op_resolver_type'] = tflite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        self._interpreter = tflite.Interpreter(**kwargs)
+        self._interpreter.allocate_tensors()
+        # Interpreter nie jest bezpieczny wątkowo (wspólne bufory tensorów)
+        self._lock = threading.Lock()
+
+        input_detail = self._interpreter.get_input_details()[0]
+        self._input_index = input_detail['index']
+        self._input_dtype = input_detail['dtype']
+        self._input_size = tuple(input_detail['shape'][1:3])
+        self._input_quantization = input_detail['quantization']
+        outputs = self._interpreter.get_output_details()
+        order = {**self.DEFAULT_OUTPUTS, **options.get('outputs', {})}
+        self._output_indices = {key: outputs[position]['index'] for key, position in order.items()}
+
+    def _prepare(self, image):
+        height, width = self._input_size
+        if image.shape[:2] != (height, width):
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        if self._input_dtype == np.uint8:
+            return image[None, ...]
+        if self._input_dtype == np.int8:
+            scale, zero_point = self._input_quantization
+            normalized = image.astype(np.float32) / 127.5 - 1.0
+            return np.clip(np.round(normalized / scale + zero_point), -128, 127).astype(np.int8)[None, ...]
+        # Wejście zmiennoprzecinkowe SSD MobileNet: [-1, 1]
+        return (image.astype(np.float32) / 127.5 - 1.0)[None, ...]
+
+    def detect_batch(self, images):
+        outputs = {key: [] for key in self._output_indices}
+        for image in images:
+            model_input = self._prepare(image)
+            with self._lock:
+                self._interpreter.set_tensor(self._input_index, model_input)
+                self._interpreter.invoke()
+                for key, index in self._output_indices.items():
+                    outputs[key].append(self._interpreter.get_tensor(index)[0].copy())
+        return self._normalize(
+            np.stack(outputs['boxes']),
+            np.stack(outputs['scores']),
+            np.stack(outputs['classes']),
+            np.stack(outputs['num_detections']),
+        )
+
+    def warmup(self, input_size=None):
+        super().warmup(input_size or self._input_size)
+
+
+class OnnxBackend(DetectorBackend):
+    """
+    ONNX Runtime na CPU (np. model SSD wyeksportowany przez tf2onnx)
+    """
+    name = 'onnx'
+
+    def __init__(self, path, num_threads=None, **options):
+        super().__init__(path, **options)
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = onnxruntime.InferenceSession(
+            path, sess_options=session_options, providers=['CPUExecutionProvider']
+        )
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        self._float_input = model_input.type == 'tensor(float)'
+        # Nazwy wyjść modelu odpowiadające kluczom wyniku (domyślnie identyczne)
+        self._outputs = {key: options.get('outputs', {}).get(key, key) for key in OUTPUT_KEYS}
+
+    def detect_batch(self, images):
+        images = np.ascontiguousarray(images)
+        if self._float_input:
+            images = images.astype(np.float32)
+        names = list(self._outputs.values())
+        results = dict(zip(names, self._session.run(names, {self._input_name: images})))
+        return self._normalize(*(results[self._outputs[key]] for key in OUTPUT_KEYS))
+
+
+def _tfhub_backend(handle, **options):
+    from .object_detector import ObjectDetector
+
+    return ObjectDetector(handle, **options)
+
+
+BACKENDS = {
+    'tfhub': _tfhub_backend,
+    SavedModelBackend.name: SavedModelBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_detector(handle, backend='tfhub', **options):
+    """
+    Instancja detektora dla modelu z DETECTION_MODELS
+    """
+    try:
+        factory = BACKENDS[backend]
+    except KeyError:
+        raise ImproperlyConfigured(f"Nieznany backend detektora: {backend}")
+    return factory(handle, **options)
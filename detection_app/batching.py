@@ -0,0 +1,159 @@
+"""
+Dynamiczne mikro-batchowanie inferencji
+
+Równoległe żądania (wątki workera, widoki) trafiają do wspólnej kolejki.
+Wątek silnika zbiera je w paczki do max_batch_size, czekając co najwyżej
+max_wait_ms od pierwszego żądania, wykonuje jedno wywołanie modelu na paczkę
+i rozdziela wyniki z powrotem do wywołujących.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from .metrics import metrics
+
+BATCH_SIZE = metrics.histogram(
+    'detection_batch_size', 'Liczba obrazów w jednym wywołaniu modelu',
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+QUEUE_WAIT = metrics.histogram(
+    'detection_batch_queue_wait_seconds', 'Czas oczekiwania żądania na uformowanie paczki',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+INFERENCE_CALLS = metrics.counter(
+    'detection_inference_calls_total', 'Wywołania modelu (jedno na paczkę)'
+)
+INFERENCE_SECONDS = metrics.histogram(
+    'detection_inference_seconds', 'Czas jednego wywołania modelu'
+)
+
+_STOP = object()
+
+
+def run_inference(detector, images, model_name=''):
+    """
+    Wywołanie detector.detect_batch z pomiarem liczby, rozmiaru i czasu paczek
+    """
+    BATCH_SIZE.observe(len(images), model=model_name)
+    start = time.perf_counter()
+    try:
+        return detector.detect_batch(images)
+    finally:
+        INFERENCE_CALLS.inc(model=model_name)
+        INFERENCE_SECONDS.observe(time.perf_counter() - start, model=model_name)
+
+
+class _Request:
+    __slots__ = ('image', 'future', 'enqueued_at')
+
+    def __init__(self, image):
+        self.image = image
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchingEngine:
+    """
+    Silnik inferencji łączący równoległe żądania w paczki
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait_ms=10, input_size=(320, 320), model_name=''):
+        """
+        input_size - wspólny rozmiar (wysokość, szerokość), do którego skalowane
+        są obrazy, by dało się je połączyć w jeden tensor. SSD i tak skaluje
+        wejście do stałego rozmiaru, a ramki są znormalizowane, więc nie zmienia
+        to wyników. Przy input_size=None paczki tworzone są z obrazów o
+        identycznym kształcie (kubełki według rozmiaru).
+
+        model_name - etykieta metryk inferencji
+        """
+        self.detector = detector
+        self.model_name = model_name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+        self.input_size = tuple(input_size) if input_size else None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='batching-engine', daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """
+        Zlecenie detekcji dla obrazu RGB uint8 (H, W, 3); zwraca Future
+        """
+        request = _Request(self._prepare(image))
+        self._queue.put(request)
+        return request.future
+
+    def detect(self, image, timeout=None):
+        """
+        Blokująca detekcja - słownik wyników z wymiarem paczki równym 1
+        """
+        return self.submit(image).result(timeout=timeout)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _prepare(self, image):
+        image = image[:, :, :3]
+        if self.input_size is None:
+            return np.ascontiguousarray(image)
+        height, width = self.input_size
+        if image.shape[:2] == (height, width):
+            return np.ascontiguousarray(image)
+        return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+    def _collect(self, first):
+        """
+        Zebranie paczki: pierwsze żądanie plus to, co nadejdzie przed terminem
+        """
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+
+            # Kubełki według kształtu - przy wspólnym input_size jest jeden
+            buckets = {}
+            for request in batch:
+                buckets.setdefault(request.image.shape, []).append(request)
+            for requests in buckets.values():
+                self._execute(requests)
+
+    def _execute(self, requests):
+        started = time.perf_counter()
+        for request in requests:
+            QUEUE_WAIT.observe(started - request.enqueued_at, model=self.model_name)
+
+        try:
+            images = np.stack([request.image for request in requests])
+            outputs = run_inference(self.detector, images, self.model_name)
+        except Exception as e:
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        # Rozdzielenie wyników - każdy wywołujący dostaje paczkę o rozmiarze 1
+        for index, request in enumerate(requests):
+            request.future.set_result({
+                key: value[index:index + 1] for key, value in outputs.items()
+            })
@@ -0,0 +1,140 @@
+"""
+Narzędzia do pomiaru etapów potoku detekcji
+
+StageTimer mierzy czas nazwanych etapów, a StubDetector zastępuje model
+(ten sam interfejs detect_batch), dzięki czemu benchmark działa bez sieci
+i bez TensorFlow. accuracy_delta porównuje wykrycia dwóch modeli.
+"""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from .postprocess import box_iou
+
+
+class StageTimer:
+    """
+    Pomiar czasu nazwanych etapów przetwarzania (w sekundach)
+    """
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def total(self):
+        return sum(self.timings.values())
+
+
+class StubDetector:
+    """
+    Detektor zastępczy: deterministyczne ramki i stały czas "inferencji"
+
+    Zwraca wyniki w tym samym formacie co ObjectDetector.detect_batch.
+    """
+
+    def __init__(self, latency_ms=5.0, num_detections=100, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.num_detections = num_detections
+        self.seed = seed
+
+    def detect_batch(self, images):
+        batch_size = len(images)
+        rng = np.random.default_rng(self.seed)
+        corners = rng.random((batch_size, self.num_detections, 2, 2), dtype=np.float32)
+        # Układ [ymin, xmin, ymax, xmax]
+        boxes = np.concatenate([corners.min(axis=2), corners.max(axis=2)], axis=-1)
+        scores = np.sort(rng.random((batch_size, self.num_detections), dtype=np.float32), axis=1)[:, ::-1]
+        classes = rng.integers(1, 91, (batch_size, self.num_detections)).astype(np.float32)
+        time.sleep(self.latency * batch_size)
+        return {
+            'detection_boxes': boxes,
+            'detection_scores': np.ascontiguousarray(scores),
+            'detection_classes': classes,
+            'num_detections': np.full(batch_size, self.num_detections, dtype=np.float32),
+        }
+
+    def warmup(self, input_size=(320, 320)):
+        pass
+
+
+def summarize(samples):
+    """
+    Percentyle (ms) dla listy czasów w sekundach
+    """
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    if not len(values):
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': int(len(values)),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'total_s': float(values.sum() / 1000.0),
+    }
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """
+    Zachłanne dopasowanie wykryć (postprocess.DETECTION_DTYPE) jednego obrazu
+
+    Para to ta sama klasa i IoU >= iou_threshold; wykrycia referencyjne
+    przeglądane są malejąco według pewności. Zwraca listę par indeksów
+    (referencja, kandydat) i IoU każdej pary.
+    """
+    pairs = []
+    ious = []
+    used = np.zeros(len(candidate), dtype=bool)
+    for ref_index in np.argsort(-reference['score'], kind='stable'):
+        available = ~used & (candidate['class_id'] == reference['class_id'][ref_index])
+        if not available.any():
+            continue
+        overlap = np.where(available, box_iou(reference['box'][ref_index], candidate['box']), 0.0)
+        best = int(np.argmax(overlap))
+        if overlap[best] >= iou_threshold:
+            used[best] = True
+            pairs.append((int(ref_index), best))
+            ious.append(float(overlap[best]))
+    return pairs, ious
+
+
+def accuracy_delta(reference_images, candidate_images, iou_threshold=0.5):
+    """
+    Zgodność wykryć kandydata (np. int8) z modelem referencyjnym (float32)
+
+    Argumenty to listy wykryć kolejnych obrazów. Precyzja i czułość liczone
+    są względem wyników referencyjnych, nie adnotacji.
+    """
+    matched = reference_total = candidate_total = 0
+    ious = []
+    score_deltas = []
+    for reference, candidate in zip(reference_images, candidate_images):
+        pairs, pair_ious = match_detections(reference, candidate, iou_threshold)
+        matched += len(pairs)
+        reference_total += len(reference)
+        candidate_total += len(candidate)
+        ious.extend(pair_ious)
+        score_deltas.extend(
+            float(candidate['score'][cand_index]) - float(reference['score'][ref_index])
+            for ref_index, cand_index in pairs
+        )
+    return {
+        'images': len(reference_images),
+        'reference_detections': reference_total,
+        'candidate_detections': candidate_total,
+        'matched': matched,
+        'recall': matched / reference_total if reference_total else 1.0,
+        'precision': matched / candidate_total if candidate_total else 1.0,
+        'mean_iou': float(np.mean(ious)) if ious else None,
+        'mean_score_delta': float(np.mean(score_deltas)) if score_deltas else None,
+        'mean_abs_score_delta': float(np.mean(np.abs(score_deltas))) if score_deltas else None,
+    }
@@ -0,0 +1,115 @@
+"""
+Liczniki odwołań do plików magazynu (MediaBlob)
+
+Sygnały modelu DetectionImage zwiększają licznik pliku, gdy wiersz zaczyna
+na niego wskazywać, i zmniejszają, gdy przestaje (zmiana pola, usunięcie
+wiersza - także kaskadowe przy usuwaniu konta). Plik z licznikiem 0 jest
+kandydatem dla gc_media. Zmiany omijające sygnały (QuerySet.update) mogą
+rozstroić liczniki - gc_media przed usunięciem sprawdza odwołania w bazie,
+a --rebuild-refcounts odtwarza liczniki z wierszy.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import DetectionImage, MediaBlob
+
+MEDIA_FIELDS = ('original_image', 'processed_image')
+
+
+def _loaded_names(instance):
+    """
+    Nazwy plików w polach załadowanych z bazy; None dla pól odroczonych (only/defer)
+    """
+    names = {}
+    for field in MEDIA_FIELDS:
+        if field not in instance.__dict__:
+            names[field] = None
+            continue
+        value = instance.__dict__[field]
+        names[field] = getattr(value, 'name', value) or ''
+    return names
+
+
+def acquire(name, count=1):
+    if not name:
+        return
+    if MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + count):
+        return
+    storage = DetectionImage._meta.get_field('original_image').storage
+    try:
+        size = storage.size(name)
+    except OSError:
+        size = 0
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, size=size, refcount=count)
+    except IntegrityError:
+        # Równoległe utworzenie wiersza - zwiększenie istniejącego licznika
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + count)
+
+
+def release(name):
+    if name:
+        MediaBlob.objects.filter(name=name).update(refcount=F('refcount') - 1)
+
+
+def count_references(names):
+    """
+    Liczba wierszy DetectionImage wskazujących na każdy z plików (z bazy)
+    """
+    counts = dict.fromkeys(names, 0)
+    for field in MEDIA_FIELDS:
+        rows = (
+            DetectionImage.objects
+            .filter(**{f'{field}__in': list(names)})
+            .values(field)
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        for row in rows:
+            counts[row[field]] += row['count']
+    return counts
+
+
+def recount(name):
+    if name:
+        MediaBlob.objects.filter(name=name).update(refcount=count_references([name])[name])
+
+
+@receiver(post_init, sender=DetectionImage)
+def remember_media_names(sender, instance, **kwargs):
+    instance._media_names = _loaded_names(instance) if instance.pk else dict.fromkeys(MEDIA_FIELDS, '')
+
+
+@receiver(post_save, sender=DetectionImage)
+def update_refcounts(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_media_names', {})
+    current = _loaded_names(instance)
+    for field in MEDIA_FIELDS:
+        if update_fields is not None and field not in update_fields:
+            continue
+        new_name = current[field]
+        old_name = '' if created else previous.get(field)
+        if new_name is None or old_name == new_name:
+            continue
+        if old_name is None:
+            # Poprzednia wartość nieznana (pole odroczone) - licznik z bazy
+            acquire(new_name)
+            recount(new_name)
+        else:
+            acquire(new_name)
+            release(old_name)
+    instance._media_names = {
+        field: current[field] if current[field] is not None else previous.get(field)
+        for field in MEDIA_FIELDS
+    }
+
+
+@receiver(post_delete, sender=DetectionImage)
+def release_on_delete(sender, instance, **kwargs):
+    for field, name in getattr(instance, '_media_names', {}).items():
+        release(name)
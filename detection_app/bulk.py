@@ -0,0 +1,138 @@
+"""
+Zbiorcze przesyłanie obrazów: wiele plików lub archiwum ZIP
+
+Pozycje archiwum są strumieniowane prosto do magazynu plików (bez
+rozpakowywania całości w pamięci), a wiersze DetectionImage tworzone są
+jednym bulk_create i trafiają do kolejki zadań.
+"""
+import hashlib
+import os
+import zipfile
+
+from django.conf import settings
+from collections import Counter
+
+from django.core.files import File
+
+from . import blobs
+from .models import DetectionBatch, DetectionImage
+from .storage import ContentAddressedStorage
+from .uploads import check_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+UPLOAD_TO = DetectionImage._meta.get_field('original_image').upload_to
+
+
+class HashingReader:
+    """
+    Strumień do odczytu liczący SHA-256 w trakcie zapisu do magazynu
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self._digest.update(data)
+        return data
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_archive(archive):
+    """
+    Kolejne obrazy z archiwum ZIP jako (nazwa, strumień) - po jednym naraz
+    """
+    max_size = getattr(settings, 'DETECTION_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+    with zipfile.ZipFile(archive) as zip_file:
+        for info in zip_file.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or not name or name.startswith('.') or not is_image_name(name):
+                continue
+            if info.file_size > max_size:
+                continue
+            with zip_file.open(info) as entry:
+                # Ten sam limit pikseli co dla przesyłanych plików - z nagłówka,
+                # zanim pozycja trafi do magazynu i kolejki
+                try:
+                    check_image(entry)
+                except ValueError:
+                    continue
+                yield name, entry
+
+
+def iter_uploads(files, archive=None):
+    for uploaded_file in files:
+        yield uploaded_file.name, uploaded_file
+    if archive is not None:
+        yield from iter_archive(archive)
+
+
+def _storage():
+    return DetectionImage._meta.get_field('original_image').storage
+
+
+def _store(name, stream):
+    content_hash = getattr(stream, 'content_hash', None)
+    if content_hash:
+        # Skrót policzony przy przesyłaniu - plik tymczasowy przenoszony do
+        # magazynu bez ponownego kopiowania i liczenia skrótu
+        return _storage().save(os.path.join(UPLOAD_TO, name), stream), content_hash
+    reader = HashingReader(stream)
+    stored_name = _storage().save(os.path.join(UPLOAD_TO, name), File(reader, name=name))
+    return stored_name, reader.hexdigest()
+
+
+def create_batch(user, entries, name='', model_name=None):
+    """
+    Zapis wszystkich pozycji i utworzenie wierszy jednym bulk_create
+    """
+    model_name = model_name or settings.DETECTION_DEFAULT_MODEL
+    max_images = getattr(settings, 'DETECTION_BULK_MAX_IMAGES', 500)
+    batch = DetectionBatch.objects.create(user=user, name=name)
+
+    images = []
+    known_files = {}
+    # Magazyn adresowany zawartością sam łączy duplikaty pod jedną nazwą
+    content_addressed = isinstance(_storage(), ContentAddressedStorage)
+    for entry_name, stream in entries:
+        if len(images) >= max_images:
+            break
+        stored_name, content_hash = _store(entry_name, stream)
+
+        # Duplikat (w paczce lub w bazie) - zostaje jedna kopia na dysku
+        existing = None if content_addressed else known_files.get(content_hash) or (
+            DetectionImage.objects
+            .filter(content_hash=content_hash)
+            .values_list('original_image', flat=True)
+            .first()
+        )
+        if existing and existing != stored_name:
+            _storage().delete(stored_name)
+            stored_name = existing
+        known_files[content_hash] = stored_name
+
+        images.append(DetectionImage(
+            user=user,
+            batch=batch,
+            original_image=stored_name,
+            original_filename=entry_name,
+            content_hash=content_hash,
+            model_name=model_name,
+            confidence_threshold=settings.DETECTION_CONFIDENCE_THRESHOLD,
+            status=DetectionImage.STATUS_QUEUED,
+        ))
+
+    DetectionImage.objects.bulk_create(images, batch_size=200)
+    # bulk_create nie wysyła sygnałów post_save - liczniki odwołań tutaj
+    for stored_name, count in Counter(image.original_image.name for image in images).items():
+        blobs.acquire(stored_name, count)
+    batch.total_images = len(images)
+    batch.save(update_fields=['total_images'])
+    return batch
@@ -0,0 +1,159 @@
+"""
+Klient API detekcji (api/v1/detect/) dla integracji - bez zależności od Django
+
+    client = DetectionClient('https://serwer', token)
+    for image in client.detect(['a.jpg', 'b.jpg'], fmt='npz'):
+        print(image['name'], image['class_id'], image['score'], image['box'])
+
+Niezależnie od formatu transportu wynik to lista słowników z tablicami NumPy
+class_id (int32), score (float32) i box (N x 4, [ymin, xmin, ymax, xmax] w
+[0, 1]). Format msgpack wymaga pakietu msgpack.
+"""
+import base64
+import io
+import json
+import mimetypes
+import os
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+
+ACCEPT = {
+    'json': 'application/json',
+    'npz': 'application/x-npz',
+    'msgpack': 'application/msgpack',
+}
+API_PATH = '/api/v1/detect/'
+
+
+class DetectionApiError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_multipart(fields, files):
+    """
+    Treść multipart/form-data; files to lista (pole, nazwa pliku, bajty)
+    """
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for field, filename, data in files:
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        body.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode()
+        )
+        body.write(data)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+def _read_image(image):
+    if isinstance(image, (tuple, list)):
+        name, data = image
+        return name, data
+    with open(image, 'rb') as image_file:
+        return os.path.basename(image), image_file.read()
+
+
+def decode_json(data):
+    images = []
+    for image in json.loads(data)['images']:
+        objects = image.pop('objects')
+        annotated = image.pop('annotated')
+        images.append({
+            **image,
+            'class_id': np.array([obj['class_id'] for obj in objects], dtype=np.int32),
+            'score': np.array([obj['confidence'] for obj in objects], dtype=np.float32),
+            'box': np.array([obj['bbox'] for obj in objects], dtype=np.float32).reshape(-1, 4),
+            'annotated': base64.b64decode(annotated) if annotated else None,
+        })
+    return images
+
+
+def decode_npz(data):
+    with np.load(io.BytesIO(data)) as arrays:
+        arrays = dict(arrays)
+    images = []
+    for index in range(len(arrays['id'])):
+        selected = arrays['image'] == index
+        annotated = arrays.get(f'annotated_{index}')
+        images.append({
+            'id': int(arrays['id'][index]) or None,
+            'name': str(arrays['name'][index]),
+            'status': str(arrays['status'][index]),
+            'error': str(arrays['error'][index]),
+            'reused': bool(arrays['reused'][index]),
+            'image_size': arrays['image_size'][index].tolist(),
+            'processing_time': float(arrays['processing_time'][index]),
+            'class_id': arrays['class_id'][selected],
+            'score': arrays['score'][selected],
+            'box': arrays['box'][selected],
+            'annotated': annotated.tobytes() if annotated is not None else None,
+        })
+    return images
+
+
+def decode_msgpack(data):
+    import msgpack
+
+    images = []
+    for image in msgpack.unpackb(data, raw=False)['images']:
+        image['class_id'] = np.frombuffer(image['class_id'], dtype='<i4')
+        image['score'] = np.frombuffer(image['score'], dtype='<f4')
+        image['box'] = np.frombuffer(image['box'], dtype='<f4').reshape(-1, 4)
+        del image['count']
+        images.append(image)
+    return images
+
+
+DECODERS = {'json': decode_json, 'npz': decode_npz, 'msgpack': decode_msgpack}
+
+
+class DetectionClient:
+    """
+    Wywołania API detekcji z tokenem wydanym komendą create_api_token
+    """
+
+    def __init__(self, base_url, token, timeout=120):
+        self.url = base_url.rstrip('/') + API_PATH
+        self.token = token
+        self.timeout = timeout
+
+    def detect_raw(self, images, fmt='json', model=None, threshold=None, annotated=False):
+        """
+        Surowa odpowiedź API (bajty) dla listy ścieżek lub par (nazwa, bajty)
+        """
+        fields = {'annotated': '1' if annotated else '0'}
+        if model:
+            fields['model'] = model
+        if threshold is not None:
+            fields['threshold'] = str(threshold)
+        files = [('image', *_read_image(image)) for image in images]
+        body, content_type = encode_multipart(fields, files)
+        request = urllib.request.Request(self.url, data=body, method='POST', headers={
+            'Authorization': f'Token {self.token}',
+            'Accept': ACCEPT[fmt],
+            'Content-Type': content_type,
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            raise DetectionApiError(message, status=e.code) from e
+
+    def detect(self, images, fmt='json', model=None, threshold=None, annotated=False):
+        """
+        Wykrycia dla listy obrazów - jeden słownik z tablicami NumPy na obraz
+        """
+        return DECODERS[fmt](self.detect_raw(images, fmt, model, threshold, annotated))
@@ -0,0 +1,120 @@
+"""
+Deduplikacja przesyłanych obrazów po skrócie zawartości
+
+Identyczne pliki (ten sam SHA-256) współdzielą jedną kopię na dysku, a gotowe
+wyniki detekcji są ponownie używane, jeśli zgadza się model i próg pewności.
+"""
+import hashlib
+
+from django.utils import timezone
+
+from .metrics import metrics
+from .models import DetectionImage
+
+RESULT_LOOKUPS = metrics.counter(
+    'detection_dedup_lookups_total', 'Wyszukiwania gotowych wyników po skrócie zawartości'
+)
+SHARED_FILES = metrics.counter(
+    'detection_dedup_shared_files_total', 'Przesłane pliki zastąpione istniejącą kopią na dysku'
+)
+
+
+def hash_upload(uploaded_file):
+    """
+    SHA-256 pliku liczony fragmentami, bez wczytywania całości do pamięci
+    """
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def share_original(detection_image):
+    """
+    Podmiana przesłanego pliku na istniejącą kopię o tej samej zawartości
+    """
+    if not detection_image.content_hash:
+        return False
+    existing_name = (
+        DetectionImage.objects
+        .filter(content_hash=detection_image.content_hash)
+        .exclude(original_image='')
+        .values_list('original_image', flat=True)
+        .first()
+    )
+    if not existing_name:
+        return False
+
+    # Przypisanie nazwy (a nie pliku) sprawia, że FileField nie zapisuje kopii
+    detection_image.original_filename = detection_image.original_filename or detection_image.display_name
+    detection_image.original_image = existing_name
+    SHARED_FILES.inc()
+    return True
+
+
+def find_cached_result(content_hash, model_name, confidence_threshold):
+    if not content_hash:
+        return None
+    return (
+        DetectionImage.objects
+        .filter(
+            content_hash=content_hash,
+            model_name=model_name,
+            confidence_threshold=confidence_threshold,
+            status=DetectionImage.STATUS_DONE,
+        )
+        # Wyniki zawężone do wybranych klas nie są pełnym wynikiem dla progu
+        .exclude(detection_results__has_key='classes')
+        .order_by('id')
+        .first()
+    )
+
+
+def reuse_result(detection_image):
+    """
+    Skopiowanie gotowych wyników z identycznego obrazu; True przy trafieniu
+    """
+    source = find_cached_result(
+        detection_image.content_hash,
+        detection_image.model_name,
+        detection_image.confidence_threshold,
+    )
+    if source is None or source.pk == detection_image.pk:
+        RESULT_LOOKUPS.inc(result='miss')
+        return False
+
+    RESULT_LOOKUPS.inc(result='hit')
+    detection_image.detection_results = source.detection_results
+    detection_image.raw_output = source.raw_output
+    detection_image.processed_image = source.processed_image.name
+    detection_image.objects_detected = source.objects_detected
+    detection_image.processing_time = 0.0
+    detection_image.processed_at = timezone.now()
+    detection_image.status = DetectionImage.STATUS_DONE
+    detection_image.result_reused = True
+    detection_image.error_message = ''
+    return True
+
+
+def stats():
+    """
+    Skuteczność deduplikacji: liczniki procesu oraz stan całej bazy
+    """
+    hits = RESULT_LOOKUPS.value(result='hit')
+    misses = RESULT_LOOKUPS.value(result='miss')
+    total_done = DetectionImage.objects.filter(status=DetectionImage.STATUS_DONE).count()
+    reused = DetectionImage.objects.filter(result_reused=True).count()
+    return {
+        'process': {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'shared_files': SHARED_FILES.value(),
+        },
+        'database': {
+            'processed_images': total_done,
+            'reused_results': reused,
+            'inference_saved_ratio': reused / total_done if total_done else 0.0,
+        },
+    }
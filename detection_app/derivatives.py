@@ -0,0 +1,124 @@
+"""
+Miniatury i obrazy pośrednie dla historii i strony wyników
+
+Dla każdego obrazu generowane są pomniejszone wersje oryginału ('original')
+i obrazu z naniesionymi wykryciami ('annotated'). Pliki mają w nazwie wersję
+(skrót zawartości albo chwilę przetworzenia), więc ponowne przetworzenie
+tworzy nowe pliki, a nieaktualne są usuwane przy generowaniu.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.urls import reverse
+
+from .drawing import encode_image
+from .metrics import metrics
+from .preprocessing import decode_for_display
+from .rendering import FORMATS, render_detection_image
+from .uploads import open_mapped
+
+DERIVATIVES_GENERATED = metrics.counter(
+    'detection_derivatives_generated_total', 'Wygenerowane miniatury i obrazy pośrednie'
+)
+
+DERIVATIVES_DIR = 'detection_images/derivatives'
+KINDS = ('original', 'annotated')
+
+
+def get_options():
+    options = {
+        # Nazwa rozmiaru -> dłuższy bok w pikselach
+        'sizes': {'thumb': 160, 'medium': 800},
+        'format': 'webp',
+        # Rozmiary generowane przez workera zaraz po detekcji
+        'pregenerate': ('thumb',),
+    }
+    options.update(getattr(settings, 'DETECTION_DERIVATIVES', {}))
+    return options
+
+
+def _version(detection_image, kind):
+    if kind == 'annotated':
+        processed_at = detection_image.processed_at
+        return str(int(processed_at.timestamp() * 1000000)) if processed_at else '0'
+    if detection_image.content_hash:
+        return detection_image.content_hash[:16]
+    # Obrazy sprzed deduplikacji - wersją jest nazwa pliku
+    return os.path.splitext(os.path.basename(detection_image.original_image.name))[0]
+
+
+def derivative_name(detection_image, kind, size_name):
+    """
+    Ścieżka pliku względem MEDIA_ROOT
+    """
+    options = get_options()
+    if kind not in KINDS:
+        raise ValueError(f"Nieznany rodzaj obrazu: {kind}")
+    if size_name not in options['sizes']:
+        raise ValueError(f"Nieznany rozmiar: {size_name}")
+    extension = FORMATS[options['format']][0]
+    return (
+        f'{DERIVATIVES_DIR}/{detection_image.id}/'
+        f'{kind}-{size_name}-{_version(detection_image, kind)}{extension}'
+    )
+
+
+def is_available(detection_image, kind):
+    return kind == 'original' or detection_image.status == detection_image.STATUS_DONE
+
+
+def generate(detection_image, kind, size_name):
+    """
+    Wygenerowanie pliku (o ile nie istnieje); zwraca ścieżkę względem MEDIA_ROOT
+    """
+    name = derivative_name(detection_image, kind, size_name)
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    if os.path.exists(path):
+        return name
+
+    options = get_options()
+    size = options['sizes'][size_name]
+    extension = FORMATS[options['format']][0]
+    if kind == 'annotated':
+        data = render_detection_image(detection_image, size, options['format'])
+    else:
+        with open_mapped(detection_image.original_image) as image_file:
+            display, _ = decode_for_display(image_file, size)
+        data = encode_image(display, extension)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary_path, 'wb') as output:
+        output.write(data)
+    os.replace(temporary_path, path)
+    DERIVATIVES_GENERATED.inc(kind=kind, size=size_name)
+
+    # Nieaktualne wersje tego samego rodzaju i rozmiaru
+    prefix = f'{kind}-{size_name}-'
+    for entry in os.listdir(directory):
+        if entry.startswith(prefix) and entry != os.path.basename(path) and not entry.endswith('.tmp'):
+            try:
+                os.remove(os.path.join(directory, entry))
+            except FileNotFoundError:
+                pass
+    return name
+
+
+def derivative_url(detection_image, kind, size_name):
+    """
+    Adres widoku, który sprawdza właściciela i wysyła plik (generując go przy
+    pierwszym żądaniu) - miniatury nie są dostępne pod publicznym /media/
+    """
+    return reverse('object_detection_derivative', args=[detection_image.id, kind, size_name])
+
+
+def pregenerate(detection_image):
+    """
+    Miniatury generowane w tle po detekcji (błędy nie wpływają na wynik zadania)
+    """
+    for size_name in get_options()['pregenerate']:
+        for kind in KINDS:
+            if is_available(detection_image, kind):
+                generate(detection_image, kind, size_name)
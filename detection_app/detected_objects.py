@@ -0,0 +1,115 @@
+"""
+Tabela wykrytych obiektów (DetectedObject) i zapytania po klasie i pewności
+
+detection_results pozostaje źródłem danych dla stron wyników; tabela jest
+jego znormalizowaną kopią, wypełnianą przy zapisie wyników jednym bulk_create,
+dzięki czemu pytania typu "obrazy z psem powyżej 0.8" obsługuje indeks
+(user, class_id, confidence) zamiast parsowania JSON każdego wiersza.
+"""
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef
+
+from .labels import COCO_CLASSES
+from .models import DetectedObject
+
+_CLASS_IDS = {name.lower(): class_id for class_id, name in COCO_CLASSES.items()}
+
+
+def build_objects(detection_image):
+    """
+    Niezapisane wiersze DetectedObject z detection_results obrazu
+    """
+    return [
+        DetectedObject(
+            image_id=detection_image.id,
+            user_id=detection_image.user_id,
+            class_id=obj['class_id'],
+            confidence=obj['confidence'],
+            ymin=obj['bbox'][0],
+            xmin=obj['bbox'][1],
+            ymax=obj['bbox'][2],
+            xmax=obj['bbox'][3],
+        )
+        for obj in detection_image.detection_results.get('objects', [])
+    ]
+
+
+def replace_objects(detection_images, batch_size=1000):
+    """
+    Zastąpienie wykryć podanych obrazów (po ponownym przetworzeniu) - jedno
+    usunięcie i jeden bulk_create dla całej listy
+    """
+    rows = [row for detection_image in detection_images for row in build_objects(detection_image)]
+    with transaction.atomic():
+        DetectedObject.objects.filter(image_id__in=[image.id for image in detection_images]).delete()
+        DetectedObject.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def parse_class(value):
+    """
+    Identyfikator klasy z nazwy COCO ('dog') albo liczby; ValueError gdy nieznana
+    """
+    value = str(value).strip().lower()
+    if value.isdigit() and int(value) in COCO_CLASSES:
+        return int(value)
+    if value in _CLASS_IDS:
+        return _CLASS_IDS[value]
+    raise ValueError(f"Nieznana klasa: {value}")
+
+
+def matching_objects(user, class_id=None, min_confidence=None):
+    objects = DetectedObject.objects.filter(user=user)
+    if class_id is not None:
+        objects = objects.filter(class_id=class_id)
+    if min_confidence is not None:
+        objects = objects.filter(confidence__gte=min_confidence)
+    return objects
+
+
+def filter_images(images, user, class_id=None, min_confidence=None):
+    """
+    Zawężenie zapytania o obrazy do tych, na których wykryto pasujący obiekt
+    """
+    if class_id is None and min_confidence is None:
+        return images
+    matches = matching_objects(user, class_id, min_confidence).filter(image_id=OuterRef('pk'))
+    return images.filter(Exists(matches))
+
+
+def search(user, class_id=None, min_confidence=None, limit=50):
+    """
+    Obrazy z pasującymi obiektami: liczba trafień i najwyższa pewność na obraz
+    """
+    rows = (
+        matching_objects(user, class_id, min_confidence)
+        .values('image_id')
+        .annotate(matches=Count('id'), best_confidence=Max('confidence'))
+        .order_by('-best_confidence', '-image_id')[:limit]
+    )
+    return list(rows)
+
+
+def attach_top_objects(detection_images, limit=8):
+    """
+    Najpewniejsze wykrycia dla listy obrazów jednym zapytaniem (zamiast
+    wczytywania detection_results); ustawia top_objects i more_objects
+    """
+    by_image = {image.id: [] for image in detection_images}
+    rows = (
+        DetectedObject.objects
+        .filter(image_id__in=list(by_image))
+        .order_by('image_id', '-confidence')
+        .values_list('image_id', 'class_id', 'confidence')
+    )
+    for image_id, class_id, confidence in rows:
+        objects = by_image[image_id]
+        if len(objects) < limit:
+            objects.append({
+                'class_id': class_id,
+                'class_name': COCO_CLASSES.get(class_id, 'unknown'),
+                'confidence': confidence,
+            })
+    for image in detection_images:
+        image.top_objects = by_image[image.id]
+        image.more_objects = max(0, image.objects_detected - len(image.top_objects))
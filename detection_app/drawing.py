@@ -0,0 +1,70 @@
+"""
+Rysowanie wyników detekcji i zapis obrazów wynikowych (tylko OpenCV)
+
+OpenCV importowany jest przy pierwszym użyciu - procesy, które nie rysują
+(migracje, strony bez renderowania), nie ładują biblioteki.
+"""
+import os
+
+from django.core.files.base import ContentFile
+
+
+def draw_detections(image, boxes, scores, classes, class_names):
+    """
+    Rysowanie detection boxes i etykiet na obrazie
+    """
+    import cv2
+
+    image_with_detections = image.copy()
+    height, width = image.shape[:2]
+
+    for i, (box, score, class_id) in enumerate(zip(boxes, scores, classes)):
+        # Konwersja współrzędnych
+        ymin, xmin, ymax, xmax = box
+        xmin = int(xmin * width)
+        xmax = int(xmax * width)
+        ymin = int(ymin * height)
+        ymax = int(ymax * height)
+
+        # Rysowanie bounding box
+        cv2.rectangle(image_with_detections, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
+
+        # Przygotowanie etykiety
+        label = f"{class_names.get(int(class_id), 'unknown')}: {score:.2f}"
+
+        # Rysowanie etykiety
+        label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
+        cv2.rectangle(image_with_detections,
+                     (xmin, ymin - label_size[1] - 10),
+                     (xmin + label_size[0], ymin),
+                     (0, 255, 0), -1)
+        cv2.putText(image_with_detections, label,
+                   (xmin, ymin - 5),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+
+    return image_with_detections
+
+
+def encode_image(image, extension='.jpg'):
+    """
+    Kodowanie obrazu RGB do bajtów w formacie wynikającym z rozszerzenia
+    """
+    import cv2
+
+    # Konwersja RGB to BGR dla OpenCV
+    image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    ok, buffer = cv2.imencode(extension, image_bgr)
+    if not ok:
+        raise ValueError(f"Nie można zakodować obrazu jako {extension}")
+    return buffer.tobytes()
+
+
+def save_processed_image(image, filename):
+    """
+    Zapis przetworzonego obrazu w magazynie pola processed_image; zwraca nazwę pliku
+    """
+    from .models import DetectionImage
+
+    extension = os.path.splitext(filename)[1].lower() or '.jpg'
+    storage = DetectionImage._meta.get_field('processed_image').storage
+    return storage.save(f'detection_images/processed/{filename}', ContentFile(encode_image(image, extension)))
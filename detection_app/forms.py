@@ -4,7 +4,13 @@ from django.contrib.auth.forms import PasswordChangeForm
 from django.core.exceptions import ValidationError
 from .models import CustomUser, UserProfile
 import re
-from .models import DetectionImage
+from .models import DetectionImage, DetectionVideo
+from .dedup import hash_upload
+from .uploads import check_image, check_upload_size
+from .bulk import is_image_name
+from .model_registry import registry
+from django.conf import settings
+import zipfile
 
 class CustomUserCreationForm(UserCreationForm):
     email = forms.EmailField(
@@ -299,12 +305,29 @@ class CustomPasswordChangeForm(PasswordChangeForm):
 
 
 
+def available_models():
+    return registry.available_models()
+
+
+def model_choice_field():
+    """Wybór modelu detekcji spośród dostępnych w DETECTION_MODELS"""
+    return forms.ChoiceField(
+        # Lista liczona przy każdym utworzeniu formularza (pliki modeli mogą się pojawić)
+        choices=available_models,
+        initial=settings.DETECTION_DEFAULT_MODEL,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label="Model detekcji"
+    )
+
+
 class ImageUploadForm(forms.ModelForm):
     """Formularz przesyłania obrazu do detekcji"""
     
+    model_name = model_choice_field()
+    
     class Meta:
         model = DetectionImage
-        fields = ['original_image']
+        fields = ['original_image', 'model_name']
         widgets = {
             'original_image': forms.FileInput(attrs={
                 'class': 'form-control',
@@ -318,13 +341,142 @@ class ImageUploadForm(forms.ModelForm):
     def clean_original_image(self):
         image = self.cleaned_data.get('original_image')
         if image:
-            # Sprawdź rozmiar pliku (max 10MB)
-            if image.size > 10 * 1024 * 1024:
-                raise forms.ValidationError("Obraz nie może być większy niż 10MB")
+            # Sprawdź rozmiar pliku (DETECTION_MAX_UPLOAD_SIZE)
+            try:
+                check_upload_size(image)
+            except ValueError as e:
+                raise forms.ValidationError(str(e))
             
             # Sprawdź typ pliku
             valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
             if not any(image.name.lower().endswith(ext) for ext in valid_extensions):
                 raise forms.ValidationError("Nieobsługiwany format obrazu. Użyj JPG, PNG, BMP lub TIFF.")
+            
+            # Wymiary z nagłówka - zbyt duży obraz odrzucany przed dekodowaniem
+            try:
+                check_image(image)
+            except ValueError as e:
+                raise forms.ValidationError(str(e))
+            
+            # Skrót zawartości do deduplikacji (liczony już przy zapisie na dysk)
+            self.instance.content_hash = getattr(image, 'content_hash', None) or hash_upload(image)
         
-        return image
\ No newline at end of file
+        return image
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleFileField(forms.FileField):
+    """Pole przyjmujące wiele plików naraz"""
+    
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput())
+        super().__init__(*args, **kwargs)
+    
+    def clean(self, data, initial=None):
+        single_file_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_file_clean(item, initial) for item in data]
+        return [single_file_clean(data, initial)] if data else []
+
+
+class BulkImageUploadForm(forms.Form):
+    """Formularz zbiorczego przesyłania obrazów (wiele plików lub archiwum ZIP)"""
+    
+    name = forms.CharField(
+        required=False,
+        max_length=255,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'np. Zdjęcia z parkingu'
+        }),
+        label="Nazwa paczki"
+    )
+    images = MultipleFileField(
+        required=False,
+        widget=MultipleFileInput(attrs={
+            'class': 'form-control',
+            'accept': 'image/*'
+        }),
+        label="Obrazy"
+    )
+    archive = forms.FileField(
+        required=False,
+        widget=forms.FileInput(attrs={
+            'class': 'form-control',
+            'accept': '.zip'
+        }),
+        label="Archiwum ZIP"
+    )
+    model_name = model_choice_field()
+    
+    def clean_images(self):
+        images = self.cleaned_data.get('images') or []
+        for image in images:
+            if not is_image_name(image.name):
+                raise forms.ValidationError(f"Nieobsługiwany format obrazu: {image.name}")
+            try:
+                check_upload_size(image)
+                check_image(image)
+            except ValueError as e:
+                raise forms.ValidationError(f"{image.name}: {e}")
+        if len(images) > settings.DETECTION_BULK_MAX_IMAGES:
+            raise forms.ValidationError(f"Można przesłać maksymalnie {settings.DETECTION_BULK_MAX_IMAGES} obrazów naraz")
+        return images
+    
+    def clean_archive(self):
+        archive = self.cleaned_data.get('archive')
+        if archive:
+            if not archive.name.lower().endswith('.zip') or not zipfile.is_zipfile(archive):
+                raise forms.ValidationError("Archiwum musi być poprawnym plikiem ZIP")
+            archive.seek(0)
+        return archive
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('images') and not cleaned_data.get('archive'):
+            raise forms.ValidationError("Wybierz obrazy lub archiwum ZIP")
+        return cleaned_data
+
+
+class VideoUploadForm(forms.ModelForm):
+    """Formularz przesyłania nagrania wideo do detekcji"""
+    
+    model_name = model_choice_field()
+    
+    class Meta:
+        model = DetectionVideo
+        fields = ['video', 'sample_fps', 'model_name']
+        widgets = {
+            'video': forms.FileInput(attrs={
+                'class': 'form-control',
+                'accept': 'video/*'
+            }),
+            'sample_fps': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'min': '0.1',
+                'max': '30',
+                'step': '0.1'
+            }),
+        }
+        labels = {
+            'video': 'Wybierz nagranie do analizy',
+            'sample_fps': 'Analizowane klatki na sekundę',
+        }
+    
+    def clean_video(self):
+        video = self.cleaned_data.get('video')
+        if video:
+            if video.size > settings.DETECTION_VIDEO['max_upload_size']:
+                raise forms.ValidationError("Nagranie jest zbyt duże")
+            valid_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
+            if not any(video.name.lower().endswith(ext) for ext in valid_extensions):
+                raise forms.ValidationError("Nieobsługiwany format nagrania. Użyj MP4, AVI, MOV, MKV lub WEBM.")
+        return video
+    
+    def clean_sample_fps(self):
+        sample_fps = self.cleaned_data.get('sample_fps')
+        if sample_fps is not None and not 0 < sample_fps <= 30:
+            raise forms.ValidationError("Podaj wartość z zakresu 0.1 - 30")
+        return sample_fps
@@ -0,0 +1,105 @@
+"""
+Walidatory HTTP (ETag, Last-Modified) i odpowiedzi 304 dla wyników detekcji
+
+Zakończone przetworzenie nie zmienia się aż do ponownej detekcji, więc jego
+strony i odpowiedzi API mogą być walidowane warunkowym GET zamiast
+renderowane przy każdym żądaniu. ETag wynika z identyfikatora, statusu
+i chwili przetworzenia obrazu oraz wariantu odpowiedzi (format, rozmiar);
+strony HTML dodatkowo zależą od użytkownika i ciasteczka CSRF (token
+w formularzu wylogowania). Obrazy w trakcie przetwarzania nie mają walidatorów.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .metrics import metrics
+
+CONDITIONAL_RESPONSES = metrics.counter(
+    'detection_conditional_responses_total', 'Żądania z walidatorami według wyniku (304 lub pełna odpowiedź)'
+)
+
+
+def get_options():
+    options = {
+        # Zmiana wersji unieważnia ETagi stron (np. po zmianie szablonów)
+        'version': '1',
+        # Czas ważności (s) plików z /media/ - nazwy plików są unikalne
+        'media_max_age': 365 * 24 * 3600,
+        # 'django' (FileResponse z obsługą Range), 'x-sendfile' (Apache,
+        # lighttpd) albo 'x-accel-redirect' (nginx, lokalizacja internal)
+        'media_mode': 'django',
+        'accel_redirect_prefix': '/protected-media/',
+        # Katalogi MEDIA_ROOT dostępne pod /media/ bez logowania (nazwy
+        # oryginałów to skróty SHA-256); pozostałe pliki - rendery, miniatury,
+        # nagrania - tylko przez widoki sprawdzające właściciela (albo przy DEBUG)
+        'public_media_dirs': ('avatars/', 'detection_images/original/', 'detection_images/processed/'),
+    }
+    options.update(getattr(settings, 'DETECTION_HTTP_CACHE', {}))
+    return options
+
+
+def make_etag(*parts):
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def result_etag(request, detection_image, *variant, page=False):
+    """
+    ETag zakończonego przetworzenia; None dla obrazów w trakcie przetwarzania
+    i dla stron z oczekującymi komunikatami (304 by je pominęło)
+    """
+    if not detection_image.is_finished:
+        return None
+    parts = [
+        get_options()['version'],
+        detection_image.id,
+        detection_image.status,
+        detection_image.processed_at.isoformat() if detection_image.processed_at else '',
+        detection_image.confidence_threshold,
+        *variant,
+    ]
+    if page:
+        if len(messages.get_messages(request)):
+            return None
+        parts += [request.user.pk, request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')]
+    return make_etag(*parts)
+
+
+def result_last_modified(detection_image):
+    return detection_image.processed_at if detection_image.is_finished else None
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Odpowiedź 304 (412 dla If-Match) gdy klient ma aktualną wersję, inaczej None
+    """
+    if etag is None and last_modified is None:
+        return None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    CONDITIONAL_RESPONSES.inc(result='not_modified' if response is not None else 'full')
+    if response is not None:
+        # Nagłówki walidatorów również w odpowiedzi 304
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None, max_age=0):
+    """
+    ETag, Last-Modified i Cache-Control dla odpowiedzi prywatnej (walidowanej
+    przy każdym użyciu, chyba że max_age > 0)
+    """
+    if etag is None and last_modified is None:
+        return response
+    if etag is not None:
+        response.headers.setdefault('ETag', etag)
+    if last_modified is not None:
+        response.headers.setdefault('Last-Modified', http_date(last_modified.timestamp()))
+    if max_age:
+        patch_cache_control(response, private=True, max_age=max_age)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
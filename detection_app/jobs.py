@@ -0,0 +1,242 @@
+"""
+Kolejka zadań detekcji oparta na bazie danych
+
+Kolejką jest sama tabela DetectionImage: wiersze ze statusem 'queued' czekają
+na workera (manage.py detection_worker). Przejęcie zadania to warunkowy
+UPDATE, więc kilku workerów nie weźmie tego samego obrazu.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import metrics
+from .models import DetectionImage, DetectionVideo
+
+logger = logging.getLogger(__name__)
+
+JOBS_TOTAL = metrics.counter(
+    'detection_jobs_total', 'Zakończone zadania detekcji według rodzaju i wyniku'
+)
+
+_last_requeue = None
+_requeue_lock = threading.Lock()
+
+
+def enqueue(detection_image):
+    """
+    Wstawienie obrazu do kolejki (również ponowne - po błędzie)
+    """
+    detection_image.status = DetectionImage.STATUS_QUEUED
+    detection_image.error_message = ''
+    detection_image.started_at = None
+    detection_image.save(update_fields=['status', 'error_message', 'started_at'])
+    return detection_image
+
+
+def _claim(image_id, model=DetectionImage):
+    return model.objects.filter(
+        id=image_id, status=DetectionImage.STATUS_QUEUED
+    ).update(
+        status=DetectionImage.STATUS_RUNNING,
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    )
+
+
+def claim_next():
+    """
+    Przejęcie najstarszego zadania z kolejki; None gdy kolejka jest pusta
+    """
+    claimed = claim_batch(1)
+    return claimed[0] if claimed else None
+
+
+def claim_batch(limit):
+    """
+    Przejęcie do `limit` najstarszych zadań (pusta lista, gdy kolejka jest pusta)
+    """
+    while True:
+        candidates = list(
+            DetectionImage.objects
+            .filter(status=DetectionImage.STATUS_QUEUED)
+            .order_by('id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not candidates:
+            return []
+
+        claimed_ids = [image_id for image_id in candidates if _claim(image_id)]
+        if claimed_ids:
+            return list(DetectionImage.objects.filter(id__in=claimed_ids).order_by('id'))
+        # Inny worker był szybszy - próbujemy kolejnych zadań
+
+
+def claim(image_id):
+    """
+    Przejęcie wskazanego zadania z kolejki; None, gdy przejął je już ktoś inny
+    """
+    if not _claim(image_id):
+        return None
+    return DetectionImage.objects.get(id=image_id)
+
+
+def process_job(detection_image):
+    """
+    Wykonanie zadania; błąd zapisywany jest w wierszu zamiast przerywać workera
+    """
+    return process_jobs([detection_image])[0]
+
+
+def process_jobs(detection_images):
+    """
+    Wykonanie paczki zadań - inferencja wspólna dla obrazów o tym samym
+    modelu i progu; zwraca listę flag powodzenia w kolejności wejścia
+    """
+    from .dedup import reuse_result
+    from .detected_objects import replace_objects
+    from .pipeline import run_detection_batch
+
+    results = {}
+    groups = {}
+    for detection_image in detection_images:
+        # Identyczny obraz mógł zostać przetworzony, gdy ten czekał w kolejce
+        if reuse_result(detection_image):
+            detection_image.save()
+            replace_objects([detection_image])
+            JOBS_TOTAL.inc(kind='image', result='reused')
+            _pregenerate_derivatives(detection_image)
+            results[detection_image.id] = True
+        else:
+            key = (detection_image.model_name, detection_image.confidence_threshold)
+            groups.setdefault(key, []).append(detection_image)
+
+    for group in groups.values():
+        try:
+            outcomes = run_detection_batch(group)
+        except Exception as e:
+            outcomes = [e] * len(group)
+        for detection_image, outcome in zip(group, outcomes):
+            if isinstance(outcome, Exception):
+                _mark_failed(detection_image, outcome)
+                results[detection_image.id] = False
+            else:
+                JOBS_TOTAL.inc(kind='image', result='done')
+                _pregenerate_derivatives(detection_image)
+                results[detection_image.id] = True
+
+    return [results[detection_image.id] for detection_image in detection_images]
+
+
+def _pregenerate_derivatives(detection_image):
+    from .derivatives import pregenerate
+
+    try:
+        pregenerate(detection_image)
+    except Exception:
+        # Brakujące miniatury zostaną wygenerowane przy pierwszym żądaniu
+        logger.exception("Błąd generowania miniatur dla obrazu %s", detection_image.id)
+
+
+def _mark_failed(detection_image, error):
+    JOBS_TOTAL.inc(kind='image', result='failed')
+    logger.error("Błąd detekcji dla obrazu %s: %s", detection_image.id, error, exc_info=error)
+    DetectionImage.objects.filter(id=detection_image.id).update(
+        status=DetectionImage.STATUS_FAILED,
+        error_message=str(error),
+        processed_at=timezone.now(),
+    )
+
+
+def claim_video():
+    """
+    Przejęcie najstarszego nagrania z kolejki; None gdy brak nagrań
+    """
+    while True:
+        video_id = (
+            DetectionVideo.objects
+            .filter(status=DetectionVideo.STATUS_QUEUED)
+            .order_by('id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if video_id is None:
+            return None
+        if _claim(video_id, model=DetectionVideo):
+            return DetectionVideo.objects.get(id=video_id)
+
+
+def process_video_job(detection_video):
+    from .video import process_video
+
+    try:
+        process_video(detection_video)
+    except Exception as e:
+        JOBS_TOTAL.inc(kind='video', result='failed')
+        logger.exception("Błąd detekcji dla nagrania %s", detection_video.id)
+        DetectionVideo.objects.filter(id=detection_video.id).update(
+            status=DetectionVideo.STATUS_FAILED,
+            error_message=str(e),
+            processed_at=timezone.now(),
+        )
+        return False
+    JOBS_TOTAL.inc(kind='video', result='done')
+    return True
+
+
+def requeue_stale(timeout=None):
+    """
+    Zadania 'running' porzucone przez martwego workera wracają do kolejki
+    """
+    timeout = timeout or getattr(settings, 'DETECTION_JOB_TIMEOUT', 600)
+    deadline = timezone.now() - timedelta(seconds=timeout)
+    max_attempts = getattr(settings, 'DETECTION_JOB_MAX_ATTEMPTS', 3)
+
+    requeued = failed = 0
+    # Nagrania odświeżają started_at po każdej paczce klatek, więc dla nich
+    # limit dotyczy czasu bez postępu, a nie całego przetwarzania
+    for model in (DetectionImage, DetectionVideo):
+        stale = model.objects.filter(
+            status=DetectionImage.STATUS_RUNNING, started_at__lt=deadline
+        )
+        failed += stale.filter(attempts__gte=max_attempts).update(
+            status=DetectionImage.STATUS_FAILED,
+            error_message='Przekroczono limit czasu przetwarzania',
+        )
+        requeued += stale.update(status=DetectionImage.STATUS_QUEUED, started_at=None)
+    return requeued, failed
+
+
+def requeue_stale_periodically(timeout=None):
+    """
+    requeue_stale najwyżej raz na `timeout` sekund w procesie - wywoływane
+    w pętli workera i w puli wątków widoków; (0, 0), gdy jeszcze nie pora
+    """
+    global _last_requeue
+    timeout = timeout or getattr(settings, 'DETECTION_JOB_TIMEOUT', 600)
+    now = time.monotonic()
+    with _requeue_lock:
+        if _last_requeue is not None and now - _last_requeue < timeout:
+            return 0, 0
+        _last_requeue = now
+    requeued, failed = requeue_stale(timeout)
+    if requeued or failed:
+        logger.warning("Przywrócono %s porzuconych zadań, %s oznaczono jako błędne", requeued, failed)
+    return requeued, failed
+
+
+def queue_depth():
+    return DetectionImage.objects.filter(status=DetectionImage.STATUS_QUEUED).count()
+
+
+def video_queue_depth():
+    return DetectionVideo.objects.filter(status=DetectionVideo.STATUS_QUEUED).count()
+
+
+# Długość kolejki liczona w bazie dopiero przy odczycie metryk
+metrics.gauge('detection_queue_depth', 'Obrazy oczekujące w kolejce', function=queue_depth)
+metrics.gauge('detection_video_queue_depth', 'Nagrania oczekujące w kolejce', function=video_queue_depth)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from detection_app.detected_objects import replace_objects
+from detection_app.models import DetectedObject, DetectionImage
+
+
+class Command(BaseCommand):
+    help = "Wypełnia tabelę wykrytych obiektów na podstawie detection_results istniejących obrazów"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Liczba obrazów przetwarzanych w jednej transakcji")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Odtwórz wykrycia także dla obrazów, które już je mają")
+
+    def handle(self, *args, **options):
+        images = DetectionImage.objects.filter(status=DetectionImage.STATUS_DONE)
+        if not options['rebuild']:
+            images = images.exclude(Exists(DetectedObject.objects.filter(image_id=OuterRef('pk'))))
+        images = images.only('id', 'user_id', 'detection_results').order_by('id')
+
+        # Stronicowanie po kluczu (id > ostatnie) - stały koszt każdej porcji
+        last_id = 0
+        total_images = total_objects = 0
+        while True:
+            chunk = list(images.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            total_objects += replace_objects(chunk)
+            total_images += len(chunk)
+            last_id = chunk[-1].id
+            self.stdout.write(f"Przetworzono {total_images} obrazów ({total_objects} obiektów)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Zakończono: {total_images} obrazów, {total_objects} wykrytych obiektów"
+        ))
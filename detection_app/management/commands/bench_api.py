@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from detection_app import api
+from detection_app.benchmark import StubDetector, summarize
+from detection_app.models import ApiToken, CustomUser
+from detection_app.model_registry import registry
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+
+class Command(BaseCommand):
+    help = "Porównuje przepustowość API detekcji (JSON/npz/msgpack) z przepływem przez strony HTML"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help="Pliki lub katalogi (domyślnie media/detection_images/original)")
+        parser.add_argument('--detector', default='stub',
+                            help="'stub' (detektor zastępczy) albo 'registry' (model z DETECTION_MODELS)")
+        parser.add_argument('--stub-latency-ms', type=float, default=5.0)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=8,
+                            help="Obrazy w jednym żądaniu API w wariancie paczkowym")
+        parser.add_argument('--flows', default='html,json,npz,msgpack,json-batch',
+                            help="Mierzone przepływy, oddzielone przecinkami")
+        parser.add_argument('--allow-dedup', action='store_true',
+                            help="Nie zmieniaj plików - powtórzenia korzystają z gotowych wyników")
+
+    def collect_files(self, paths, limit):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(
+                    os.path.join(path, name) for name in sorted(os.listdir(path))
+                    if name.lower().endswith(IMAGE_EXTENSIONS)
+                )
+            else:
+                files.append(path)
+        return files[:limit] if limit else files
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [os.path.join(settings.MEDIA_ROOT, 'detection_images', 'original')]
+        files = self.collect_files(paths, options['limit'])
+        if not files:
+            raise CommandError("Brak obrazów do pomiaru")
+        self.images = []
+        for path in files:
+            with open(path, 'rb') as image_file:
+                self.images.append((os.path.basename(path), image_file.read()))
+        self.allow_dedup = options['allow_dedup']
+        self.counter = 0
+
+        flows = [flow.strip() for flow in options['flows'].split(',') if flow.strip()]
+        if 'msgpack' in flows and api._msgpack() is None:
+            self.stdout.write(self.style.WARNING("Pominięto msgpack - pakiet nie jest zainstalowany"))
+            flows.remove('msgpack')
+
+        media_root = tempfile.mkdtemp(prefix='bench-api-')
+        # Tryb bez workera: strona wyników zleca detekcję puli wątków widoków
+        overrides = {
+            'MEDIA_ROOT': media_root,
+            'DETECTION_ASYNC': False,
+            'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS) + ['localhost'],
+        }
+        user = CustomUser.objects.create(username='__bench_api__', email='bench-api@localhost')
+        try:
+            with override_settings(**overrides):
+                if options['detector'] == 'stub':
+                    registry.set_detector(
+                        settings.DETECTION_DEFAULT_MODEL, StubDetector(latency_ms=options['stub_latency_ms'])
+                    )
+                _, key = ApiToken.issue(user, 'bench_api')
+                reports = [self.measure(flow, user, key, options['batch_size']) for flow in flows]
+        finally:
+            user.delete()
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.print_reports(reports)
+
+    def _upload(self, name, data):
+        # Unikalna zawartość (bajty za końcem obrazu) - bez trafień deduplikacji
+        if not self.allow_dedup:
+            self.counter += 1
+            data = data + self.counter.to_bytes(8, 'little')
+        return SimpleUploadedFile(name, data)
+
+    def _html_flow(self, client, name, data):
+        response = client.post(reverse('object_detection_upload'), {
+            'original_image': self._upload(name, data),
+            'model_name': settings.DETECTION_DEFAULT_MODEL,
+        })
+        if response.status_code != 302:
+            raise CommandError(f"Przesłanie {name} nie powiodło się ({response.status_code})")
+        results_url = response['Location']
+        image_id = int(results_url.rstrip('/').rsplit('/', 1)[1])
+        size = len(client.get(results_url).content)
+        # Strona wyników odpytuje status aż do zakończenia, potem przeładowuje się
+        while not client.get(reverse('object_detection_status', args=[image_id])).json()['finished']:
+            time.sleep(0.005)
+        size += len(client.get(results_url).content)
+        size += len(client.get(reverse('object_detection_render', args=[image_id])).content)
+        return size
+
+    def _api_flow(self, client, key, fmt, batch):
+        response = client.post(
+            reverse('api_detect'),
+            {'image': [self._upload(name, data) for name, data in batch]},
+            HTTP_AUTHORIZATION=f'Token {key}',
+            HTTP_ACCEPT=api.CONTENT_TYPES[fmt],
+        )
+        if response.status_code != 200:
+            raise CommandError(f"API zwróciło {response.status_code}: {response.content[:200]!r}")
+        return len(response.content)
+
+    def measure(self, flow, user, key, batch_size):
+        client = Client(HTTP_HOST='localhost')
+        if flow == 'html':
+            client.force_login(user)
+            requests = [[image] for image in self.images]
+        elif flow.endswith('-batch'):
+            requests = [self.images[start:start + batch_size] for start in range(0, len(self.images), batch_size)]
+        else:
+            requests = [[image] for image in self.images]
+        fmt = flow.partition('-')[0]
+
+        latencies = []
+        sizes = []
+        wall_start = time.perf_counter()
+        for batch in requests:
+            start = time.perf_counter()
+            if flow == 'html':
+                sizes.append(self._html_flow(client, *batch[0]))
+            else:
+                sizes.append(self._api_flow(client, key, fmt, batch))
+            latencies.append(time.perf_counter() - start)
+        wall_time = time.perf_counter() - wall_start
+
+        return {
+            'flow': flow,
+            'images': len(self.images),
+            'requests': len(requests),
+            'wall_time_s': wall_time,
+            'throughput_ips': len(self.images) / wall_time if wall_time else 0.0,
+            'latency': summarize(latencies),
+            'bytes_per_image': sum(sizes) / len(self.images),
+        }
+
+    def print_reports(self, reports):
+        self.stdout.write(
+            f"{'przepływ':12} {'żądania':>8} {'p50 ms':>9} {'p95 ms':>9} {'obr./s':>9} {'bajty/obr.':>11}"
+        )
+        for report in reports:
+            self.stdout.write(
+                f"{report['flow']:12} {report['requests']:8d} {report['latency']['p50_ms']:9.2f} "
+                f"{report['latency']['p95_ms']:9.2f} {report['throughput_ips']:9.2f} "
+                f"{report['bytes_per_image']:11.0f}"
+            )
+        html = next((report for report in reports if report['flow'] == 'html'), None)
+        if html and html['throughput_ips']:
+            for report in reports:
+                if report is not html:
+                    speedup = report['throughput_ips'] / html['throughput_ips']
+                    self.stdout.write(f"  {report['flow']}: {speedup:.1f}x przepustowości przepływu HTML")
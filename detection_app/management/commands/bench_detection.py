@@ -0,0 +1,223 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from detection_app.benchmark import StageTimer, StubDetector, summarize
+from detection_app.drawing import draw_detections, encode_image
+from detection_app.labels import COCO_CLASSES
+from detection_app.models import CustomUser, DetectionImage
+from detection_app.postprocess import postprocess_batch, detections_to_json
+from detection_app.preprocessing import decode_for_display, prepare_model_input
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+STAGES = ('decode', 'preprocess', 'inference', 'process_detections', 'draw_detections', 'encode_save', 'db_write')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Mierzy czasy etapów potoku detekcji (p50/p95/p99) na zbiorze obrazów"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help="Pliki lub katalogi (domyślnie media/detection_images/original)")
+        parser.add_argument('--detector', action='append',
+                            help="'stub', 'registry[:nazwa_modelu]' albo ścieżka do klasy z metodą detect_batch; "
+                                 "podane kilka razy porównuje backendy na tym samym zbiorze")
+        parser.add_argument('--stub-latency-ms', type=float, default=5.0)
+        parser.add_argument('--repeat', type=int, default=1, help="Liczba przejść przez zbiór")
+        parser.add_argument('--warmup', type=int, default=2, help="Obrazy przetwarzane przed pomiarem")
+        parser.add_argument('--limit', type=int, default=None)
+        parser.add_argument('--output', help="Zapis wyników do pliku JSON")
+        parser.add_argument('--compare', help="Porównanie z wcześniej zapisanym plikiem JSON")
+
+    def get_detector(self, spec, stub_latency_ms):
+        if spec == 'stub':
+            return StubDetector(latency_ms=stub_latency_ms)
+        if spec == 'registry' or spec.startswith('registry:'):
+            from detection_app.model_registry import get_detector
+            return get_detector(spec.partition(':')[2] or None)
+        try:
+            return import_string(spec)()
+        except ImportError as e:
+            raise CommandError(f"Nie można zaimportować detektora {spec}: {e}")
+
+    def collect_files(self, paths, limit):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(
+                    os.path.join(path, name) for name in sorted(os.listdir(path))
+                    if name.lower().endswith(IMAGE_EXTENSIONS)
+                )
+            else:
+                files.append(path)
+        return files[:limit] if limit else files
+
+    def run_once(self, path, detector, user, output_dir):
+        preprocess = settings.DETECTION_PREPROCESS
+        timer = StageTimer()
+
+        with timer.stage('decode'):
+            display, original_size = decode_for_display(path, preprocess['display_max_size'])
+        with timer.stage('preprocess'):
+            model_input = prepare_model_input(display, preprocess['model_input_size'])
+        with timer.stage('inference'):
+            results = detector.detect_batch(model_input[None, ...])
+        with timer.stage('process_detections'):
+            detections = postprocess_batch(
+                results['detection_boxes'],
+                results['detection_scores'],
+                results['detection_classes'],
+                confidence_threshold=settings.DETECTION_CONFIDENCE_THRESHOLD,
+                **settings.DETECTION_POSTPROCESS
+            )
+            objects = detections_to_json(detections, COCO_CLASSES)
+        with timer.stage('draw_detections'):
+            image = draw_detections(display, detections['box'], detections['score'], detections['class_id'], COCO_CLASSES)
+        with timer.stage('encode_save'):
+            extension = os.path.splitext(path)[1].lower() or '.jpg'
+            with open(os.path.join(output_dir, 'processed' + extension), 'wb') as output:
+                output.write(encode_image(image, extension))
+        with timer.stage('db_write'):
+            DetectionImage.objects.create(
+                user=user,
+                original_image=os.path.basename(path),
+                processed_image='processed' + extension,
+                detection_results={'objects': objects, 'total_objects': len(objects)},
+                objects_detected=len(objects),
+                status=DetectionImage.STATUS_DONE,
+                processed_at=timezone.now(),
+            )
+        return timer.timings
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [os.path.join(settings.MEDIA_ROOT, 'detection_images', 'original')]
+        files = self.collect_files(paths, options['limit'])
+        if not files:
+            raise CommandError("Brak obrazów do pomiaru")
+        specs = options['detector'] or ['stub']
+
+        reports = []
+        for spec in specs:
+            detector = self.get_detector(spec, options['stub_latency_ms'])
+            report = self.measure(spec, detector, files, options)
+            self.print_report(report)
+            reports.append(report)
+        if len(reports) > 1:
+            self.print_backends(reports)
+
+        if options['compare']:
+            with open(options['compare']) as previous_file:
+                self.compare_reports(json.load(previous_file), reports)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(reports[0] if len(reports) == 1 else {'backends': reports}, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Zapisano wyniki: {options['output']}"))
+
+    def measure(self, spec, detector, files, options):
+        samples = {stage: [] for stage in STAGES}
+        totals = []
+        with tempfile.TemporaryDirectory() as output_dir, transaction.atomic():
+            # Zapisy do bazy są mierzone, ale wycofywane na końcu
+            user = CustomUser.objects.create(username='__bench__', email='bench@localhost')
+
+            for path in files[:options['warmup']]:
+                self.run_once(path, detector, user, output_dir)
+
+            wall_start = time.perf_counter()
+            for _ in range(options['repeat']):
+                for path in files:
+                    timings = self.run_once(path, detector, user, output_dir)
+                    for stage in STAGES:
+                        samples[stage].append(timings.get(stage, 0.0))
+                    totals.append(sum(timings.values()))
+            wall_time = time.perf_counter() - wall_start
+            transaction.set_rollback(True)
+
+        return {
+            'created_at': timezone.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'detector': spec,
+            'images': len(totals),
+            'wall_time_s': wall_time,
+            'throughput_ips': len(totals) / wall_time if wall_time else 0.0,
+            'stages': {stage: summarize(values) for stage, values in samples.items()},
+            'total': summarize(totals),
+        }
+
+    def print_backends(self, reports):
+        self.stdout.write(f"{'detektor':32} {'inferencja p50':>15} {'p95':>9} {'RAZEM p50':>10} {'obr./s':>9}")
+        for report in reports:
+            inference = report['stages']['inference']
+            self.stdout.write(
+                f"{report['detector']:32} {inference['p50_ms']:15.2f} {inference['p95_ms']:9.2f} "
+                f"{report['total']['p50_ms']:10.2f} {report['throughput_ips']:9.2f}"
+            )
+
+    def print_report(self, report):
+        self.stdout.write(f"{'etap':20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'średnia':>9}")
+        for stage, stats in list(report['stages'].items()) + [('RAZEM', report['total'])]:
+            self.stdout.write(
+                f"{stage:20} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} "
+                f"{stats['p99_ms']:9.2f} {stats['mean_ms']:9.2f}"
+            )
+        self.stdout.write(
+            f"Obrazy: {report['images']}, przepustowość: {report['throughput_ips']:.2f} obr./s "
+            f"(detektor: {report['detector']}, commit: {report['commit']})"
+        )
+
+    def compare_reports(self, previous, reports):
+        """
+        Porównanie z zapisanym plikiem - pojedynczym raportem albo raportem
+        wielu detektorów ({'backends': [...]}), parami według nazwy detektora
+        """
+        previous_reports = previous.get('backends', [previous]) if isinstance(previous, dict) else None
+        if not previous_reports or not all(isinstance(report, dict) and 'stages' in report for report in previous_reports):
+            raise CommandError("Nieobsługiwany format pliku do porównania (brak 'stages')")
+        if len(previous_reports) == 1 and len(reports) == 1:
+            pairs = [(previous_reports[0], reports[0])]
+        else:
+            by_detector = {report.get('detector'): report for report in previous_reports}
+            pairs = [(by_detector[report['detector']], report) for report in reports if report['detector'] in by_detector]
+            missing = [report['detector'] for report in reports if report['detector'] not in by_detector]
+            if not pairs:
+                raise CommandError(
+                    f"Plik do porównania nie zawiera wyników dla: {', '.join(missing)} "
+                    f"(zapisane: {', '.join(str(name) for name in by_detector)})"
+                )
+            for detector in missing:
+                self.stdout.write(self.style.WARNING(f"Brak wyników do porównania dla {detector}"))
+        for before, current in pairs:
+            self.print_comparison(before, current)
+
+    def print_comparison(self, previous, current):
+        self.stdout.write(
+            f"Porównanie z {previous.get('commit')} ({current['detector']}, p50, zmiana %):"
+        )
+        for stage, stats in current['stages'].items():
+            before = previous['stages'].get(stage, {}).get('p50_ms')
+            if before:
+                change = (stats['p50_ms'] - before) / before * 100
+                self.stdout.write(f"  {stage:20} {before:9.2f} -> {stats['p50_ms']:9.2f} ({change:+.1f}%)")
+        before = previous.get('throughput_ips')
+        if before:
+            self.stdout.write(f"  {'przepustowość':20} {before:9.2f} -> {current['throughput_ips']:9.2f} obr./s")
@@ -0,0 +1,109 @@
+import os
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from detection_app.preprocessing import decode_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+
+def legacy_preprocess(path, model_input_size):
+    """
+    Dotychczasowa ścieżka: odczyt całego pliku i dekodowanie w pełnej rozdzielczości
+    """
+    with open(path, 'rb') as image_file:
+        image_data = image_file.read()
+    image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    height, width = model_input_size
+    return image, cv2.resize(image, (width, height))
+
+
+def new_preprocess(path, model_input_size):
+    prepared = decode_image(path, model_input_size, settings.DETECTION_PREPROCESS['display_max_size'])
+    return prepared.display, prepared.model_input
+
+
+def _read_status_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise OSError(field)
+
+
+def measure_peak_mb(func, *args):
+    """
+    Szczyt pamięci podczas wywołania w MB
+
+    Na Linuksie: VmHWM po wyzerowaniu licznika przez /proc/self/clear_refs
+    (obejmuje też bufory C z PIL i OpenCV). Gdzie indziej: tracemalloc.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        baseline = _read_status_kb('VmRSS')
+        func(*args)
+        return (_read_status_kb('VmHWM') - baseline) / 1024
+    except OSError:
+        tracemalloc.start()
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / (1024 * 1024)
+
+
+class Command(BaseCommand):
+    help = "Porównuje czas i szczyt pamięci dekodowania: dotychczasowa ścieżka vs dekodowanie zmniejszone"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help="Pliki lub katalogi (domyślnie media/detection_images/original)")
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [os.path.join(settings.MEDIA_ROOT, 'detection_images', 'original')]
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(
+                    os.path.join(path, name) for name in sorted(os.listdir(path))
+                    if name.lower().endswith(IMAGE_EXTENSIONS)
+                )
+            else:
+                files.append(path)
+
+        model_input_size = settings.DETECTION_PREPROCESS['model_input_size']
+        totals = {'legacy': [0.0, 0.0], 'new': [0.0, 0.0]}
+
+        self.stdout.write(f"{'plik':40} {'rozmiar':>11} {'stary ms':>9} {'nowy ms':>9} {'stary MB':>9} {'nowy MB':>9}")
+        for path in files:
+            row = {}
+            for label, func in (('legacy', legacy_preprocess), ('new', new_preprocess)):
+                peak = measure_peak_mb(func, path, model_input_size)
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    func(path, model_input_size)
+                elapsed = (time.perf_counter() - start) / options['repeat'] * 1000
+                row[label] = (elapsed, peak)
+                totals[label][0] += elapsed
+                totals[label][1] = max(totals[label][1], peak)
+
+            height, width = legacy_preprocess(path, model_input_size)[0].shape[:2]
+            self.stdout.write(
+                f"{os.path.basename(path)[:40]:40} {f'{width}x{height}':>11} "
+                f"{row['legacy'][0]:9.1f} {row['new'][0]:9.1f} "
+                f"{row['legacy'][1]:9.1f} {row['new'][1]:9.1f}"
+            )
+
+        if files:
+            speedup = totals['legacy'][0] / max(totals['new'][0], 1e-9)
+            self.stdout.write(self.style.SUCCESS(
+                f"Łącznie: {totals['legacy'][0]:.1f} ms -> {totals['new'][0]:.1f} ms (x{speedup:.2f}), "
+                f"szczyt pamięci {totals['legacy'][1]:.1f} MB -> {totals['new'][1]:.1f} MB"
+            ))
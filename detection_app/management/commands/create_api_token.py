@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from detection_app.models import ApiToken, CustomUser
+
+
+class Command(BaseCommand):
+    help = "Wydaje token API detekcji dla użytkownika (klucz wyświetlany jest tylko raz)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--name', default='integracja', help="Nazwa tokenu widoczna w panelu administracyjnym")
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"Nie ma użytkownika {options['username']}")
+
+        token, key = ApiToken.issue(user, options['name'])
+        self.stdout.write(self.style.SUCCESS(f"Token {token.name} dla {user.username}:"))
+        self.stdout.write(key)
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from detection_app import jobs, process_pool
+from detection_app.metrics import serve_metrics
+from detection_app.model_registry import registry
+
+
+class Command(BaseCommand):
+    help = "Uruchamia workery przetwarzające kolejkę zadań detekcji"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help="Liczba wątków workera (współdzielą jeden model)")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Odstęp w sekundach między sprawdzeniami pustej kolejki")
+        parser.add_argument('--batch-size', type=int, default=8,
+                            help="Liczba zadań pobieranych naraz i przetwarzanych jedną inferencją")
+        parser.add_argument('--once', action='store_true',
+                            help="Zakończ, gdy kolejka jest pusta")
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help="Port HTTP z metrykami workera w formacie Prometheus")
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Liczba procesów inferencji (pula z pamięcią współdzieloną); "
+                                 "0 - inferencja w procesie workera")
+        parser.add_argument('--cpu-affinity', default=None,
+                            help="Przypisanie rdzeni procesom: 'auto', 'none' lub np. '0-3;4-7'")
+        parser.add_argument('--intra-op-threads', type=int, default=None,
+                            help="Wątki TensorFlow wewnątrz operacji (na proces)")
+        parser.add_argument('--inter-op-threads', type=int, default=None,
+                            help="Wątki TensorFlow między operacjami (na proces)")
+
+    def handle(self, *args, **options):
+        # Opcje puli procesów nadpisują settings.DETECTION_PROCESS_POOL
+        process_pool.configure(
+            enabled=options['processes'] > 0 if options['processes'] is not None else None,
+            processes=options['processes'] or None,
+            cpu_affinity=process_pool.parse_cpu_sets(options['cpu_affinity']),
+            intra_op_threads=options['intra_op_threads'],
+            inter_op_threads=options['inter_op_threads'],
+        )
+
+        # Model ładowany raz, zanim workery zaczną pobierać zadania
+        registry.preload()
+        for name, stats in registry.stats()['models'].items():
+            if stats['processes']:
+                self.stdout.write(f"Model {name}: procesy inferencji {stats['processes']}")
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+            self.stdout.write(f"Metryki dostępne na porcie {options['metrics_port']}")
+        # Porzucone zadania sprawdzane przy starcie i co DETECTION_JOB_TIMEOUT w pętli
+        requeued, failed = jobs.requeue_stale_periodically()
+        if requeued or failed:
+            self.stdout.write(f"Przywrócono {requeued} porzuconych zadań, {failed} oznaczono jako błędne")
+
+        stop_event = threading.Event()
+        threads = [
+            threading.Thread(
+                target=self._work_loop,
+                args=(index, stop_event, options['poll_interval'], options['batch_size'], options['once']),
+                name=f"detection-worker-{index}",
+                daemon=True,
+            )
+            for index in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(self.style.SUCCESS(f"Uruchomiono {len(threads)} workerów detekcji"))
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Zatrzymywanie workerów...")
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+    def _work_loop(self, index, stop_event, poll_interval, batch_size, once):
+        while not stop_event.is_set():
+            close_old_connections()
+            jobs.requeue_stale_periodically()
+            detection_images = jobs.claim_batch(batch_size)
+            if not detection_images:
+                # Obrazy mają pierwszeństwo - nagrania, gdy kolejka obrazów jest pusta
+                detection_video = jobs.claim_video()
+                if detection_video is not None:
+                    self._process_video(index, detection_video)
+                    continue
+                if once:
+                    break
+                stop_event.wait(poll_interval)
+                continue
+
+            started = time.perf_counter()
+            results = jobs.process_jobs(detection_images)
+            self.stdout.write(
+                f"[worker {index}] {len(detection_images)} obrazów "
+                f"({sum(results)} OK, {len(results) - sum(results)} błędów) "
+                f"w {time.perf_counter() - started:.2f}s"
+            )
+        close_old_connections()
+
+    def _process_video(self, index, detection_video):
+        ok = jobs.process_video_job(detection_video)
+        detection_video.refresh_from_db()
+        status = 'OK' if ok else 'BŁĄD'
+        self.stdout.write(
+            f"[worker {index}] wideo {detection_video.id}: {status}, "
+            f"{detection_video.frames_processed} klatek ({detection_video.processing_fps:.1f} kl./s)"
+        )
@@ -0,0 +1,180 @@
+import os
+import shutil
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from detection_app import blobs
+from detection_app.derivatives import DERIVATIVES_DIR
+from detection_app.models import DetectionImage, MediaBlob
+from detection_app.storage import walk_files
+
+MEDIA_DIRS = ('detection_images/original', 'detection_images/processed')
+
+
+class Command(BaseCommand):
+    help = "Usuwa pliki obrazów, do których nie odwołuje się żaden wiersz DetectionImage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Tylko wypisz pliki do usunięcia")
+        parser.add_argument('--grace-hours', type=float, default=24.0,
+                            help="Pomijaj pliki zmienione w tym czasie (przesyłanie w toku)")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Liczba plików sprawdzanych w bazie jednym zapytaniem")
+        parser.add_argument('--blobs-only', action='store_true',
+                            help="Tylko pliki z licznikiem 0 (bez przeglądania dysku)")
+        parser.add_argument('--rebuild-refcounts', action='store_true',
+                            help="Odtwórz liczniki odwołań z tabeli DetectionImage przed sprzątaniem")
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+        self.batch_size = options['batch_size']
+        self.cutoff = time.time() - options['grace_hours'] * 3600
+        self.removed = 0
+        self.freed = 0
+        # Przy --dry-run pliki zostają na dysku - bez ponownego liczenia w przeglądzie katalogów
+        self.listed = set()
+
+        if options['rebuild_refcounts']:
+            self.rebuild_refcounts()
+        self.collect_blobs(timezone.now() - timedelta(hours=options['grace_hours']))
+        if not options['blobs_only']:
+            scanned = self.collect_files()
+            self.collect_derivatives()
+            self.stdout.write(f"Przejrzano {scanned} plików")
+
+        verb = "Do usunięcia" if self.dry_run else "Usunięto"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb}: {self.removed} plików ({self.freed / (1024 * 1024):.1f} MB)"
+        ))
+
+    def rebuild_refcounts(self):
+        if self.dry_run:
+            self.stdout.write("Pominięto odtwarzanie liczników (--dry-run)")
+            return
+        MediaBlob.objects.update(refcount=0)
+        for field in blobs.MEDIA_FIELDS:
+            rows = (
+                DetectionImage.objects
+                .exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values(field).annotate(count=Count('id')).order_by()
+            )
+            for row in rows.iterator(chunk_size=self.batch_size):
+                blobs.acquire(row[field], row['count'])
+        self.stdout.write("Odtworzono liczniki odwołań")
+
+    def remove(self, name, path, size):
+        """
+        Usunięcie pliku bez odwołań - o ile nie został w międzyczasie użyty ponownie
+        """
+        try:
+            if os.stat(path).st_mtime >= self.cutoff:
+                return
+        except FileNotFoundError:
+            return
+        if self.dry_run:
+            if name in self.listed:
+                return
+            self.listed.add(name)
+        self.removed += 1
+        self.freed += size
+        if self.verbosity > 1 or self.dry_run:
+            self.stdout.write(f"  {name}")
+        if not self.dry_run:
+            os.remove(path)
+            MediaBlob.objects.filter(name=name, refcount__lte=0).delete()
+
+    def collect_blobs(self, updated_before):
+        """
+        Pliki z licznikiem 0 - liczniki weryfikowane w bazie przed usunięciem
+        """
+        candidates = MediaBlob.objects.filter(refcount__lte=0, updated_at__lt=updated_before).order_by('id')
+        last_id = 0
+        while True:
+            chunk = list(candidates.filter(id__gt=last_id)[:self.batch_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            references = blobs.count_references([blob.name for blob in chunk])
+            for blob in chunk:
+                if references[blob.name]:
+                    # Licznik rozstrojony (zmiany z pominięciem sygnałów)
+                    if not self.dry_run:
+                        MediaBlob.objects.filter(pk=blob.pk).update(refcount=references[blob.name])
+                    continue
+                path = os.path.join(settings.MEDIA_ROOT, blob.name)
+                if not os.path.exists(path):
+                    if not self.dry_run:
+                        blob.delete()
+                    continue
+                self.remove(blob.name, path, blob.size)
+
+    def collect_files(self):
+        """
+        Przegląd katalogów magazynu porcjami: pliki bez odwołań w bazie
+        """
+        scanned = 0
+        batch = {}
+        for directory in MEDIA_DIRS:
+            for entry in walk_files(os.path.join(settings.MEDIA_ROOT, directory)):
+                scanned += 1
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime >= self.cutoff:
+                    continue
+                name = os.path.relpath(entry.path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                if entry.name.startswith('.') and entry.name.endswith('.tmp'):
+                    # Pozostałość przerwanego zapisu
+                    self.remove(name, entry.path, stat.st_size)
+                    continue
+                batch[name] = (entry.path, stat.st_size)
+                if len(batch) >= self.batch_size:
+                    self.collect_batch(batch)
+                    batch = {}
+        if batch:
+            self.collect_batch(batch)
+        return scanned
+
+    def collect_batch(self, batch):
+        references = blobs.count_references(batch)
+        for name, (path, size) in batch.items():
+            if not references[name]:
+                self.remove(name, path, size)
+
+    def collect_derivatives(self):
+        """
+        Katalogi miniatur obrazów, których wiersze zostały usunięte
+        """
+        root = os.path.join(settings.MEDIA_ROOT, DERIVATIVES_DIR)
+        try:
+            entries = os.scandir(root)
+        except FileNotFoundError:
+            return
+        with entries:
+            chunk = {}
+            for entry in entries:
+                if entry.is_dir() and entry.name.isdigit():
+                    chunk[int(entry.name)] = entry
+                if len(chunk) >= self.batch_size:
+                    self.collect_derivative_batch(chunk)
+                    chunk = {}
+            if chunk:
+                self.collect_derivative_batch(chunk)
+
+    def collect_derivative_batch(self, chunk):
+        existing = set(DetectionImage.objects.filter(id__in=chunk).values_list('id', flat=True))
+        for image_id, entry in chunk.items():
+            if image_id in existing:
+                continue
+            for file_entry in walk_files(entry.path):
+                self.removed += 1
+                self.freed += file_entry.stat().st_size
+            if self.verbosity > 1 or self.dry_run:
+                self.stdout.write(f"  {DERIVATIVES_DIR}/{entry.name}/")
+            if not self.dry_run:
+                shutil.rmtree(entry.path, ignore_errors=True)
@@ -0,0 +1,99 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Biblioteki potrzebne tylko przy inferencji - nie powinny ładować się przy starcie
+# (object_detector - ścieżka TF Hub; widoczna także, gdy import TensorFlow się nie powiódł)
+HEAVY_MODULES = (
+    'tensorflow', 'tensorflow_hub', 'cv2', 'matplotlib', 'onnxruntime', 'tflite_runtime',
+    'detection_app.object_detector',
+)
+
+# Punkty wejścia procesu WWW (wraz z ewentualnym wstępnym ładowaniem modeli)
+WEB_MODULES = ('detection_app.wsgi', 'detection_app.asgi', 'detection_app.urls')
+
+IMPORT_SCRIPT = """
+import importlib, sys
+import django
+django.setup()
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+"""
+
+
+def parse_importtime(output):
+    """
+    Wiersze "-X importtime": lista (moduł, czas własny us, czas łączny us, poziom)
+    """
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            rows.append((name.strip(), int(self_us), int(cumulative_us), (len(name) - len(name.lstrip())) // 2))
+        except ValueError:
+            continue
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Czas importu modułów przy starcie (python -X importtime) - koszt uruchomienia procesu"
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', default=list(WEB_MODULES),
+                            help="Importowane moduły (domyślnie wsgi, asgi i urls - jak proces serwera WWW)")
+        parser.add_argument('--limit', type=int, default=25)
+        parser.add_argument('--sort', choices=('cumulative', 'self'), default='cumulative')
+        parser.add_argument('--packages', action='store_true',
+                            help="Suma czasów własnych według pakietu najwyższego poziomu")
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help="Błąd, gdy łączny czas importów przekracza budżet")
+        parser.add_argument('--fail-on-heavy', action='store_true',
+                            help="Błąd, gdy załadowano bibliotekę z HEAVY_MODULES")
+
+    def handle(self, *args, **options):
+        # Osobny proces - w bieżącym moduły są już zaimportowane
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', IMPORT_SCRIPT, *options['modules']],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f"Import nie powiódł się:\n{completed.stderr[-2000:]}")
+        rows = parse_importtime(completed.stderr)
+        if not rows:
+            raise CommandError("Brak danych -X importtime")
+
+        total_ms = sum(self_us for _, self_us, _, _ in rows) / 1000.0
+        self.stdout.write(f"Moduły: {len(rows)}, łączny czas importów: {total_ms:.1f} ms")
+
+        if options['packages']:
+            packages = defaultdict(int)
+            for name, self_us, _, _ in rows:
+                packages[name.split('.')[0]] += self_us
+            ranking = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['limit']]
+            self.stdout.write(f"{'pakiet':<40} {'ms':>9}")
+            for package, self_us in ranking:
+                self.stdout.write(f"{package:<40} {self_us / 1000.0:>9.1f}")
+        else:
+            column = 1 if options['sort'] == 'self' else 2
+            ranking = sorted(rows, key=lambda row: row[column], reverse=True)[:options['limit']]
+            self.stdout.write(f"{'moduł':<50} {'własny ms':>10} {'łączny ms':>10}")
+            for name, self_us, cumulative_us, _ in ranking:
+                self.stdout.write(f"{name:<50} {self_us / 1000.0:>10.1f} {cumulative_us / 1000.0:>10.1f}")
+
+        loaded = {name for name, _, _, _ in rows}
+        heavy = [name for name in HEAVY_MODULES if name in loaded]
+        if heavy:
+            message = f"Załadowano biblioteki inferencji: {', '.join(heavy)}"
+            if options['fail_on_heavy']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("Biblioteki inferencji nie są ładowane przy starcie"))
+        if options['budget_ms'] is not None and total_ms > options['budget_ms']:
+            raise CommandError(f"Czas importów {total_ms:.1f} ms przekracza budżet {options['budget_ms']:.1f} ms")
@@ -0,0 +1,178 @@
+import json
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from detection_app.backends import TFLiteBackend
+from detection_app.benchmark import accuracy_delta, summarize
+from detection_app.model_registry import registry
+from detection_app.models import DetectionImage
+from detection_app.postprocess import postprocess_batch
+from detection_app.preprocessing import decode_image
+
+
+class Command(BaseCommand):
+    help = (
+        "Kwantyzacja int8 (post-training) modelu detekcji do TFLite z kalibracją "
+        "na przesłanych obrazach oraz raport zmiany dokładności względem float32"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=None,
+                            help="Model z DETECTION_MODELS (domyślnie DETECTION_DEFAULT_MODEL)")
+        parser.add_argument('--saved-model', default=None,
+                            help="Katalog SavedModel zgodny z TFLite (export_tflite_graph_tf2); "
+                                 "domyślnie 'tflite_export_path' z konfiguracji modelu")
+        parser.add_argument('--output', default=None,
+                            help="Plik wynikowy .tflite (domyślnie 'quantized_path' z konfiguracji)")
+        parser.add_argument('--calibration-images', type=int, default=200,
+                            help="Liczba przesłanych obrazów w zbiorze kalibracyjnym")
+        parser.add_argument('--eval-images', type=int, default=100,
+                            help="Liczba obrazów do porównania dokładności")
+        parser.add_argument('--input-size', type=int, default=320)
+        parser.add_argument('--report', default=None, help="Zapis raportu do pliku JSON")
+        parser.add_argument('--skip-convert', action='store_true',
+                            help="Tylko raport dla istniejącego pliku --output")
+
+    def sample_images(self, limit, offset=0):
+        """
+        Ścieżki oryginałów z bazy - po jednym pliku na zawartość, najnowsze najpierw
+        """
+        paths = []
+        seen = set()
+        rows = (
+            DetectionImage.objects
+            .exclude(original_image='')
+            .order_by('-id')
+            .values_list('original_image', 'content_hash')
+            .iterator()
+        )
+        for name, content_hash in rows:
+            key = content_hash or name
+            if key in seen:
+                continue
+            seen.add(key)
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            if os.path.exists(path):
+                paths.append(path)
+            if len(paths) >= offset + limit:
+                break
+        return paths[offset:]
+
+    def load_inputs(self, paths, input_size):
+        for path in paths:
+            try:
+                yield decode_image(path, (input_size, input_size)).model_input
+            except Exception as e:
+                self.stderr.write(f"Pominięto {path}: {e}")
+
+    def convert(self, saved_model_dir, output, calibration_paths, input_size):
+        import tensorflow as tf
+
+        def representative_dataset():
+            # Normalizacja jak przy wejściu float modeli SSD MobileNet: [-1, 1]
+            for model_input in self.load_inputs(calibration_paths, input_size):
+                yield [(model_input.astype(np.float32) / 127.5 - 1.0)[None, ...]]
+
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+        ]
+        converter.inference_input_type = tf.uint8
+        # TFLite_Detection_PostProcess jest operacją niestandardową
+        converter.allow_custom_ops = True
+        model = converter.convert()
+
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'wb') as output_file:
+            output_file.write(model)
+        return len(model)
+
+    def evaluate(self, reference_detector, quantized_detector, paths, input_size):
+        options = getattr(settings, 'DETECTION_POSTPROCESS', {})
+        threshold = settings.DETECTION_CONFIDENCE_THRESHOLD
+        reference, candidate = [], []
+        timings = {'float32': [], 'int8': []}
+
+        for model_input in self.load_inputs(paths, input_size):
+            for label, detector, results in (
+                ('float32', reference_detector, reference),
+                ('int8', quantized_detector, candidate),
+            ):
+                start = time.perf_counter()
+                outputs = detector.detect_batch(model_input[None, ...])
+                timings[label].append(time.perf_counter() - start)
+                results.append(postprocess_batch(
+                    outputs['detection_boxes'],
+                    outputs['detection_scores'],
+                    outputs['detection_classes'],
+                    confidence_threshold=threshold,
+                    **options
+                ))
+
+        report = accuracy_delta(reference, candidate)
+        report['latency'] = {label: summarize(values) for label, values in timings.items()}
+        float_p50 = report['latency']['float32'].get('p50_ms')
+        int8_p50 = report['latency']['int8'].get('p50_ms')
+        report['speedup_p50'] = float_p50 / int8_p50 if float_p50 and int8_p50 else None
+        return report
+
+    def handle(self, *args, **options):
+        name = options['model'] or settings.DETECTION_DEFAULT_MODEL
+        config = settings.DETECTION_MODELS.get(name)
+        if config is None:
+            raise CommandError(f"Nieznany model: {name}")
+        output = options['output'] or config.get('quantized_path')
+        if not output:
+            raise CommandError("Podaj --output albo 'quantized_path' w konfiguracji modelu")
+        input_size = options['input_size']
+
+        calibration_paths = self.sample_images(options['calibration_images'])
+        # Obrazy oceny nie pokrywają się ze zbiorem kalibracyjnym
+        eval_paths = self.sample_images(options['eval_images'], offset=len(calibration_paths))
+        if not eval_paths:
+            eval_paths = calibration_paths[:options['eval_images']]
+
+        if not options['skip_convert']:
+            saved_model_dir = options['saved_model'] or config.get('tflite_export_path')
+            if not saved_model_dir or not os.path.isdir(saved_model_dir):
+                raise CommandError("Brak katalogu SavedModel do konwersji (--saved-model)")
+            if not calibration_paths:
+                raise CommandError("Brak przesłanych obrazów do kalibracji")
+            self.stdout.write(f"Kalibracja na {len(calibration_paths)} obrazach...")
+            size = self.convert(saved_model_dir, output, calibration_paths, input_size)
+            self.stdout.write(self.style.SUCCESS(f"Zapisano {output} ({size / 1024 / 1024:.1f} MB)"))
+
+        if not eval_paths:
+            self.stdout.write("Brak obrazów do oceny dokładności")
+            return
+
+        # Model referencyjny float32 ładowany z pominięciem DETECTION_USE_QUANTIZED
+        from detection_app.backends import create_detector
+
+        reference_detector = create_detector(
+            registry.resolve_handle(name), config.get('backend', 'tfhub'), **config.get('options', {})
+        )
+        quantized_detector = TFLiteBackend(output, **config.get('quantized_options', {}))
+        report = self.evaluate(reference_detector, quantized_detector, eval_paths, input_size)
+        report.update({'model': name, 'quantized_model': output, 'model_size_bytes': os.path.getsize(output)})
+
+        self.stdout.write(
+            f"Obrazy: {report['images']}, czułość: {report['recall']:.3f}, precyzja: {report['precision']:.3f}, "
+            f"średnie IoU: {report['mean_iou'] or 0:.3f}, |Δ pewności|: {report['mean_abs_score_delta'] or 0:.3f}"
+        )
+        self.stdout.write(
+            f"Inferencja p50: float32 {report['latency']['float32'].get('p50_ms', 0):.2f} ms, "
+            f"int8 {report['latency']['int8'].get('p50_ms', 0):.2f} ms "
+            f"(przyspieszenie x{report['speedup_p50'] or 0:.2f})"
+        )
+        if options['report']:
+            with open(options['report'], 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Zapisano raport: {options['report']}"))
@@ -0,0 +1,155 @@
+"""
+Serwowanie plików z MEDIA_ROOT
+
+Zamiast django.views.static (tylko DEBUG, bez Range i długiego cache) pliki
+wysyłane są z walidatorami (ETag z rozmiaru i czasu modyfikacji), długim
+Cache-Control - nazwy plików są unikalne, a pliki pochodne wersjonowane -
+i obsługą żądań Range. W trybie 'x-sendfile' / 'x-accel-redirect' Django
+tylko wskazuje plik, a treść (wraz z Range) wysyła serwer WWW.
+
+Bez logowania dostępne są tylko katalogi z public_media_dirs; miniatury,
+rendery i wyniki nagrań serwują widoki sprawdzające właściciela.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from .http_cache import get_options
+from .metrics import metrics
+
+MEDIA_RESPONSES = metrics.counter(
+    'detection_media_responses_total', 'Odpowiedzi dla plików z /media/ według kodu i trybu'
+)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    (początek, długość) dla pojedynczego zakresu bajtów; None gdy nagłówek
+    jest nieobsługiwany (np. wiele zakresów), ValueError gdy zakres wykracza
+    poza plik
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N - ostatnie N bajtów
+        length = min(int(last), size)
+        if length == 0:
+            raise ValueError("Pusty zakres")
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Zakres poza plikiem")
+    return start, end - start + 1
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    return parse_http_date_safe(value) == int(mtime)
+
+
+def _read_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def is_public(name):
+    """
+    Czy plik (ścieżka względem MEDIA_ROOT) leży w katalogu publicznym
+    """
+    normalized = posixpath.normpath(name.replace('\\', '/'))
+    if normalized.startswith(('/', '..')):
+        return False
+    return any(normalized.startswith(directory) for directory in get_options()['public_media_dirs'])
+
+
+def serve_file(request, name, public=True):
+    """
+    Odpowiedź dla pliku o ścieżce name względem MEDIA_ROOT
+    """
+    options = get_options()
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        file_stat = os.stat(path)
+    except (OSError, ValueError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+
+    mode = options['media_mode']
+    etag = f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(file_stat.st_mtime))
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if mode == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = path
+        elif mode == 'x-accel-redirect':
+            response = HttpResponse(content_type=content_type)
+            relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = options['accel_redirect_prefix'].rstrip('/') + '/' + quote(relative)
+        else:
+            response = _file_response(request, path, file_stat, content_type, etag)
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(file_stat.st_mtime)
+    if mode == 'django':
+        response['Accept-Ranges'] = 'bytes'
+    if response.status_code in (200, 206, 304):
+        visibility = {'public': True} if public else {'private': True}
+        patch_cache_control(response, **visibility, max_age=options['media_max_age'], immutable=True)
+    MEDIA_RESPONSES.inc(status=str(response.status_code), mode=mode)
+    return response
+
+
+def _file_response(request, path, file_stat, content_type, etag):
+    size = file_stat.st_size
+    header = request.META.get('HTTP_RANGE')
+    if header and request.method == 'GET' and _if_range_matches(request, etag, file_stat.st_mtime):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, length = byte_range
+            response = StreamingHttpResponse(
+                _read_range(open(path, 'rb'), start, length), status=206, content_type=content_type
+            )
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+            return response
+    # Pełny plik - pod WSGI wysyłany przez wsgi.file_wrapper (sendfile)
+    return FileResponse(open(path, 'rb'), content_type=content_type)
@@ -0,0 +1,203 @@
+"""
+Proste metryki procesu: liczniki, wskaźniki i histogramy
+
+Wartości trzymane są w pamięci procesu (osobno dla każdego workera) i
+udostępniane w formacie tekstowym Prometheus (render_prometheus).
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: value for key, value in self._values.items()}
+
+
+class Gauge:
+    """
+    Wartość chwilowa - ustawiana ręcznie albo liczona funkcją przy odczycie
+    """
+
+    def __init__(self, name, documentation, function=None):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def snapshot(self):
+        if self.function is not None:
+            return {(): self.function()}
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram:
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, buckets=None):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        # Indeks pierwszego kubełka, którego górna granica >= value
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'counts': [0] * (len(self.buckets) + 1),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def snapshot(self):
+        """
+        Skumulowane liczności kubełków (jak w formacie Prometheus)
+        """
+        result = {}
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = []
+                total = 0
+                for count in series['counts']:
+                    total += count
+                    cumulative.append(total)
+                result[key] = {
+                    'buckets': list(zip(self.buckets + (float('inf'),), cumulative)),
+                    'sum': series['sum'],
+                    'count': series['count'],
+                }
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, **kwargs)
+            return metric
+
+    def counter(self, name, documentation):
+        return self._get_or_create(Counter, name, documentation)
+
+    def gauge(self, name, documentation, function=None):
+        return self._get_or_create(Gauge, name, documentation, function=function)
+
+    def histogram(self, name, documentation, buckets=None):
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    def all(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+
+metrics = MetricsRegistry()
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(registry=None):
+    """
+    Wszystkie metryki w formacie tekstowym Prometheus (wersja 0.0.4)
+    """
+    registry = registry or metrics
+    lines = []
+    for metric in sorted(registry.all(), key=lambda metric: metric.name):
+        if isinstance(metric, Counter):
+            kind = 'counter'
+        elif isinstance(metric, Gauge):
+            kind = 'gauge'
+        else:
+            kind = 'histogram'
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {kind}')
+
+        try:
+            snapshot = metric.snapshot()
+        except Exception:
+            # Błąd funkcji wskaźnika (np. brak bazy) nie może zepsuć całego odczytu
+            continue
+        for key, value in sorted(snapshot.items()):
+            if kind != 'histogram':
+                lines.append(f'{metric.name}{_format_labels(key)} {_format_value(value)}')
+                continue
+            for bound, count in value['buckets']:
+                lines.append(f'{metric.name}_bucket{_format_labels(key, [("le", _format_value(bound))])} {count}')
+            lines.append(f'{metric.name}_sum{_format_labels(key)} {_format_value(value["sum"])}')
+            lines.append(f'{metric.name}_count{_format_labels(key)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    """
+    Serwer HTTP z metrykami w osobnym wątku - dla procesów bez Django HTTP
+    (worker kolejki), których metryki nie są widoczne pod /metrics/ aplikacji
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
@@ -0,0 +1,52 @@
+"""
+Middleware zbierające metryki żądań HTTP
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import metrics
+
+HTTP_REQUESTS = metrics.counter(
+    'detection_http_requests_total', 'Obsłużone żądania HTTP według widoku, metody i kodu odpowiedzi'
+)
+HTTP_LATENCY = metrics.histogram(
+    'detection_http_request_seconds', 'Czas obsługi żądania HTTP według widoku'
+)
+
+
+class MetricsMiddleware:
+    """
+    Liczba i czas obsługi żądań; etykietą jest nazwa widoku z urls.py, a nie
+    ścieżka, żeby identyfikatory obrazów nie mnożyły serii
+
+    Działa w trybie synchronicznym i asynchronicznym - pod ASGI nie wymusza
+    wykonywania widoków async w osobnym wątku.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    def _record(self, request, response, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=str(response.status_code))
+        HTTP_LATENCY.observe(elapsed, view=view)
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+def mark_processed_as_done(apps, schema_editor):
+    # Obrazy przetworzone przed wprowadzeniem kolejki mają już wyniki
+    DetectionImage = apps.get_model('detection_app', 'DetectionImage')
+    DetectionImage.objects.exclude(processed_image='').exclude(processed_image__isnull=True).update(status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_app', '0003_detectionimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionimage',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='detectionimage',
+            name='error_message',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='detectionimage',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detectionimage',
+            name='status',
+            field=models.CharField(choices=[('queued', 'W kolejce'), ('running', 'W trakcie'), ('done', 'Ukończono'), ('failed', 'Błąd')], db_index=True, default='queued', max_length=10),
+        ),
+        migrations.RunPython(mark_processed_as_done, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:41
+
+import detection_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_app', '0004_detectionimage_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionimage',
+            name='confidence_threshold',
+            field=models.FloatField(default=0.5),
+        ),
+        migrations.AddField(
+            model_name='detectionimage',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='detectionimage',
+            name='model_name',
+            field=models.CharField(default=detection_app.models.default_detection_model, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='detectionimage',
+            name='result_reused',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='detectionimage',
+            index=models.Index(fields=['content_hash', 'model_name', 'confidence_threshold'], name='detection_result_cache_idx'),
+        ),
+    ]
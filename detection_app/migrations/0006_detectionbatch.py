@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_app', '0005_detectionimage_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('total_images', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detection_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'paczka obrazów',
+                'verbose_name_plural': 'paczki obrazów',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='detectionimage',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='images', to='detection_app.detectionbatch'),
+        ),
+    ]
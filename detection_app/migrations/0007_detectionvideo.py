@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:46
+
+import detection_app.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_app', '0006_detectionbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionVideo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video', models.FileField(upload_to='detection_videos/original/')),
+                ('sample_fps', models.FloatField(default=1.0, verbose_name='klatki na sekundę do analizy')),
+                ('model_name', models.CharField(default=detection_app.models.default_detection_model, max_length=50)),
+                ('confidence_threshold', models.FloatField(default=0.5)),
+                ('results_file', models.FileField(blank=True, null=True, upload_to='detection_videos/results/')),
+                ('summary', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('queued', 'W kolejce'), ('running', 'W trakcie'), ('done', 'Ukończono'), ('failed', 'Błąd')], db_index=True, default='queued', max_length=10)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('frames_total', models.PositiveIntegerField(default=0)),
+                ('frames_processed', models.PositiveIntegerField(default=0)),
+                ('objects_detected', models.PositiveIntegerField(default=0)),
+                ('processing_fps', models.FloatField(default=0.0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detection_videos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'nagranie do detekcji',
+                'verbose_name_plural': 'nagrania do detekcji',
+                'ordering': ['-uploaded_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_app', '0007_detectionvideo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionimage',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
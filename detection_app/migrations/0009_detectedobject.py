@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_app', '0008_detectionimage_stage_timings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectedObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_id', models.PositiveSmallIntegerField()),
+                ('confidence', models.FloatField()),
+                ('ymin', models.FloatField()),
+                ('xmin', models.FloatField()),
+                ('ymax', models.FloatField()),
+                ('xmax', models.FloatField()),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detected_objects', to='detection_app.detectionimage')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='detected_objects', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'wykryty obiekt',
+                'verbose_name_plural': 'wykryte obiekty',
+                'indexes': [models.Index(fields=['user', 'class_id', 'confidence'], name='detected_object_query_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_app', '0009_detectedobject'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='detectionimage',
+            index=models.Index(fields=['user', '-uploaded_at', '-id'], name='detection_history_idx'),
+        ),
+    ]
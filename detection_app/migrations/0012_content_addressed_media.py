@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:14
+
+import detection_app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_app', '0011_apitoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionimage',
+            name='original_filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='detectionimage',
+            name='original_image',
+            field=models.ImageField(db_index=True, max_length=255, storage=detection_app.storage.get_media_storage, upload_to='detection_images/original/'),
+        ),
+        migrations.AlterField(
+            model_name='detectionimage',
+            name='processed_image',
+            field=models.ImageField(blank=True, db_index=True, max_length=255, null=True, storage=detection_app.storage.get_media_storage, upload_to='detection_images/processed/'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'plik',
+                'verbose_name_plural': 'pliki',
+                'indexes': [models.Index(fields=['refcount', 'updated_at'], name='media_blob_gc_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detection_app', '0012_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionimage',
+            name='raw_output',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
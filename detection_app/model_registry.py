@@ -0,0 +1,270 @@
+"""
+Rejestr modeli detekcji
+
+Każdy skonfigurowany model jest ładowany co najwyżej raz na proces i
+współdzielony przez wszystkie widoki. Konfiguracja w settings.DETECTION_MODELS.
+"""
+import logging
+import os
+import resource
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+def get_resident_memory_mb():
+    """
+    Aktualna pamięć rezydentna procesu (RSS) w MB
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Brak /proc (np. macOS) - szczytowe RSS jest najlepszym przybliżeniem
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ModelRegistry:
+    """
+    Leniwie ładowane, współdzielone w procesie instancje detektorów (backends.py)
+    """
+
+    def __init__(self):
+        self._detectors = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._model_locks = {}
+        self._engines = {}
+
+    def _get_config(self, name):
+        models = getattr(settings, 'DETECTION_MODELS', {})
+        if name not in models:
+            raise ImproperlyConfigured(f"Nieznany model detekcji: {name}")
+        return models[name]
+
+    def resolve_handle(self, name):
+        """
+        Wybór źródła modelu: lokalny SavedModel, a w razie jego braku
+        adres TF Hub (rozwiązywany z lokalnego cache, jeśli jest wypełniony)
+        """
+        config = self._get_config(name)
+        path = config.get('path')
+        if config.get('backend', 'tfhub') != 'tfhub':
+            # Backendy SavedModel, TFLite i ONNX ładują wyłącznie pliki lokalne
+            if not path:
+                raise ImproperlyConfigured(f"Model {name}: brak ścieżki 'path'")
+            return str(path)
+        if path and os.path.isdir(path):
+            return path
+
+        cache_dir = getattr(settings, 'TFHUB_CACHE_DIR', None)
+        if cache_dir:
+            os.environ.setdefault('TFHUB_CACHE_DIR', str(cache_dir))
+
+        url = config.get('url')
+        if not url:
+            raise ImproperlyConfigured(
+                f"Model {name}: brak katalogu {path} i brak adresu url"
+            )
+        return url
+
+    def quantized_path(self, name):
+        """
+        Ścieżka modelu int8, gdy włączono DETECTION_USE_QUANTIZED i plik istnieje
+        """
+        config = self._get_config(name)
+        path = config.get('quantized_path')
+        if not getattr(settings, 'DETECTION_USE_QUANTIZED', False) or not path:
+            return None
+        if config.get('backend', 'tfhub') != 'tfhub':
+            raise ImproperlyConfigured(f"Model {name}: wariant int8 obsługuje tylko backend 'tfhub'")
+        return str(path) if os.path.exists(path) else None
+
+    def get(self, name=None):
+        """
+        Zwraca współdzieloną instancję detektora (ładuje ją przy pierwszym użyciu)
+        """
+        name = name or settings.DETECTION_DEFAULT_MODEL
+        detector = self._detectors.get(name)
+        if detector is not None:
+            return detector
+
+        with self._lock:
+            model_lock = self._model_locks.setdefault(name, threading.Lock())
+
+        # Osobna blokada na model - ładowanie jednego modelu nie blokuje innych
+        with model_lock:
+            detector = self._detectors.get(name)
+            if detector is None:
+                detector = self._load(name)
+                self._detectors[name] = detector
+        return detector
+
+    def set_detector(self, name, detector):
+        """
+        Podmiana instancji modelu (pomiary z detektorem zastępczym)
+        """
+        with self._lock:
+            self._detectors[name] = detector
+            self._engines.pop(name, None)
+
+    def _load(self, name):
+        from . import process_pool
+        from .backends import create_detector
+
+        config = self._get_config(name)
+        handle = self.resolve_handle(name)
+
+        memory_before = get_resident_memory_mb()
+        start = time.perf_counter()
+        options = dict(config.get('options', {}))
+        quantized_path = self.quantized_path(name)
+        if quantized_path:
+            options['quantized_model'] = quantized_path
+            options['num_threads'] = config.get('quantized_options', {}).get('num_threads')
+        pool_options = process_pool.get_options()
+        if pool_options['enabled'] and not process_pool.in_worker_process():
+            # Model ładowany jest w procesach puli, a nie w tym procesie
+            detector = process_pool.InferenceProcessPool(name, **pool_options)
+        else:
+            detector = create_detector(handle, config.get('backend', 'tfhub'), **options)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        detector.warmup(tuple(config.get('warmup_size', (320, 320))))
+        warmup_time = time.perf_counter() - start
+        memory_after = get_resident_memory_mb()
+
+        self._stats[name] = {
+            'handle': str(handle),
+            'backend': config.get('backend', 'tfhub'),
+            'quantized': bool(quantized_path),
+            'processes': detector.pids() if hasattr(detector, 'pids') else [],
+            'load_time': load_time,
+            'warmup_time': warmup_time,
+            'memory_mb': memory_after - memory_before,
+            'loaded_at': time.time(),
+        }
+        return detector
+
+    def get_engine(self, name=None):
+        """
+        Silnik mikro-batchowania dla modelu; None gdy batchowanie jest wyłączone
+        """
+        options = getattr(settings, 'DETECTION_BATCHING', {})
+        if not options.get('enabled'):
+            return None
+
+        name = name or settings.DETECTION_DEFAULT_MODEL
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+
+        detector = self.get(name)
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is None:
+                from .batching import BatchingEngine
+
+                config = self._get_config(name)
+                engine = BatchingEngine(
+                    detector,
+                    # Model może ograniczać rozmiar paczki (np. eksport z batch=1)
+                    max_batch_size=config.get('max_batch_size', options.get('max_batch_size', 8)),
+                    max_wait_ms=options.get('max_wait_ms', 10),
+                    input_size=options.get('input_size', (320, 320)),
+                    model_name=name,
+                )
+                self._engines[name] = engine
+        return engine
+
+    def available_models(self):
+        """
+        Modele do wyboru w formularzach: (nazwa, etykieta) dla modeli, których
+        pliki istnieją lub które mają adres TF Hub
+        """
+        choices = []
+        for name, config in getattr(settings, 'DETECTION_MODELS', {}).items():
+            path = config.get('path')
+            if config.get('backend', 'tfhub') == 'tfhub':
+                available = bool(config.get('url')) or bool(path and os.path.isdir(path))
+            else:
+                available = bool(path and os.path.exists(path))
+            if available:
+                choices.append((name, config.get('label', name)))
+        return choices
+
+    def preload(self, names=None):
+        """
+        Załadowanie i rozgrzanie modeli przy starcie procesu; błąd jednego
+        modelu (np. brak TensorFlow lub dostępu do TF Hub) jest logowany i nie
+        przerywa startu - model zostanie załadowany przy pierwszym użyciu
+        """
+        loaded = []
+        # Bez jawnej listy - tylko modele, których pliki są dostępne
+        for name in names or [name for name, _ in self.available_models()]:
+            try:
+                self.get(name)
+            except Exception:
+                logger.exception("Nie udało się wstępnie załadować modelu %s", name)
+            else:
+                loaded.append(name)
+        return loaded
+
+    def stats(self):
+        """
+        Czasy ładowania, rozgrzewania i zużycie pamięci dla załadowanych modeli
+        """
+        from .batching import BATCH_SIZE, QUEUE_WAIT, INFERENCE_SECONDS
+
+        return {
+            'process_rss_mb': get_resident_memory_mb(),
+            'pid': os.getpid(),
+            'models': {name: dict(stats) for name, stats in self._stats.items()},
+            'batching': {
+                name: {
+                    'batch_size': _histogram_json(BATCH_SIZE, model=name),
+                    'queue_wait_seconds': _histogram_json(QUEUE_WAIT, model=name),
+                    'inference_seconds': _histogram_json(INFERENCE_SECONDS, model=name),
+                }
+                for name in self._stats
+            },
+        }
+
+
+def _histogram_json(histogram, **labels):
+    key = tuple(sorted(labels.items()))
+    series = histogram.snapshot().get(key, {'buckets': [], 'sum': 0.0, 'count': 0})
+    return {
+        'buckets': {str(bound): count for bound, count in series['buckets']},
+        'sum': series['sum'],
+        'count': series['count'],
+    }
+
+
+registry = ModelRegistry()
+
+
+def get_detector(name=None):
+    return registry.get(name)
+
+
+def get_engine(name=None):
+    return registry.get_engine(name)
+
+
+def preload_models():
+    """
+    Wywoływane z wsgi/asgi - przy DETECTION_PRELOAD_MODELS ładuje modele
+    zanim worker przyjmie pierwsze żądanie
+
+    Tylko gdy procesy WWW same wykonują detekcję (DETECTION_ASYNC = False);
+    przy kolejce zadań modele ładuje detection_worker, a procesy WWW nie
+    importują TensorFlow przy starcie.
+    """
+    if getattr(settings, 'DETECTION_PRELOAD_MODELS', False) and not settings.DETECTION_ASYNC:
+        registry.preload()
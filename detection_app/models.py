@@ -1,6 +1,13 @@
+import hashlib
+import os
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
+from django.conf import settings
+
+from .storage import get_media_storage
 
 class CustomUser(AbstractUser):
     """
@@ -61,29 +68,232 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Profil: {self.user.username}"
     
+def default_detection_model():
+    return settings.DETECTION_DEFAULT_MODEL
+
+
+class DetectionBatch(models.Model):
+    """ Zbiorcze przesłanie wielu obrazów (lub archiwum ZIP) jako jedno zadanie"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='detection_batches')
+    name = models.CharField(max_length=255, blank=True)
+    total_images = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "paczka obrazów"
+        verbose_name_plural = "paczki obrazów"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Paczka {self.id} - {self.user.username} ({self.total_images} obrazów)"
+    
+    def status_counts(self):
+        """
+        Liczba obrazów w każdym stanie - jedno zapytanie z grupowaniem
+        """
+        counts = {status: 0 for status, _ in DetectionImage.STATUS_CHOICES}
+        rows = self.images.values('status').annotate(count=models.Count('id')).order_by()
+        for row in rows:
+            counts[row['status']] = row['count']
+        return counts
+
+
 class DetectionImage(models.Model):
     """ Model do przechowywania przesyłanych obrazów i wyników detekcji"""
+    # Statusy zadania detekcji (kolejka w bazie danych)
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'W kolejce'),
+        (STATUS_RUNNING, 'W trakcie'),
+        (STATUS_DONE, 'Ukończono'),
+        (STATUS_FAILED, 'Błąd'),
+    ]
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='detection_images')
-    original_image = models.ImageField(upload_to='detection_images/original/')
-    processed_image = models.ImageField(upload_to='detection_images/processed/', blank=True, null=True)
+    batch = models.ForeignKey(DetectionBatch, on_delete=models.CASCADE, related_name='images', blank=True, null=True)
+    # Pliki adresowane zawartością (storage.py) - wspólne dla wielu wierszy,
+    # usuwane przez gc_media; indeksy dla wyszukiwania odwołań do pliku
+    original_image = models.ImageField(
+        upload_to='detection_images/original/', storage=get_media_storage, max_length=255, db_index=True
+    )
+    processed_image = models.ImageField(
+        upload_to='detection_images/processed/', storage=get_media_storage, max_length=255,
+        blank=True, null=True, db_index=True
+    )
+    # Nazwa pliku nadana przez użytkownika (nazwa na dysku to skrót zawartości)
+    original_filename = models.CharField(max_length=255, blank=True)
+    
+    # SHA-256 zawartości pliku - wspólna kopia na dysku i ponowne użycie wyników
+    content_hash = models.CharField(max_length=64, blank=True)
     
     # Wyniki detekcji
     detection_results = models.JSONField(default=dict, blank=True)  
+    # Wszystkie wykrycia modelu jako rekordy float16 (raw_results.py) - zmiana
+    # progu lub filtra klas bez ponownej inferencji
+    raw_output = models.BinaryField(blank=True, null=True)
+    model_name = models.CharField(max_length=50, default=default_detection_model)
+    confidence_threshold = models.FloatField(default=0.5)
+    result_reused = models.BooleanField(default=False)
     
     # Metadane
     uploaded_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(blank=True, null=True)
     
+    # Stan zadania
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    
     # Statystyki
     objects_detected = models.IntegerField(default=0)
     processing_time = models.FloatField(default=0.0)  
+    # Czasy etapów w sekundach: decode, inference, postprocess, draw, save
+    stage_timings = models.JSONField(default=dict, blank=True)
     
     class Meta:
         verbose_name = "obraz do detekcji"
         verbose_name_plural = "obrazy do detekcji"
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['content_hash', 'model_name', 'confidence_threshold'], name='detection_result_cache_idx'),
+            # Historia użytkownika: paginacja po kluczu (uploaded_at, id)
+            models.Index(fields=['user', '-uploaded_at', '-id'], name='detection_history_idx'),
+        ]
     
     def __str__(self):
         return f"Obraz {self.id} - {self.user.username} - {self.uploaded_at.strftime('%Y-%m-%d %H:%M')}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @property
+    def display_name(self):
+        return self.original_filename or os.path.basename(self.original_image.name)
+
+
+class DetectedObject(models.Model):
+    """ Pojedyncze wykrycie - kopia detection_results w postaci tabeli do zapytań"""
+    image = models.ForeignKey(DetectionImage, on_delete=models.CASCADE, related_name='detected_objects')
+    # Kopia image.user_id - indeks (użytkownik, klasa, pewność) bez złączenia
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='detected_objects', db_index=False)
+    class_id = models.PositiveSmallIntegerField()
+    confidence = models.FloatField()
+    
+    # Ramka znormalizowana do [0, 1]
+    ymin = models.FloatField()
+    xmin = models.FloatField()
+    ymax = models.FloatField()
+    xmax = models.FloatField()
+    
+    class Meta:
+        verbose_name = "wykryty obiekt"
+        verbose_name_plural = "wykryte obiekty"
+        indexes = [
+            models.Index(fields=['user', 'class_id', 'confidence'], name='detected_object_query_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Obiekt {self.class_id} ({self.confidence:.2f}) na obrazie {self.image_id}"
+
+
+class DetectionVideo(models.Model):
+    """ Nagranie wideo przetwarzane klatka po klatce (z próbkowaniem)"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='detection_videos')
+    video = models.FileField(upload_to='detection_videos/original/')
+    sample_fps = models.FloatField(default=1.0, verbose_name="klatki na sekundę do analizy")
+    model_name = models.CharField(max_length=50, default=default_detection_model)
+    confidence_threshold = models.FloatField(default=0.5)
     
+    # Wykrycia zapisywane przyrostowo do pliku binarnego (video.VIDEO_DETECTION_DTYPE)
+    results_file = models.FileField(upload_to='detection_videos/results/', blank=True, null=True)
+    summary = models.JSONField(default=dict, blank=True)
     
+    # Stan zadania
+    status = models.CharField(max_length=10, choices=DetectionImage.STATUS_CHOICES, default=DetectionImage.STATUS_QUEUED, db_index=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    
+    # Metadane i statystyki
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    frames_total = models.PositiveIntegerField(default=0)
+    frames_processed = models.PositiveIntegerField(default=0)
+    objects_detected = models.PositiveIntegerField(default=0)
+    processing_fps = models.FloatField(default=0.0)
+    
+    STATUS_QUEUED = DetectionImage.STATUS_QUEUED
+    STATUS_RUNNING = DetectionImage.STATUS_RUNNING
+    STATUS_DONE = DetectionImage.STATUS_DONE
+    STATUS_FAILED = DetectionImage.STATUS_FAILED
+    
+    class Meta:
+        verbose_name = "nagranie do detekcji"
+        verbose_name_plural = "nagrania do detekcji"
+        ordering = ['-uploaded_at']
+    
+    def __str__(self):
+        return f"Wideo {self.id} - {self.user.username}"
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class ApiToken(models.Model):
+    """ Token dostępu do API detekcji (api.py) - w bazie tylko skrót SHA-256"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100, verbose_name="nazwa")
+    # Pierwsze znaki tokenu - do rozpoznania go na liście bez ujawniania całości
+    prefix = models.CharField(max_length=8)
+    key_hash = models.CharField(max_length=64, unique=True)
+    is_active = models.BooleanField(default=True, verbose_name="aktywny")
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = "token API"
+        verbose_name_plural = "tokeny API"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.name} ({self.prefix}…) - {self.user.username}"
+    
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+    
+    @classmethod
+    def issue(cls, user, name):
+        """
+        Nowy token; zwraca (ApiToken, klucz) - klucz nie jest nigdzie zapisywany
+        """
+        key = secrets.token_urlsafe(32)
+        token = cls.objects.create(user=user, name=name, prefix=key[:8], key_hash=cls.hash_key(key))
+        return token, key
+
+
+class MediaBlob(models.Model):
+    """ Plik magazynu adresowanego zawartością z licznikiem odwołań z DetectionImage"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Chwila ostatniej zmiany licznika - gc_media pomija świeżo zwolnione pliki
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "plik"
+        verbose_name_plural = "pliki"
+        indexes = [
+            # Kandydaci do usunięcia: refcount <= 0
+            models.Index(fields=['refcount', 'updated_at'], name='media_blob_gc_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
@@ -1,23 +1,56 @@
 import tensorflow as tf
 import tensorflow_hub as hub
+import logging
 import numpy as np
-import cv2
-import matplotlib.pyplot as plt
 import warnings
 import os
 from PIL import Image
 from django.conf import settings
 
+from .drawing import draw_detections, save_processed_image
+from .labels import COCO_CLASSES  # noqa: F401 - dotychczasowe miejsce importu
+from .postprocess import postprocess_batch
+from .preprocessing import decode_image
+
 warnings.filterwarnings('ignore')
 
+logger = logging.getLogger(__name__)
+
 class ObjectDetector:
-    def __init__(self, model_url):
+    def __init__(self, model_url, quantized_model=None, num_threads=None):
         """
         Inicjalizacja detektora obiektów
+
+        model_url może być adresem TensorFlow Hub albo ścieżką do lokalnego
+        katalogu SavedModel (hub.load obsługuje oba warianty).
+
+        quantized_model - ścieżka do modelu TFLite int8 (manage.py
+        quantize_detector); gdy podana, inferencja wykonywana jest przez
+        interpreter TFLite, a model float32 nie jest ładowany.
         """
-        print("Ładowanie modelu z TensorFlow Hub...")
-        self.detector = hub.load(model_url)
-        print("Model załadowany pomyślnie!")
+        self.model_url = model_url
+        self.quantized = None
+        self.detector = None
+        if quantized_model:
+            from .backends import TFLiteBackend
+
+            logger.info("Ładowanie modelu int8: %s", quantized_model)
+            self.quantized = TFLiteBackend(quantized_model, num_threads=num_threads)
+        else:
+            logger.info("Ładowanie modelu: %s", model_url)
+            self.detector = hub.load(model_url)
+        logger.info("Model załadowany pomyślnie: %s", quantized_model or model_url)
+
+    def warmup(self, input_size=(320, 320)):
+        """
+        Rozgrzanie modelu sztucznym tensorem (pierwsze wywołanie buduje graf)
+        """
+        height, width = input_size
+        if self.quantized is not None:
+            self.quantized.warmup(input_size)
+            return
+        dummy = tf.zeros((1, height, width, 3), dtype=tf.uint8)
+        self.detect_objects(dummy)
         
     def load_and_preprocess_image(self, image_path):
         """
@@ -30,22 +63,17 @@ class ObjectDetector:
         
         return image_np, input_tensor
     
-    def load_and_preprocess_from_file(self, image_file):
+    def load_and_preprocess_from_file(self, image_file, model_input_size=(320, 320), display_max_size=1280):
         """
         Wczytanie oraz konwersja obrazu z pliku Django
+
+        Obraz dekodowany jest w zmniejszonej rozdzielczości (preprocessing.decode_image);
+        zwracany obraz służy do rysowania, tensor ma rozmiar wejścia modelu.
         """
-        # Odczytaj dane obrazu
-        image_data = image_file.read()
-        image_array = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        prepared = decode_image(image_file, model_input_size, display_max_size)
+        image_tensor = tf.convert_to_tensor(prepared.model_input)[tf.newaxis, ...]
         
-        # Konwersja do tensoru
-        image_tensor = tf.convert_to_tensor(image)
-        image_tensor = image_tensor[tf.newaxis, ...]
-        image_tensor = image_tensor[:, :, :, :3]
-        
-        return image, image_tensor
+        return prepared.display, image_tensor
     
     def detect_objects(self, image_tensor):
         """
@@ -53,89 +81,44 @@ class ObjectDetector:
         """
         results = self.detector(image_tensor)
         return results
+
+    def detect_batch(self, images):
+        """
+        Detekcja dla paczki obrazów uint8 (N, H, W, 3) - wyniki jako tablice NumPy
+        """
+        if self.quantized is not None:
+            return self.quantized.detect_batch(np.asarray(images, dtype=np.uint8))
+        results = self.detect_objects(tf.convert_to_tensor(images, dtype=tf.uint8))
+        return {
+            key: results[key].numpy()
+            for key in ('detection_boxes', 'detection_scores', 'detection_classes', 'num_detections')
+            if key in results
+        }
     
-    def process_detections(self, results, confidence_threshold=0.24):
+    def process_detections(self, results, confidence_threshold=0.24, **options):
         """
-        Przetworzenie wyników detekcji
+        Przetworzenie wyników detekcji dla pierwszego obrazu w paczce
+
+        Dodatkowe opcje (class_thresholds, allowed_classes, nms_iou, top_k)
+        przekazywane są do postprocess.postprocess_batch.
         """
-        # Pobranie wyników
-        boxes = results['detection_boxes'][0].numpy()
-        scores = results['detection_scores'][0].numpy()
-        classes = results['detection_classes'][0].numpy().astype(int)
-        
-        # Filtrowanie detekcji na podstawie progu pewności
-        valid_detections = scores > confidence_threshold
-        filtered_boxes = boxes[valid_detections]
-        filtered_scores = scores[valid_detections]
-        filtered_classes = classes[valid_detections]
-        
-        return filtered_boxes, filtered_scores, filtered_classes
+        detections = postprocess_batch(
+            results['detection_boxes'][:1],
+            results['detection_scores'][:1],
+            results['detection_classes'][:1],
+            confidence_threshold=confidence_threshold,
+            **options
+        )
+        return detections['box'], detections['score'], detections['class_id']
     
     def draw_detections(self, image, boxes, scores, classes, class_names):
         """
         Rysowanie detection boxes i etykiet na obrazie
         """
-        image_with_detections = image.copy()
-        height, width = image.shape[:2]
-        
-        for i, (box, score, class_id) in enumerate(zip(boxes, scores, classes)):
-            # Konwersja współrzędnych
-            ymin, xmin, ymax, xmax = box
-            xmin = int(xmin * width)
-            xmax = int(xmax * width)
-            ymin = int(ymin * height)
-            ymax = int(ymax * height)
-            
-            # Rysowanie bounding box
-            cv2.rectangle(image_with_detections, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
-            
-            # Przygotowanie etykiety
-            label = f"{class_names[class_id]}: {score:.2f}"
-            
-            # Rysowanie etykiety
-            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)[0]
-            cv2.rectangle(image_with_detections, 
-                         (xmin, ymin - label_size[1] - 10),
-                         (xmin + label_size[0], ymin),
-                         (0, 255, 0), -1)
-            cv2.putText(image_with_detections, label, 
-                       (xmin, ymin - 5), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
-        
-        return image_with_detections
+        return draw_detections(image, boxes, scores, classes, class_names)
     
     def save_processed_image(self, image, filename):
         """
         Zapis przetworzonego obrazu
         """
-        # Konwersja RGB to BGR dla OpenCV
-        image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        
-        # Ścieżka do zapisu
-        filepath = os.path.join(settings.MEDIA_ROOT, 'detection_images/processed/', filename)
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
-        # Zapis obrazu
-        cv2.imwrite(filepath, image_bgr)
-        
-        return f'detection_images/processed/{filename}'
-
-# Słownik klas COCO
-COCO_CLASSES = {
-    1: 'person', 2: 'bicycle', 3: 'car', 4: 'motorcycle', 5: 'airplane',
-    6: 'bus', 7: 'train', 8: 'truck', 9: 'boat', 10: 'traffic light',
-    11: 'fire hydrant', 13: 'stop sign', 14: 'parking meter', 15: 'bench',
-    16: 'bird', 17: 'cat', 18: 'dog', 19: 'horse', 20: 'sheep', 21: 'cow',
-    22: 'elephant', 23: 'bear', 24: 'zebra', 25: 'giraffe', 27: 'backpack',
-    28: 'umbrella', 31: 'handbag', 32: 'tie', 33: 'suitcase', 34: 'frisbee',
-    35: 'skis', 36: 'snowboard', 37: 'sports ball', 38: 'kite', 39: 'baseball bat',
-    40: 'baseball glove', 41: 'skateboard', 42: 'surfboard', 43: 'tennis racket',
-    44: 'bottle', 46: 'wine glass', 47: 'cup', 48: 'fork', 49: 'knife', 50: 'spoon',
-    51: 'bowl', 52: 'banana', 53: 'apple', 54: 'sandwich', 55: 'orange',
-    56: 'broccoli', 57: 'carrot', 58: 'hot dog', 59: 'pizza', 60: 'donut',
-    61: 'cake', 62: 'chair', 63: 'couch', 64: 'potted plant', 65: 'bed',
-    67: 'dining table', 70: 'toilet', 72: 'tv', 73: 'laptop', 74: 'mouse',
-    75: 'remote', 76: 'keyboard', 77: 'cell phone', 78: 'microwave', 79: 'oven',
-    80: 'toaster', 81: 'sink', 82: 'refrigerator', 84: 'book', 85: 'clock',
-    86: 'vase', 87: 'scissors', 88: 'teddy bear', 89: 'hair drier', 90: 'toothbrush'
-}
\ No newline at end of file
+        return save_processed_image(image, filename)
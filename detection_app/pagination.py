@@ -0,0 +1,94 @@
+"""
+Paginacja po kluczu (keyset) dla list uporządkowanych malejąco po dacie
+
+Zamiast OFFSET każda strona zaczyna się za ostatnim wierszem poprzedniej
+(WHERE (uploaded_at, id) < kursor), więc koszt strony nie zależy od jej
+numeru, a zapytanie korzysta z indeksu (user, uploaded_at, id). Liczba
+wszystkich wierszy jest liczona rzadko i trzymana w cache.
+"""
+import base64
+import binascii
+import hashlib
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import Q
+
+COUNT_CACHE_TIMEOUT = 60
+
+
+def encode_cursor(timestamp, pk):
+    value = f'{timestamp.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(value).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    (data, id) z kursora; ValueError dla niepoprawnego kursora
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Niepoprawny kursor: {cursor}") from e
+
+
+class KeysetPage:
+    """
+    Strona wyników z kursorami do sąsiednich stron
+    """
+
+    def __init__(self, items, field, has_next, has_previous):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = encode_cursor(getattr(items[-1], field), items[-1].pk) if items and has_next else None
+        self.previous_cursor = encode_cursor(getattr(items[0], field), items[0].pk) if items and has_previous else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def paginate(queryset, after=None, before=None, per_page=10, field='uploaded_at'):
+    """
+    Strona malejąco po (field, pk): za kursorem after albo przed kursorem before
+
+    Niepoprawny kursor zgłasza ValueError.
+    """
+    if before:
+        timestamp, pk = decode_cursor(before)
+        rows = list(
+            queryset
+            .filter(Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk}))
+            .order_by(field, 'pk')[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], field, has_next=True, has_previous=has_previous)
+
+    if after:
+        timestamp, pk = decode_cursor(after)
+        queryset = queryset.filter(Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'pk__lt': pk}))
+    rows = list(queryset.order_by(f'-{field}', '-pk')[:per_page + 1])
+    return KeysetPage(rows[:per_page], field, has_next=len(rows) > per_page, has_previous=bool(after) and bool(rows))
+
+
+def cached_count(queryset, key, timeout=COUNT_CACHE_TIMEOUT):
+    """
+    COUNT(*) liczony co najwyżej raz na timeout sekund dla danego klucza
+    """
+    cache_key = 'count:' + hashlib.sha1(key.encode()).hexdigest()
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, timeout)
+    return count
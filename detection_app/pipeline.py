@@ -0,0 +1,228 @@
+"""
+Potok detekcji dla obiektów DetectionImage
+
+Wspólny dla widoków (tryb synchroniczny) i workera kolejki zadań. Obrazy
+mogą być przetwarzane pojedynczo albo paczką - wtedy inferencja i
+przetwarzanie wyników wykonywane są raz dla całej paczki.
+"""
+import os
+import time
+
+import numpy as np
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import raw_results, tiling
+from .batching import run_inference
+from .benchmark import StageTimer
+from .detected_objects import replace_objects
+from .drawing import draw_detections, save_processed_image
+from .labels import COCO_CLASSES
+from .metrics import metrics
+from .model_registry import get_detector, get_engine
+from .models import DetectionImage
+from .postprocess import postprocess_batch, detections_to_json, split_by_image
+from .preprocessing import decode_image
+from .rendering import get_options as get_render_options
+from .uploads import check_image, open_mapped
+
+STAGE_SECONDS = metrics.histogram(
+    'detection_stage_seconds', 'Czas etapu potoku detekcji w przeliczeniu na obraz'
+)
+
+
+def run_detection(detection_image, detector=None):
+    """
+    Dekodowanie, inferencja, rysowanie i zapis wyników do bazy
+
+    Model i próg pewności brane są z pól model_name i confidence_threshold.
+    """
+    outcome = run_detection_batch([detection_image], detector)[0]
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
+
+
+def _infer(inputs, model_name, detector):
+    """
+    Inferencja dla listy wejść modelu; wynik z wymiarem paczki len(inputs)
+    """
+    engine = get_engine(model_name)
+    if engine is None:
+        return run_inference(detector, np.stack(inputs), model_name)
+
+    # Silnik sam dzieli zlecenia na paczki zgodne z limitem modelu
+    futures = [engine.submit(model_input) for model_input in inputs]
+    outputs = [future.result() for future in futures]
+    return {key: np.concatenate([output[key] for output in outputs]) for key in outputs[0]}
+
+
+def run_detection_batch(detection_images, detector=None):
+    """
+    Przetworzenie paczki obrazów o wspólnym modelu i progu pewności
+
+    Zwraca listę wyników w kolejności wejścia: zapisany DetectionImage albo
+    wyjątek (błąd jednego obrazu nie przerywa przetwarzania pozostałych).
+    """
+    model_name = detection_images[0].model_name
+    confidence_threshold = detection_images[0].confidence_threshold
+    detector = detector or get_detector(model_name)
+
+    # Dekodowanie w zmniejszonej rozdzielczości i przygotowanie wejścia modelu
+    outcomes = [None] * len(detection_images)
+    timers = [StageTimer() for _ in detection_images]
+    preprocess_options = getattr(settings, 'DETECTION_PREPROCESS', {})
+    tiling_options = tiling.get_options()
+    prepared = []
+    for index, detection_image in enumerate(detection_images):
+        try:
+            with timers[index].stage('decode'):
+                with open_mapped(detection_image.original_image) as image_file:
+                    check_image(image_file)
+                    # Duże zdjęcia dzielone są na kafelki (tiling.py)
+                    if tiling.needs_tiling(image_file, tiling_options):
+                        image = tiling.prepare_tiles(image_file, options=tiling_options, **preprocess_options)
+                    else:
+                        image = decode_image(image_file, **preprocess_options)
+                prepared.append((index, image))
+        except Exception as e:
+            outcomes[index] = e
+    if not prepared:
+        return outcomes
+
+    # Inferencja i przetworzenie wyników (wektorowo) raz dla całej paczki -
+    # kafelki wszystkich obrazów trafiają do modelu razem z pozostałymi wejściami
+    shared = StageTimer()
+    with shared.stage('inference'):
+        inputs = []
+        for _, image in prepared:
+            inputs.extend(image.tiles if isinstance(image, tiling.TiledImage) else [image.model_input])
+        results = _infer(inputs, model_name, detector)
+    with shared.stage('postprocess'):
+        per_image, raw_per_image = _postprocess(prepared, results, confidence_threshold, tiling_options)
+    # Etapy wspólne dzielone są po równo między obrazy paczki
+    shared_timings = {stage: seconds / len(prepared) for stage, seconds in shared.timings.items()}
+
+    for (index, image), image_detections, raw in zip(prepared, per_image, raw_per_image):
+        detection_image = detection_images[index]
+        timer = timers[index]
+        timer.timings.update(shared_timings)
+        try:
+            _save_result(detection_image, image, image_detections, timer, raw)
+            detection_image.processing_time = timer.total()
+            # Czas zapisu do bazy nie mieści się w zapisywanym wierszu -
+            # trafia tylko do metryk procesu
+            detection_image.stage_timings = dict(timer.timings)
+            with timer.stage('db_write'):
+                detection_image.save()
+            outcomes[index] = detection_image
+        except Exception as e:
+            outcomes[index] = e
+        for stage, seconds in timer.timings.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+
+    # Tabela wykrytych obiektów - jeden zapis dla całej paczki
+    saved = [outcome for outcome in outcomes if isinstance(outcome, DetectionImage)]
+    if saved:
+        start = time.perf_counter()
+        replace_objects(saved)
+        STAGE_SECONDS.observe((time.perf_counter() - start) / len(saved), stage='objects_write')
+    return outcomes
+
+
+def _postprocess(prepared, results, confidence_threshold, tiling_options):
+    """
+    Wykrycia dla każdego obrazu paczki (lista tablic DETECTION_DTYPE) oraz
+    surowe wyjście modelu każdego obrazu (boxes, scores, classes)
+
+    Wyniki kafelków łączone są w jeden wynik obrazu, a nakładające się ramki
+    z sąsiednich kafelków usuwa NMS. Obrazy bez kafelków przetwarzane są
+    razem, dokładnie jak wcześniej.
+    """
+    options = getattr(settings, 'DETECTION_POSTPROCESS', {})
+    plain, tiled = [], []
+    offset = 0
+    for position, (_, image) in enumerate(prepared):
+        if isinstance(image, tiling.TiledImage):
+            count = len(image.tiles)
+            tile_results = {key: value[offset:offset + count] for key, value in results.items()}
+            tiled.append((position, tiling.merge_tile_results(tile_results, image.windows)))
+        else:
+            count = 1
+            plain.append((position, offset))
+        offset += count
+
+    per_image = [None] * len(prepared)
+    raw_per_image = [None] * len(prepared)
+    for position, row in plain:
+        raw_per_image[position] = tuple(
+            results[key][row] for key in ('detection_boxes', 'detection_scores', 'detection_classes')
+        )
+    for position, merged in tiled:
+        raw_per_image[position] = tuple(
+            merged[key][0] for key in ('detection_boxes', 'detection_scores', 'detection_classes')
+        )
+    if plain:
+        rows = [row for _, row in plain]
+        detections = postprocess_batch(
+            results['detection_boxes'][rows],
+            results['detection_scores'][rows],
+            results['detection_classes'][rows],
+            confidence_threshold=confidence_threshold,
+            **options
+        )
+        for (position, _), image_detections in zip(plain, split_by_image(detections, len(plain))):
+            per_image[position] = image_detections
+    for position, merged in tiled:
+        per_image[position] = postprocess_batch(
+            merged['detection_boxes'],
+            merged['detection_scores'],
+            merged['detection_classes'],
+            confidence_threshold=confidence_threshold,
+            **{**options, 'nms_iou': tiling_options['nms_iou']}
+        )
+    return per_image, raw_per_image
+
+
+def _save_result(detection_image, prepared, detections, timer=None, raw=None):
+    """
+    Rysowanie, zapis obrazu wynikowego i uzupełnienie pól (bez zapisu do bazy)
+    """
+    timer = timer or StageTimer()
+    detection_results = detections_to_json(detections, COCO_CLASSES)
+
+    # Domyślnie obraz wynikowy renderowany jest dopiero na żądanie (rendering.py)
+    if get_render_options()['save_processed_image']:
+        # Rysowanie detekcji na obrazie
+        with timer.stage('draw'):
+            image_with_detections = draw_detections(
+                prepared.display, detections['box'], detections['score'], detections['class_id'], COCO_CLASSES
+            )
+
+        # Zapis przetworzonego obrazu
+        with timer.stage('save'):
+            filename = f"processed_{detection_image.id}_{os.path.basename(detection_image.original_image.name)}"
+            detection_image.processed_image = save_processed_image(image_with_detections, filename)
+
+    # Aktualizacja modelu
+    detection_image.detection_results = {
+        'objects': detection_results,
+        'total_objects': len(detection_results),
+        'confidence_threshold': detection_image.confidence_threshold,
+        # Rozmiar oryginału (po obrocie EXIF) - ramki są znormalizowane do [0, 1]
+        'image_size': list(prepared.original_size),
+    }
+    if isinstance(prepared, tiling.TiledImage):
+        detection_image.detection_results['tiles'] = len(prepared.tiles)
+    # Surowe wyjście modelu - późniejsza zmiana progu bez inferencji
+    raw_options = raw_results.get_options()
+    if raw is not None and raw_options['enabled']:
+        detection_image.raw_output = raw_results.encode(
+            *raw, min_score=raw_options['min_score'], max_detections=raw_options['max_detections']
+        )
+        detection_image.detection_results['raw_min_score'] = raw_options['min_score']
+    detection_image.objects_detected = len(detection_results)
+    detection_image.processed_at = timezone.now()
+    detection_image.status = detection_image.STATUS_DONE
+    detection_image.error_message = ''
@@ -0,0 +1,131 @@
+"""
+Wektorowe przetwarzanie wyników detekcji dla całych paczek
+
+Wynikiem jest tablica strukturalna NumPy (DETECTION_DTYPE) - jeden rekord na
+wykrycie, posortowana według obrazu i malejącej pewności.
+"""
+import numpy as np
+
+DETECTION_DTYPE = np.dtype([
+    ('image', np.int32),
+    ('class_id', np.int32),
+    ('score', np.float32),
+    ('box', np.float32, (4,)),
+])
+
+
+def box_iou(box, boxes):
+    """
+    IoU jednej ramki [ymin, xmin, ymax, xmax] względem tablicy ramek (N, 4)
+    """
+    ymin = np.maximum(box[0], boxes[:, 0])
+    xmin = np.maximum(box[1], boxes[:, 1])
+    ymax = np.minimum(box[2], boxes[:, 2])
+    xmax = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(ymax - ymin, 0, None) * np.clip(xmax - xmin, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    union = area + areas - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-12), 0.0)
+
+
+def non_max_suppression(boxes, scores, iou_threshold, groups=None):
+    """
+    Zachłanne NMS; zwraca indeksy zachowanych ramek (malejąco według pewności)
+
+    groups - identyfikator grupy (np. obraz i klasa) dla każdej ramki. Ramki z
+    różnych grup przesuwane są tak, by się nie nakładały, więc jedno przejście
+    NMS wykonuje tłumienie osobno w każdej grupie.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    boxes = boxes.astype(np.float32, copy=False)
+    if groups is not None:
+        extent = float(np.max(boxes)) + 1.0
+        boxes = boxes + (groups.astype(np.float32) * extent)[:, None]
+
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        order = rest[box_iou(boxes[best], boxes[rest]) <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def postprocess_batch(boxes, scores, classes, confidence_threshold=0.5, class_thresholds=None,
+                      allowed_classes=None, nms_iou=None, top_k=None):
+    """
+    Filtrowanie wyników całej paczki jednym zestawem operacji na tablicach
+
+    boxes (B, N, 4), scores (B, N), classes (B, N) - surowe wyjście modelu.
+    class_thresholds - słownik {class_id: próg} nadpisujący próg globalny.
+    allowed_classes - jeśli podane, tylko te klasy trafiają do wyniku.
+    nms_iou - próg IoU dla dodatkowego NMS w obrębie (obrazu, klasy).
+    top_k - maksymalna liczba wykryć na obraz.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32)
+    scores = np.asarray(scores, dtype=np.float32)
+    classes = np.asarray(classes).astype(np.int32)
+
+    # Tablica progów indeksowana identyfikatorem klasy
+    class_thresholds = class_thresholds or {}
+    table_size = int(max(classes.max(initial=0), max(class_thresholds, default=0))) + 1
+    thresholds = np.full(table_size, confidence_threshold, dtype=np.float32)
+    for class_id, threshold in class_thresholds.items():
+        thresholds[int(class_id)] = threshold
+
+    keep = scores > thresholds[classes]
+    if allowed_classes is not None:
+        keep &= np.isin(classes, np.asarray(list(allowed_classes), dtype=np.int32))
+
+    image_index, detection_index = np.nonzero(keep)
+    detections = np.empty(len(image_index), dtype=DETECTION_DTYPE)
+    detections['image'] = image_index
+    detections['class_id'] = classes[image_index, detection_index]
+    detections['score'] = scores[image_index, detection_index]
+    detections['box'] = boxes[image_index, detection_index]
+
+    if nms_iou is not None and len(detections):
+        groups = detections['image'].astype(np.int64) * table_size + detections['class_id']
+        detections = detections[non_max_suppression(detections['box'], detections['score'], nms_iou, groups)]
+
+    # Sortowanie: obraz rosnąco, pewność malejąco
+    detections = detections[np.lexsort((-detections['score'], detections['image']))]
+
+    if top_k is not None and len(detections):
+        # Pozycja wykrycia w obrębie swojego obrazu
+        starts = np.searchsorted(detections['image'], detections['image'], side='left')
+        rank = np.arange(len(detections)) - starts
+        detections = detections[rank < top_k]
+
+    return detections
+
+
+def split_by_image(detections, batch_size):
+    """
+    Podział posortowanej tablicy wykryć na listę tablic - po jednej na obraz
+    """
+    bounds = np.searchsorted(detections['image'], np.arange(batch_size + 1), side='left')
+    return [detections[bounds[i]:bounds[i + 1]] for i in range(batch_size)]
+
+
+def detections_to_json(detections, class_names):
+    """
+    Konwersja wykryć jednego obrazu do listy słowników (jedno przejście)
+    """
+    class_ids = detections['class_id'].tolist()
+    scores = detections['score'].tolist()
+    boxes = detections['box'].tolist()
+    return [
+        {
+            'id': index,
+            'class_id': class_id,
+            'class_name': class_names.get(class_id, 'unknown'),
+            'confidence': score,
+            'bbox': box,
+        }
+        for index, (class_id, score, box) in enumerate(zip(class_ids, scores, boxes), start=1)
+    ]
@@ -0,0 +1,109 @@
+"""
+Przygotowanie obrazu do detekcji z dekodowaniem w zmniejszonej rozdzielczości
+
+Zamiast dekodować całe zdjęcie (np. 24 Mpx) i dopiero potem je zmniejszać,
+JPEG dekodowany jest od razu w skali 1/2, 1/4 lub 1/8 (skalowanie DCT przez
+Image.draft). Zdekodowany obraz służy do rysowania wyników, a jego kopia
+przeskalowana do rozmiaru wejścia modelu - do inferencji.
+"""
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Orientacje EXIF, przy których szerokość i wysokość zamieniają się miejscami
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+_EXIF_ORIENTATION = 0x0112
+
+PreparedImage = namedtuple('PreparedImage', ['display', 'model_input', 'original_size'])
+PreparedImage.__doc__ = """
+display - obraz RGB uint8 w rozdzielczości do rysowania (dłuższy bok <= display_max_size)
+model_input - obraz RGB uint8 o rozmiarze wejścia modelu
+original_size - (wysokość, szerokość) oryginału po uwzględnieniu orientacji EXIF
+"""
+
+
+def _oriented_size(image):
+    width, height = image.size
+    orientation = image.getexif().get(_EXIF_ORIENTATION, 1)
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        return width, height
+    return height, width
+
+
+def _fit_within(height, width, max_size):
+    scale = min(1.0, max_size / float(max(height, width)))
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+def _to_rgb(image):
+    """
+    Sprowadzenie dowolnego trybu PIL do RGB (alfa, skala szarości, 16 bitów)
+    """
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+        # 16 bitów: górny bajt zamiast obcinania przez convert('L')
+        array = np.asarray(image)
+        shift = 8 if image.mode.startswith('I;16') or array.max(initial=0) > 255 else 0
+        array = (array >> shift).astype(np.uint8) if shift else array.astype(np.uint8)
+        image = Image.fromarray(array, mode='L')
+    if image.mode == 'P':
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    if image.mode in ('RGBA', 'LA', 'PA'):
+        # Przezroczystość komponowana na białym tle
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def decode_for_display(source, display_max_size=1280):
+    """
+    Dekodowanie obrazu z pliku lub ścieżki do RGB o dłuższym boku <= display_max_size
+
+    Zwraca (obraz, rozmiar oryginału po obrocie EXIF).
+    """
+    image = Image.open(source)
+    original_size = _oriented_size(image)
+    display_height, display_width = _fit_within(*original_size, display_max_size)
+
+    if image.format == 'JPEG':
+        # Rozmiar żądany w orientacji zapisanej w pliku (przed obrotem EXIF)
+        stored_width, stored_height = image.size
+        draft_height, draft_width = _fit_within(stored_height, stored_width, display_max_size)
+        image.draft('RGB', (draft_width, draft_height))
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        # Tryby 16-bitowe i paletowe normalizowane przed skalowaniem
+        image = _to_rgb(image)
+    if image.size != (display_width, display_height):
+        # reducing_gap - najpierw szybkie zmniejszenie całkowite, potem dokładne
+        image = image.resize((display_width, display_height), Image.BILINEAR, reducing_gap=2.0)
+    return np.asarray(_to_rgb(image)), original_size
+
+
+def prepare_model_input(display, model_input_size=(320, 320)):
+    import cv2
+
+    model_height, model_width = model_input_size
+    return cv2.resize(display, (model_width, model_height), interpolation=cv2.INTER_AREA)
+
+
+def decode_image(source, model_input_size=(320, 320), display_max_size=1280):
+    """
+    Dekodowanie obrazu z pliku lub ścieżki i przygotowanie wejścia modelu
+    """
+    display, original_size = decode_for_display(source, display_max_size)
+    return PreparedImage(display, prepare_model_input(display, model_input_size), original_size)
+
+
+def boxes_to_pixels(boxes, image_size):
+    """
+    Znormalizowane ramki [ymin, xmin, ymax, xmax] na piksele obrazu o rozmiarze (h, w)
+    """
+    height, width = image_size
+    scale = np.array([height, width, height, width], dtype=np.float32)
+    return np.asarray(boxes, dtype=np.float32) * scale
@@ -0,0 +1,343 @@
+"""
+Pula procesów inferencji z przekazywaniem obrazów przez pamięć współdzieloną
+
+Każdy proces potomny trzyma własną instancję detektora (model_registry), więc
+inferencja nie konkuruje o GIL z wątkami Django. Paczka obrazów kopiowana
+jest raz do bufora multiprocessing.shared_memory przypisanego do procesu (bez
+serializacji pickle), a z powrotem wracają tylko przycięte tablice wykryć.
+Procesy mogą mieć przypisane rdzenie i liczbę wątków TensorFlow; proces,
+który zakończy się błędem, jest uruchamiany ponownie.
+
+Pula ma interfejs detektora (detect_batch, warmup), więc potok i silnik
+mikro-batchowania korzystają z niej bez zmian.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+from django.conf import settings
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_RESTARTS = metrics.counter(
+    'detection_pool_restarts_total', 'Ponowne uruchomienia procesów puli inferencji'
+)
+
+# Zmienna środowiskowa procesu potomnego - jego rejestr ładuje model lokalnie
+WORKER_ENV = 'DETECTION_POOL_WORKER'
+
+_overrides = {}
+
+
+class WorkerCrashed(RuntimeError):
+    """
+    Proces puli zakończył się lub nie odpowiedział w wyznaczonym czasie
+    """
+
+
+def get_options():
+    options = {
+        'enabled': False,
+        'processes': 2,
+        # 'auto' - dostępne rdzenie dzielone po równo między procesy,
+        # lista zbiorów rdzeni (po jednym na proces) albo None
+        'cpu_affinity': 'auto',
+        # Wątki TensorFlow w procesie; None - liczba przypisanych rdzeni
+        'intra_op_threads': None,
+        'inter_op_threads': 1,
+        # Wykrycia o niższej pewności nie są odsyłane do procesu głównego
+        'min_score': 0.05,
+        'load_timeout': 300,
+        'timeout': 60,
+    }
+    options.update(getattr(settings, 'DETECTION_PROCESS_POOL', {}))
+    options.update(_overrides)
+    return options
+
+
+def configure(**options):
+    """
+    Nadpisanie ustawień puli w bieżącym procesie (np. z opcji detection_worker)
+    """
+    _overrides.update({key: value for key, value in options.items() if value is not None})
+
+
+def in_worker_process():
+    return os.environ.get(WORKER_ENV) == '1'
+
+
+def parse_cpu_sets(value):
+    """
+    '0-1;2-3' -> [{0, 1}, {2, 3}]; 'auto' bez zmian, 'none' - pusta lista
+    """
+    if value in (None, 'auto'):
+        return value
+    if value == 'none':
+        return []
+    cpu_sets = []
+    for group in value.split(';'):
+        cpus = set()
+        for part in group.split(','):
+            start, _, end = part.strip().partition('-')
+            cpus.update(range(int(start), int(end or start) + 1))
+        cpu_sets.append(cpus)
+    return cpu_sets
+
+
+def assign_cpus(processes, cpu_affinity):
+    """
+    Zbiór rdzeni dla każdego procesu (None - bez przypinania)
+    """
+    if not cpu_affinity or not hasattr(os, 'sched_getaffinity'):
+        return [None] * processes
+    if cpu_affinity == 'auto':
+        available = sorted(os.sched_getaffinity(0))
+        if len(available) < processes:
+            return [None] * processes
+        chunk = len(available) // processes
+        return [set(available[index * chunk:(index + 1) * chunk]) for index in range(processes)]
+    return [set(cpu_affinity[index % len(cpu_affinity)]) for index in range(processes)]
+
+
+def compact_results(results, min_score):
+    """
+    Przycięcie wyników paczki do wykryć o pewności >= min_score (po pewności)
+    """
+    scores = np.asarray(results['detection_scores'], dtype=np.float32)
+    keep = int((scores >= min_score).sum(axis=1).max()) if scores.size else 0
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :keep]
+    return {
+        'detection_boxes': np.take_along_axis(
+            np.asarray(results['detection_boxes'], dtype=np.float32), order[..., None], axis=1
+        ),
+        'detection_scores': np.take_along_axis(scores, order, axis=1),
+        'detection_classes': np.take_along_axis(
+            np.asarray(results['detection_classes'], dtype=np.float32), order, axis=1
+        ),
+        'num_detections': np.minimum(np.asarray(results['num_detections'], dtype=np.float32), keep),
+    }
+
+
+def _configure_tensorflow(intra_op_threads, inter_op_threads):
+    try:
+        import tensorflow as tf
+    except ImportError:
+        return
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+
+def _worker_main(model_name, connection, cpus, intra_op_threads, inter_op_threads, min_score):
+    """
+    Pętla procesu potomnego: (nazwa bufora, kształt) -> przycięte wyniki
+    """
+    # Przerwanie obsługuje proces główny (zamyka pulę)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ[WORKER_ENV] = '1'
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+        intra_op_threads = intra_op_threads or len(cpus)
+    if intra_op_threads:
+        # Zmienne środowiskowe działają również na TFLite i ONNX Runtime (OpenMP)
+        os.environ['TF_NUM_INTRAOP_THREADS'] = str(intra_op_threads)
+        os.environ['OMP_NUM_THREADS'] = str(intra_op_threads)
+    if inter_op_threads:
+        os.environ['TF_NUM_INTEROP_THREADS'] = str(inter_op_threads)
+
+    import django
+
+    django.setup()
+    _configure_tensorflow(intra_op_threads, inter_op_threads)
+
+    from .model_registry import registry
+
+    detector = registry.get(model_name)
+    connection.send(('ready', os.getpid()))
+
+    buffer = None
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        buffer_name, shape = message
+        try:
+            if buffer is None or buffer.name != buffer_name:
+                if buffer is not None:
+                    buffer.close()
+                buffer = shared_memory.SharedMemory(name=buffer_name)
+            images = np.ndarray(shape, dtype=np.uint8, buffer=buffer.buf)
+            results = compact_results(detector.detect_batch(images), min_score)
+            del images
+            connection.send(('ok', results))
+        except Exception as e:
+            logger.exception("Błąd inferencji w procesie puli")
+            connection.send(('error', f'{type(e).__name__}: {e}'))
+
+    if buffer is not None:
+        buffer.close()
+
+
+class _PoolWorker:
+    """
+    Proces potomny wraz z łączem i buforem pamięci współdzielonej
+    """
+
+    def __init__(self, pool, index, cpus):
+        self.pool = pool
+        self.index = index
+        self.cpus = cpus
+        self.process = None
+        self.connection = None
+        self.buffer = None
+
+    def start(self):
+        options = self.pool.options
+        parent_connection, child_connection = self.pool.context.Pipe()
+        self.process = self.pool.context.Process(
+            target=_worker_main,
+            args=(
+                self.pool.model_name, child_connection, self.cpus,
+                options['intra_op_threads'], options['inter_op_threads'], options['min_score'],
+            ),
+            name=f'detection-inference-{self.index}',
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        self.connection = parent_connection
+
+    def wait_ready(self, timeout):
+        if not self.connection.poll(timeout):
+            raise WorkerCrashed(f"Proces {self.index} nie załadował modelu w {timeout}s")
+        try:
+            status, _ = self.connection.recv()
+        except EOFError:
+            raise WorkerCrashed(f"Proces {self.index} zakończył się podczas ładowania modelu")
+        if status != 'ready':
+            raise WorkerCrashed(f"Proces {self.index}: nieoczekiwana odpowiedź {status}")
+
+    def restart(self):
+        POOL_RESTARTS.inc(model=self.pool.model_name)
+        logger.warning("Ponowne uruchomienie procesu inferencji %s (model %s)", self.index, self.pool.model_name)
+        self.stop(timeout=1)
+        self.start()
+        self.wait_ready(self.pool.options['load_timeout'])
+
+    def _ensure_buffer(self, size):
+        if self.buffer is not None and self.buffer.size >= size:
+            return
+        self._release_buffer()
+        self.buffer = shared_memory.SharedMemory(create=True, size=size)
+
+    def _release_buffer(self):
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer.unlink()
+            self.buffer = None
+
+    def run(self, images):
+        if not self.process.is_alive():
+            raise WorkerCrashed(f"Proces {self.index} nie działa")
+        self._ensure_buffer(images.nbytes)
+        np.ndarray(images.shape, dtype=np.uint8, buffer=self.buffer.buf)[...] = images
+        try:
+            self.connection.send((self.buffer.name, images.shape))
+            if not self.connection.poll(self.pool.options['timeout']):
+                raise WorkerCrashed(f"Proces {self.index} nie odpowiedział w {self.pool.options['timeout']}s")
+            status, payload = self.connection.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerCrashed(f"Proces {self.index} zakończył się podczas inferencji") from e
+        if status == 'error':
+            raise RuntimeError(payload)
+        return payload
+
+    def stop(self, timeout=5):
+        if self.process is None:
+            return
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class InferenceProcessPool:
+    """
+    Detektor wykonujący inferencję w puli procesów (po jednym modelu na proces)
+
+    Wywołania z wielu wątków rozdzielane są na wolne procesy; paczka, której
+    proces uległ awarii, jest ponawiana raz po jego ponownym uruchomieniu.
+    """
+
+    def __init__(self, model_name, **options):
+        self.model_name = model_name
+        self.options = {**get_options(), **options}
+        # 'spawn' - TensorFlow nie jest bezpieczny po fork w procesie z wątkami
+        self.context = multiprocessing.get_context('spawn')
+        processes = self.options['processes']
+        cpu_affinity = self.options['cpu_affinity']
+        if isinstance(cpu_affinity, str) and cpu_affinity != 'auto':
+            cpu_affinity = parse_cpu_sets(cpu_affinity)
+        cpu_sets = assign_cpus(processes, cpu_affinity)
+
+        self._workers = [_PoolWorker(self, index, cpus) for index, cpus in enumerate(cpu_sets)]
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for worker in self._workers:
+            worker.start()
+        try:
+            for worker in self._workers:
+                worker.wait_ready(self.options['load_timeout'])
+                self._idle.put(worker)
+        except Exception:
+            self.close()
+            raise
+        atexit.register(self.close)
+
+    def detect_batch(self, images):
+        images = np.ascontiguousarray(images, dtype=np.uint8)
+        worker = self._idle.get()
+        try:
+            try:
+                return worker.run(images)
+            except WorkerCrashed:
+                logger.exception("Awaria procesu inferencji %s", worker.index)
+                worker.restart()
+                return worker.run(images)
+        finally:
+            self._idle.put(worker)
+
+    def warmup(self, input_size=(320, 320)):
+        # Procesy rozgrzewają model podczas ładowania (model_registry)
+        pass
+
+    def pids(self):
+        return [worker.process.pid for worker in self._workers if worker.process is not None]
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for worker in self._workers:
+            worker.stop()
+            worker._release_buffer()
@@ -0,0 +1,176 @@
+"""
+Surowe wyjście modelu zapisywane przy detekcji
+
+Oprócz wykryć powyżej progu obrazu zapisywane są wszystkie wykrycia modelu
+o pewności >= min_score (dla kafelków - wyniki połączone przed NMS) jako
+rekordy float16: klasa (uint16), pewność i ramka - 12 bajtów na wykrycie.
+Zmiana progu pewności albo filtra klas to wtedy tylko postprocess_batch na
+zapisanych tablicach, bez dekodowania obrazu i inferencji.
+
+Pewność i ramki w float16 różnią się od wyniku modelu o mniej niż 0,001,
+więc wykrycie leżące dokładnie na progu może zostać zakwalifikowane inaczej
+niż przy pierwotnej detekcji.
+"""
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from . import tiling
+from .detected_objects import parse_class, replace_objects
+from .labels import COCO_CLASSES
+from .metrics import metrics
+from .postprocess import detections_to_json, postprocess_batch
+
+REFILTER_SECONDS = metrics.histogram(
+    'detection_refilter_seconds', 'Czas ponownego filtrowania zapisanych wyników (bez inferencji)',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+RAW_DTYPE = np.dtype([
+    ('class_id', '<u2'),
+    ('score', '<f2'),
+    ('box', '<f2', (4,)),
+])
+# Pierwszy bajt pola raw_output - wersja formatu rekordów
+FORMAT_VERSION = 1
+
+
+def get_options():
+    options = {
+        'enabled': True,
+        # Wykrycia o niższej pewności nie są zapisywane (dolna granica progu)
+        'min_score': 0.05,
+        'max_detections': 2000,
+    }
+    options.update(getattr(settings, 'DETECTION_RAW_RESULTS', {}))
+    return options
+
+
+def encode(boxes, scores, classes, min_score, max_detections=None):
+    """
+    Wykrycia jednego obrazu (N x 4, N, N) jako bajty, malejąco według pewności
+    """
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    keep = np.flatnonzero(scores >= min_score)
+    keep = keep[np.argsort(-scores[keep], kind='stable')][:max_detections]
+    records = np.empty(len(keep), dtype=RAW_DTYPE)
+    records['class_id'] = np.asarray(classes).reshape(-1)[keep]
+    records['score'] = scores[keep]
+    records['box'] = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)[keep]
+    return bytes([FORMAT_VERSION]) + records.tobytes()
+
+
+def decode(data):
+    """
+    (boxes float32 N x 4, scores float32 N, classes int32 N) z pola raw_output
+    """
+    data = bytes(data or b'')
+    if not data or data[0] != FORMAT_VERSION:
+        raise ValueError("Brak zapisanych surowych wyników")
+    records = np.frombuffer(data, dtype=RAW_DTYPE, offset=1)
+    return (
+        records['box'].astype(np.float32),
+        records['score'].astype(np.float32),
+        records['class_id'].astype(np.int32),
+    )
+
+
+def is_available(detection_image):
+    return detection_image.status == detection_image.STATUS_DONE and bool(detection_image.raw_output)
+
+
+def parse_filter(threshold=None, classes=None):
+    """
+    Próg i klasy z parametrów żądania ('0.3', 'person,dog'); (None, None) gdy
+    brak; ValueError dla niepoprawnych wartości
+    """
+    if threshold in (None, ''):
+        threshold = None
+    else:
+        try:
+            threshold = float(threshold)
+        except ValueError:
+            raise ValueError("Próg pewności musi być liczbą")
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("Próg pewności musi należeć do przedziału (0, 1]")
+    class_ids = None
+    if classes:
+        class_ids = tuple(sorted({parse_class(value) for value in classes.split(',') if value.strip()})) or None
+    return threshold, class_ids
+
+
+def variant(confidence_threshold=None, class_ids=None):
+    """
+    Krótki identyfikator podglądu (klucze pamięci podręcznej renderów i ETagi)
+    """
+    if confidence_threshold is None and class_ids is None:
+        return ''
+    classes = '_'.join(str(class_id) for class_id in class_ids or ())
+    return f't{confidence_threshold or ""}c{classes}'
+
+
+def filtered_results(detection_image, confidence_threshold=None, class_ids=None):
+    """
+    detection_results dla innego progu i filtra klas - z zapisanych tablic
+    """
+    results = detection_image.detection_results
+    if confidence_threshold is None:
+        confidence_threshold = detection_image.confidence_threshold
+    floor = results.get('raw_min_score', 0.0)
+    if confidence_threshold < floor:
+        raise ValueError(f"Zapisane są tylko wykrycia o pewności od {floor}")
+
+    start = time.perf_counter()
+    boxes, scores, classes = decode(detection_image.raw_output)
+    options = dict(getattr(settings, 'DETECTION_POSTPROCESS', {}))
+    if results.get('tiles'):
+        options['nms_iou'] = tiling.get_options()['nms_iou']
+    if class_ids is not None:
+        allowed = options.get('allowed_classes')
+        options['allowed_classes'] = [
+            class_id for class_id in class_ids if allowed is None or class_id in allowed
+        ]
+    detections = postprocess_batch(
+        boxes[None], scores[None], classes[None], confidence_threshold=confidence_threshold, **options
+    )
+    objects = detections_to_json(detections, COCO_CLASSES)
+    REFILTER_SECONDS.observe(time.perf_counter() - start)
+
+    filtered = {
+        **results,
+        'objects': objects,
+        'total_objects': len(objects),
+        'confidence_threshold': confidence_threshold,
+    }
+    filtered.pop('classes', None)
+    if class_ids is not None:
+        filtered['classes'] = list(class_ids)
+    return filtered
+
+
+def preview(detection_image, confidence_threshold=None, class_ids=None):
+    """
+    Podmiana wyników w obiekcie (bez zapisu) - strony i API z innym progiem
+    """
+    detection_image.detection_results = filtered_results(detection_image, confidence_threshold, class_ids)
+    detection_image.objects_detected = detection_image.detection_results['total_objects']
+    return detection_image
+
+
+def apply(detection_image, confidence_threshold=None, class_ids=None):
+    """
+    Zapis wyników dla nowego progu i filtra klas; nowa chwila przetworzenia
+    unieważnia rendery, miniatury i ETagi
+    """
+    preview(detection_image, confidence_threshold, class_ids)
+    detection_image.confidence_threshold = detection_image.detection_results['confidence_threshold']
+    detection_image.processed_at = timezone.now()
+    # Zapisana kopia z ramkami (save_processed_image) byłaby nieaktualna
+    detection_image.processed_image = None
+    detection_image.save(update_fields=[
+        'detection_results', 'objects_detected', 'confidence_threshold', 'processed_at', 'processed_image'
+    ])
+    replace_objects([detection_image])
+    return detection_image
@@ -0,0 +1,252 @@
+"""
+Renderowanie obrazów z naniesionymi wykryciami na żądanie
+
+Zamiast zapisywać pełnowymiarową kopię każdego wyniku, obraz wynikowy
+rysowany jest z oryginału i zapisanych detection_results dopiero wtedy, gdy
+ktoś go otworzy. Gotowe obrazy trzymane są w ograniczonej pamięci podręcznej
+LRU: w pamięci procesu i na dysku (wspólnej dla procesów).
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .drawing import draw_detections, encode_image
+from .labels import COCO_CLASSES
+from .metrics import metrics
+from .preprocessing import boxes_to_pixels, decode_for_display
+from .uploads import open_mapped
+
+RENDER_CACHE_LOOKUPS = metrics.counter(
+    'detection_render_cache_lookups_total', 'Odczyty pamięci podręcznej renderów według wyniku'
+)
+
+# Format wyjściowy -> (rozszerzenie dla OpenCV, typ MIME)
+FORMATS = {
+    'jpeg': ('.jpg', 'image/jpeg'),
+    'png': ('.png', 'image/png'),
+    'webp': ('.webp', 'image/webp'),
+}
+
+RENDER_DIR = 'detection_images/rendered'
+
+
+def get_options():
+    options = {
+        'save_processed_image': False,
+        'memory_cache_size': 32 * 1024 * 1024,
+        'disk_cache_size': 256 * 1024 * 1024,
+        'max_size': 2048,
+        'default_format': 'jpeg',
+    }
+    options.update(getattr(settings, 'DETECTION_RENDER', {}))
+    return options
+
+
+class RenderCache:
+    """
+    Pamięć podręczna LRU dla zakodowanych obrazów, ograniczona rozmiarem w bajtach
+
+    Poziom pamięciowy jest osobny dla procesu; poziom dyskowy jest wspólny,
+    a kolejność LRU wyznacza czas modyfikacji pliku (odświeżany przy odczycie).
+    """
+
+    def __init__(self, directory, memory_size, disk_size):
+        self.directory = directory
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._disk_used = None
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                RENDER_CACHE_LOOKUPS.inc(result='memory')
+                return data
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as cached:
+                data = cached.read()
+            os.utime(path)
+        except FileNotFoundError:
+            RENDER_CACHE_LOOKUPS.inc(result='miss')
+            return None
+        RENDER_CACHE_LOOKUPS.inc(result='disk')
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if not self.disk_size:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Zapis przez plik tymczasowy - inny proces nie odczyta połowy obrazu
+        temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as output:
+            output.write(data)
+        os.replace(temporary_path, path)
+
+        with self._lock:
+            if self._disk_used is not None:
+                self._disk_used += len(data)
+            if self._disk_used is None or self._disk_used > self.disk_size:
+                self._disk_used = self._evict_disk()
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_size:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_used -= len(previous)
+            self._memory[key] = data
+            self._memory_used += len(data)
+            while self._memory_used > self.memory_size:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+
+    def _evict_disk(self):
+        """
+        Usunięcie najdawniej używanych plików do limitu; zwraca zajętość dysku
+        """
+        entries = []
+        with os.scandir(self.directory) as iterator:
+            for entry in iterator:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        used = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if used <= self.disk_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            used -= size
+        return used
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                options = get_options()
+                _cache = RenderCache(
+                    os.path.join(settings.MEDIA_ROOT, RENDER_DIR),
+                    options['memory_cache_size'],
+                    options['disk_cache_size'],
+                )
+    return _cache
+
+
+def cache_key(detection_image, size, image_format, variant=''):
+    """
+    Klucz zależny od chwili przetworzenia - nowe wyniki unieważniają stare
+    rendery; variant rozróżnia podglądy z innym progiem lub filtrem klas
+    """
+    version = int(detection_image.processed_at.timestamp() * 1000000) if detection_image.processed_at else 0
+    variant = f'-{variant}' if variant else ''
+    return f'{detection_image.id}-{version}{variant}-{size}{FORMATS[image_format][0]}'
+
+
+def normalize_request(size=None, image_format=None):
+    """
+    Walidacja parametrów renderu; ValueError przy niepoprawnych wartościach
+    """
+    options = get_options()
+    image_format = (image_format or options['default_format']).lower()
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    if image_format not in FORMATS:
+        raise ValueError(f"Nieobsługiwany format: {image_format}")
+
+    if size in (None, ''):
+        size = getattr(settings, 'DETECTION_PREPROCESS', {}).get('display_max_size', 1280)
+    size = int(size)
+    if not 16 <= size <= options['max_size']:
+        raise ValueError(f"Rozmiar musi mieścić się w zakresie 16-{options['max_size']}")
+    return size, image_format
+
+
+def render_detection_image(detection_image, size, image_format):
+    """
+    Obraz z naniesionymi wykryciami (dłuższy bok <= size) jako bajty w danym formacie
+    """
+    with open_mapped(detection_image.original_image) as image_file:
+        display, _ = decode_for_display(image_file, size)
+
+    objects = detection_image.detection_results.get('objects', [])
+    image = draw_detections(
+        display,
+        [obj['bbox'] for obj in objects],
+        [obj['confidence'] for obj in objects],
+        [obj['class_id'] for obj in objects],
+        COCO_CLASSES,
+    )
+    return encode_image(image, FORMATS[image_format][0])
+
+
+def get_rendered(detection_image, size=None, image_format=None, variant=''):
+    """
+    Render z pamięci podręcznej lub wygenerowany; zwraca (bajty, typ MIME)
+    """
+    size, image_format = normalize_request(size, image_format)
+    cache = get_cache()
+    key = cache_key(detection_image, size, image_format, variant)
+    data = cache.get(key)
+    if data is None:
+        data = render_detection_image(detection_image, size, image_format)
+        cache.put(key, data)
+    return data, FORMATS[image_format][1]
+
+
+def overlay_geometry(detection_image):
+    """
+    Geometria ramek do nakładki rysowanej po stronie klienta (bez rastrowania)
+    """
+    results = detection_image.detection_results
+    objects = results.get('objects', [])
+    image_size = results.get('image_size')
+    if image_size and objects:
+        pixels = boxes_to_pixels([obj['bbox'] for obj in objects], image_size).round().astype(int).tolist()
+    else:
+        pixels = [None] * len(objects)
+    return {
+        'id': detection_image.id,
+        'image_url': detection_image.original_image.url,
+        'image_size': image_size,
+        'confidence_threshold': results.get('confidence_threshold'),
+        'objects': [
+            {
+                'class_id': obj['class_id'],
+                'class_name': obj['class_name'],
+                'confidence': obj['confidence'],
+                'bbox': obj['bbox'],
+                'bbox_pixels': box,
+            }
+            for obj, box in zip(objects, pixels)
+        ],
+    }
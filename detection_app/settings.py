@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'detection_app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -141,3 +142,185 @@ MEDIA_ROOT = os.path.join(BASE_DIR2, 'media')
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Dla rozwoju
 # Dla produkcji użyj:
 # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+# Ustawienia detekcji obiektów
+# Model ładowany jest z lokalnego katalogu SavedModel, a gdy go brak - z TF Hub
+# (przy wypełnionym TFHUB_CACHE_DIR działa to również bez dostępu do sieci)
+# backend: 'tfhub' (domyślny, katalog lub adres TF Hub), 'saved_model', 'tflite'
+# albo 'onnx' (backends.py); 'options' trafiają do konstruktora backendu.
+# W formularzach dostępne są tylko modele, których pliki istnieją.
+DETECTION_MODELS = {
+    'ssd_mobilenet_v2': {
+        'label': 'SSD MobileNet v2 (TensorFlow)',
+        'path': os.path.join(BASE_DIR2, 'models', 'ssd_mobilenet_v2'),
+        'url': 'https://tfhub.dev/tensorflow/ssd_mobilenet_v2/2',
+        # Wariant int8 z manage.py quantize_detector (używany przy DETECTION_USE_QUANTIZED)
+        'quantized_path': os.path.join(BASE_DIR2, 'models', 'ssd_mobilenet_v2_int8.tflite'),
+        'quantized_options': {'num_threads': 4},
+        # Eksport zgodny z TFLite (export_tflite_graph_tf2.py) - źródło kwantyzacji
+        'tflite_export_path': os.path.join(BASE_DIR2, 'models', 'ssd_mobilenet_v2_tflite_export'),
+        'warmup_size': (320, 320),
+    },
+    'ssd_mobilenet_v2_tflite': {
+        'label': 'SSD MobileNet v2 (TFLite)',
+        'backend': 'tflite',
+        'path': os.path.join(BASE_DIR2, 'models', 'ssd_mobilenet_v2.tflite'),
+        'options': {'num_threads': 4, 'use_xnnpack': True},
+        'warmup_size': (320, 320),
+    },
+    'ssd_mobilenet_v2_onnx': {
+        'label': 'SSD MobileNet v2 (ONNX Runtime)',
+        'backend': 'onnx',
+        'path': os.path.join(BASE_DIR2, 'models', 'ssd_mobilenet_v2.onnx'),
+        'options': {'num_threads': 4},
+        'warmup_size': (320, 320),
+    },
+}
+DETECTION_DEFAULT_MODEL = 'ssd_mobilenet_v2'
+# Inferencja modelem int8 (TFLite) zamiast float32 - patrz raport quantize_detector
+DETECTION_USE_QUANTIZED = os.environ.get('DETECTION_USE_QUANTIZED') == '1'
+DETECTION_CONFIDENCE_THRESHOLD = 0.5
+
+# Limity przesyłania (pojedynczy plik oraz liczba obrazów w paczce)
+DETECTION_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+DETECTION_BULK_MAX_IMAGES = 500
+# Limit rozdzielczości sprawdzany w nagłówku pliku, przed dekodowaniem
+DETECTION_MAX_IMAGE_PIXELS = 40_000_000
+
+# Przesyłane pliki zapisywane są od razu na dysk fragmentami, ze skrótem
+# SHA-256 liczonym w trakcie zapisu (uploads.py)
+FILE_UPLOAD_HANDLERS = ['detection_app.uploads.HashingTemporaryFileUploadHandler']
+
+# Detekcja w nagraniach wideo (próbkowanie klatek, paczki do modelu)
+DETECTION_VIDEO = {
+    'batch_size': 8,
+    'max_upload_size': 500 * 1024 * 1024,
+    # Limit jednej odpowiedzi z wykryciami (zakres klatek i liczba rekordów)
+    'max_result_frames': 500,
+    'max_result_records': 10000,
+}
+
+# Dekodowanie obrazu: wejście modelu oraz maksymalny rozmiar obrazu do rysowania
+# (JPEG dekodowany jest od razu w zmniejszonej skali)
+DETECTION_PREPROCESS = {
+    'model_input_size': (320, 320),
+    'display_max_size': 1280,
+}
+
+# Dodatkowe filtrowanie wyników (postprocess.postprocess_batch):
+# progi dla klas {class_id: próg}, lista dozwolonych klas, NMS w obrębie klasy, top-k
+DETECTION_POSTPROCESS = {
+    'class_thresholds': {},
+    'allowed_classes': None,
+    'nms_iou': None,
+    'top_k': 100,
+}
+# Detekcja kafelkowa dla zdjęć o wysokiej rozdzielczości (tiling.py):
+# obrazy o dłuższym boku >= auto_threshold dzielone są na nakładające się
+# kafelki, a wykrycia łączone przez NMS z progiem nms_iou
+DETECTION_TILING = {
+    'enabled': True,
+    'auto_threshold': 2000,
+    'max_decode_size': 3072,
+    'tile_size': 640,
+    'overlap': 0.2,
+    'include_full_image': True,
+    'nms_iou': 0.5,
+}
+TFHUB_CACHE_DIR = os.path.join(BASE_DIR2, 'models', 'tfhub_cache')
+
+# Ładowanie i rozgrzewanie modeli przy starcie procesu WWW (wsgi/asgi) - tylko
+# przy DETECTION_ASYNC = False; detection_worker ładuje modele zawsze
+DETECTION_PRELOAD_MODELS = os.environ.get('DETECTION_PRELOAD_MODELS') == '1'
+
+# Kolejka zadań detekcji (manage.py detection_worker)
+# Przy DETECTION_ASYNC = False detekcja wykonywana jest w puli wątków widoków
+DETECTION_ASYNC = True
+DETECTION_JOB_TIMEOUT = 600
+DETECTION_JOB_MAX_ATTEMPTS = 3
+
+# Widoki async (async_detection.py): pula wątków dla inferencji w trybie bez
+# workera oraz strumień postępu SSE (wymaga serwera ASGI, np. uvicorn)
+DETECTION_ASYNC_VIEWS = {
+    'executor_workers': 2,
+    'max_pending': 16,
+    'poll_interval': 0.5,
+    'stream_timeout': 300,
+    'heartbeat': 15,
+}
+
+# Mikro-batchowanie inferencji: równoległe żądania łączone są w jedno
+# wywołanie modelu (max_batch_size obrazów lub max_wait_ms oczekiwania)
+DETECTION_BATCHING = {
+    'enabled': True,
+    'max_batch_size': 8,
+    'max_wait_ms': 10,
+    'input_size': (320, 320),
+}
+
+# Pula procesów inferencji (process_pool.py): każdy proces ładuje własny
+# model, obrazy przekazywane są przez pamięć współdzieloną. cpu_affinity:
+# 'auto', lista zbiorów rdzeni albo None; wątki TF domyślnie wg rdzeni procesu
+DETECTION_PROCESS_POOL = {
+    'enabled': os.environ.get('DETECTION_PROCESS_POOL') == '1',
+    'processes': 2,
+    'cpu_affinity': 'auto',
+    'intra_op_threads': None,
+    'inter_op_threads': 1,
+    'min_score': 0.05,
+    'timeout': 60,
+}
+
+# Endpoint /metrics/ (format Prometheus): dostępny dla administratorów, dla
+# żądań z nagłówkiem "Authorization: Bearer <METRICS_TOKEN>" oraz z adresów
+# METRICS_ALLOWED_IPS
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Obrazy wynikowe renderowane na żądanie z oryginału i detection_results
+DETECTION_RENDER = {
+    # True - dodatkowo zapis pełnej kopii z ramkami przy każdej detekcji
+    'save_processed_image': False,
+    # Limity pamięci podręcznej renderów (w bajtach)
+    'memory_cache_size': 32 * 1024 * 1024,
+    'disk_cache_size': 256 * 1024 * 1024,
+    'max_size': 2048,
+    'default_format': 'jpeg',
+}
+
+# Miniatury i obrazy pośrednie (historia, strona wyników)
+DETECTION_DERIVATIVES = {
+    'sizes': {'thumb': 160, 'medium': 800},
+    'format': 'webp',
+    'pregenerate': ('thumb',),
+}
+
+# Pliki obrazów adresowane zawartością (storage.py): nazwa to SHA-256 pliku
+# w podkatalogach shard_levels x shard_width znaków; nieużywane pliki usuwa
+# manage.py gc_media
+DETECTION_MEDIA_STORAGE = {
+    'content_addressed': True,
+    'shard_levels': 2,
+    'shard_width': 2,
+}
+
+# Walidatory HTTP stron wyników i serwowanie /media/ (http_cache.py, media.py).
+# media_mode 'x-accel-redirect' wymaga w nginx lokalizacji internal, np.
+#   location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+DETECTION_HTTP_CACHE = {
+    'version': '1',
+    'media_max_age': 365 * 24 * 3600,
+    'media_mode': os.environ.get('DETECTION_MEDIA_MODE', 'django'),
+    'accel_redirect_prefix': '/protected-media/',
+    # /media/ bez logowania tylko dla tych katalogów (pozostałe - tylko przy DEBUG)
+    'public_media_dirs': ('avatars/', 'detection_images/original/', 'detection_images/processed/'),
+}
+
+# Surowe wyjście modelu (raw_results.py): wykrycia od min_score zapisywane są
+# przy wyniku, więc zmiana progu (?threshold=) lub klas (?classes=) nie
+# wymaga ponownej inferencji; próg poniżej min_score nie jest dostępny
+DETECTION_RAW_RESULTS = {
+    'enabled': True,
+    'min_score': 0.05,
+    'max_detections': 2000,
+}
@@ -0,0 +1,170 @@
+"""
+Magazyn plików adresowanych zawartością
+
+Plik zapisywany jest pod nazwą będącą jego skrótem SHA-256, w podkatalogach
+wyznaczonych przez początkowe znaki skrótu (np. original/ab/cd/abcd...png) -
+przy milionach plików żaden katalog nie rośnie ponad kilkaset wpisów.
+Identyczna zawartość trafia zawsze pod tę samą nazwę, więc drugi zapis nie
+kopiuje danych. Pliki nie są usuwane przy usuwaniu wierszy - licznik
+odwołań prowadzi blobs.py, a nieużywane pliki usuwa komenda gc_media.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, default_storage
+
+from .metrics import metrics
+
+STORAGE_WRITES = metrics.counter(
+    'detection_storage_writes_total', 'Zapisy do magazynu adresowanego zawartością (nowy plik lub istniejący)'
+)
+
+_storage = None
+
+
+def get_options():
+    options = {
+        'content_addressed': True,
+        # Liczba poziomów podkatalogów i znaków skrótu na poziom (2 x 2 - 65536 katalogów)
+        'shard_levels': 2,
+        'shard_width': 2,
+    }
+    options.update(getattr(settings, 'DETECTION_MEDIA_STORAGE', {}))
+    return options
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage z nazwami plików wyznaczanymi przez skrót zawartości
+
+    Katalog z upload_to i rozszerzenie pliku są zachowane. Treść zapisywana
+    jest do pliku tymczasowego z liczeniem skrótu w tym samym przebiegu (działa
+    też dla strumieni bez seek, np. pozycji ZIP); skrót policzony przy
+    przesyłaniu (atrybut content_hash z uploads.py) pozwala pominąć zapis.
+    """
+
+    def __init__(self, shard_levels=2, shard_width=2, **kwargs):
+        super().__init__(**kwargs)
+        self.shard_levels = shard_levels
+        self.shard_width = shard_width
+
+    def hashed_name(self, name, digest):
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        shards = [
+            digest[level * self.shard_width:(level + 1) * self.shard_width]
+            for level in range(self.shard_levels)
+        ]
+        return posixpath.join(directory, *shards, digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Nazwa docelowa wynika z zawartości - kolizja oznacza ten sam plik
+        return name
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def _write_temp(self, directory, content):
+        """
+        Zapis treści do pliku tymczasowego w katalogu magazynu (ten sam system
+        plików - atomowa zamiana) z liczeniem skrótu; zwraca (ścieżka, skrót)
+        """
+        self._makedirs(directory)
+        temp_path = os.path.join(directory, f'.{uuid.uuid4().hex}.tmp')
+        digest = getattr(content, 'content_hash', None)
+        try:
+            if digest and hasattr(content, 'temporary_file_path'):
+                file_move_safe(content.temporary_file_path(), temp_path)
+            else:
+                hasher = hashlib.sha256()
+                with open(temp_path, 'wb') as output:
+                    for chunk in content.chunks():
+                        hasher.update(chunk)
+                        output.write(chunk)
+                digest = hasher.hexdigest()
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return temp_path, digest
+
+    def _save(self, name, content):
+        digest = getattr(content, 'content_hash', None)
+        if digest:
+            # Skrót znany z przesyłania - istniejący plik bez zapisu
+            existing = self.hashed_name(name, digest)
+            if self._reuse(existing):
+                return existing
+
+        temp_path, digest = self._write_temp(self.path(posixpath.dirname(name.replace('\\', '/'))), content)
+        name = self.hashed_name(name, digest)
+        if self._reuse(name):
+            os.remove(temp_path)
+            return name
+        path = self.path(name)
+        try:
+            self._makedirs(os.path.dirname(path))
+            # Równoległy zapis tej samej zawartości daje ten sam plik
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        STORAGE_WRITES.inc(result='new')
+        return name
+
+    def _reuse(self, name):
+        path = self.path(name)
+        if not os.path.exists(path):
+            return False
+        # Odświeżony czas modyfikacji chroni plik przed gc_media (okres
+        # karencji) do czasu zapisania wiersza z odwołaniem
+        os.utime(path)
+        STORAGE_WRITES.inc(result='existing')
+        return True
+
+
+def get_media_storage():
+    """
+    Magazyn pól plików DetectionImage (wywoływany przy definicji modelu)
+    """
+    global _storage
+    options = get_options()
+    if not options['content_addressed']:
+        return default_storage
+    if _storage is None:
+        _storage = ContentAddressedStorage(
+            shard_levels=options['shard_levels'], shard_width=options['shard_width']
+        )
+    return _storage
+
+
+def walk_files(directory):
+    """
+    Pliki (os.DirEntry) z drzewa katalogów - strumieniowo, bez budowania listy
+    """
+    stack = [directory]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
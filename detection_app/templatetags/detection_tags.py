@@ -0,0 +1,13 @@
+from django import template
+
+from detection_app.derivatives import derivative_url as build_derivative_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def derivative_url(detection_image, kind='original', size_name='thumb'):
+    """
+    Adres miniatury lub obrazu pośredniego: {% derivative_url image 'annotated' 'medium' %}
+    """
+    return build_derivative_url(detection_image, kind, size_name)
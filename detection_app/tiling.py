@@ -0,0 +1,118 @@
+"""
+Detekcja kafelkowa dla zdjęć o wysokiej rozdzielczości
+
+SSD skaluje całe wejście do 320x320, więc małe obiekty na dużych zdjęciach
+znikają. W trybie kafelkowym obraz dzielony jest na nakładające się kafelki,
+które trafiają do modelu jedną paczką; ramki z kafelków przeliczane są na
+współrzędne całego obrazu, a duplikaty na styku kafelków usuwa NMS.
+"""
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .preprocessing import _fit_within, _oriented_size, decode_for_display, prepare_model_input
+
+TiledImage = namedtuple('TiledImage', ['display', 'tiles', 'windows', 'original_size'])
+TiledImage.__doc__ = """
+display - obraz RGB uint8 do rysowania (dłuższy bok <= display_max_size)
+tiles - wejścia modelu (T, H, W, 3), po jednym na kafelek
+windows - położenie kafelków (T, 4) jako [ymin, xmin, ymax, xmax] w [0, 1]
+original_size - (wysokość, szerokość) oryginału po uwzględnieniu orientacji EXIF
+"""
+
+
+def get_options():
+    options = {
+        'enabled': True,
+        # Dłuższy bok oryginału, od którego włącza się tryb kafelkowy
+        'auto_threshold': 2000,
+        # Rozdzielczość dekodowania, z której wycinane są kafelki
+        'max_decode_size': 3072,
+        'tile_size': 640,
+        # Część kafelka wspólna z sąsiednim (0-0.9)
+        'overlap': 0.2,
+        # Dodatkowe wejście z całym obrazem - duże obiekty nie są cięte
+        'include_full_image': True,
+        'nms_iou': 0.5,
+    }
+    options.update(getattr(settings, 'DETECTION_TILING', {}))
+    return options
+
+
+def needs_tiling(source, options=None):
+    """
+    Czy obraz przekracza próg rozdzielczości (odczyt samego nagłówka)
+    """
+    options = options or get_options()
+    if not options['enabled']:
+        return False
+    position = source.tell() if hasattr(source, 'tell') else None
+    with Image.open(source) as image:
+        height, width = _oriented_size(image)
+    if position is not None:
+        source.seek(position)
+    return max(height, width) >= options['auto_threshold']
+
+
+def _starts(length, tile_size, stride):
+    if length <= tile_size:
+        return np.zeros(1, dtype=np.int64)
+    starts = np.arange(0, length - tile_size, stride)
+    # Ostatni kafelek wyrównany do krawędzi obrazu
+    return np.unique(np.append(starts, length - tile_size))
+
+
+def tile_windows(height, width, tile_size, overlap):
+    """
+    Okna kafelków w pikselach (T, 4): [y0, x0, y1, x1]
+    """
+    stride = max(1, int(round(tile_size * (1.0 - overlap))))
+    ys, xs = np.meshgrid(_starts(height, tile_size, stride), _starts(width, tile_size, stride), indexing='ij')
+    ys, xs = ys.ravel(), xs.ravel()
+    return np.stack([ys, xs, np.minimum(ys + tile_size, height), np.minimum(xs + tile_size, width)], axis=1)
+
+
+def prepare_tiles(source, model_input_size=(320, 320), display_max_size=1280, options=None):
+    """
+    Dekodowanie obrazu i pocięcie go na kafelki o rozmiarze wejścia modelu
+    """
+    options = options or get_options()
+    image, original_size = decode_for_display(source, options['max_decode_size'])
+    height, width = image.shape[:2]
+
+    windows = tile_windows(height, width, options['tile_size'], options['overlap'])
+    tiles = [prepare_model_input(image[y0:y1, x0:x1], model_input_size) for y0, x0, y1, x1 in windows]
+    normalized = windows.astype(np.float32) / np.array([height, width, height, width], dtype=np.float32)
+    if options['include_full_image'] and len(windows) > 1:
+        tiles.append(prepare_model_input(image, model_input_size))
+        normalized = np.vstack([normalized, np.array([[0.0, 0.0, 1.0, 1.0]], dtype=np.float32)])
+
+    display_height, display_width = _fit_within(height, width, display_max_size)
+    if (display_height, display_width) != (height, width):
+        import cv2
+
+        display = cv2.resize(image, (display_width, display_height), interpolation=cv2.INTER_AREA)
+    else:
+        display = image
+    return TiledImage(display, np.stack(tiles), normalized, original_size)
+
+
+def merge_tile_results(results, windows):
+    """
+    Wyniki modelu dla kafelków (T, K, ...) jako wynik jednego obrazu (1, T*K, ...)
+
+    Ramki przeliczane są z układu kafelka na układ całego obrazu; duplikaty
+    usuwa później NMS w postprocess_batch.
+    """
+    boxes = np.asarray(results['detection_boxes'], dtype=np.float32)
+    origin = windows[:, None, [0, 1, 0, 1]]
+    extent = (windows[:, [2, 3, 2, 3]] - windows[:, [0, 1, 0, 1]])[:, None, :]
+    boxes = origin + boxes * extent
+    return {
+        'detection_boxes': boxes.reshape(1, -1, 4),
+        'detection_scores': np.asarray(results['detection_scores']).reshape(1, -1),
+        'detection_classes': np.asarray(results['detection_classes']).reshape(1, -1),
+        'num_detections': np.array([np.sum(results['num_detections'])], dtype=np.float32),
+    }
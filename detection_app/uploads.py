@@ -0,0 +1,127 @@
+"""
+Przyjmowanie przesyłanych obrazów bez wczytywania ich do pamięci
+
+Pliki zapisywane są na dysk fragmentami, a skrót SHA-256 liczony jest w tym
+samym przebiegu (HashingTemporaryFileUploadHandler). Format i wymiary
+odczytywane są z samego nagłówka, zanim cokolwiek zostanie zdekodowane, a
+dekoder czyta plik przez mmap zamiast z kopii w obiekcie bytes.
+"""
+import hashlib
+import mmap
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+DEFAULT_MAX_IMAGE_PIXELS = 40_000_000
+
+ImageInfo = namedtuple('ImageInfo', ['format', 'width', 'height'])
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Zapis przesyłanego pliku do pliku tymczasowego z liczeniem SHA-256
+
+    Gotowy plik ma atrybut content_hash, więc formularz nie czyta go
+    ponownie tylko po to, żeby policzyć skrót.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.content_hash = self._digest.hexdigest()
+        return uploaded_file
+
+
+def max_image_pixels():
+    return getattr(settings, 'DETECTION_MAX_IMAGE_PIXELS', DEFAULT_MAX_IMAGE_PIXELS)
+
+
+def probe_image(source):
+    """
+    Format i wymiary z nagłówka pliku (bez dekodowania pikseli)
+
+    Pozycja strumienia jest przywracana. ValueError dla pliku, który nie
+    jest obsługiwanym obrazem.
+    """
+    position = source.tell()
+    try:
+        with Image.open(source) as image:
+            width, height = image.size
+            return ImageInfo(image.format, width, height)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Nie można odczytać obrazu: {e}") from e
+    finally:
+        source.seek(position)
+
+
+def check_upload_size(uploaded_file, max_size=None):
+    """
+    Limit rozmiaru przesyłanego pliku (DETECTION_MAX_UPLOAD_SIZE); ValueError
+    z limitem w czytelnej postaci - ten sam komunikat w formularzach i API
+    """
+    max_size = max_size or settings.DETECTION_MAX_UPLOAD_SIZE
+    if uploaded_file.size > max_size:
+        raise ValueError(f"Obraz nie może być większy niż {filesizeformat(max_size)}")
+
+
+def check_image(source, max_pixels=None):
+    """
+    Sprawdzenie nagłówka obrazu i limitu liczby pikseli; ValueError przy przekroczeniu
+    """
+    info = probe_image(source)
+    max_pixels = max_pixels or max_image_pixels()
+    if info.width * info.height > max_pixels:
+        raise ValueError(
+            f"Obraz ma zbyt dużą rozdzielczość ({info.width}x{info.height}, "
+            f"maksymalnie {max_pixels / 1e6:.0f} Mpx)"
+        )
+    return info
+
+
+def _local_path(file):
+    """
+    Ścieżka pliku na dysku lokalnym albo None (pamięć, zdalny magazyn)
+    """
+    if hasattr(file, 'temporary_file_path'):
+        return file.temporary_file_path()
+    try:
+        return file.path
+    except (AttributeError, NotImplementedError, ValueError):
+        return None
+
+
+@contextmanager
+def open_mapped(file):
+    """
+    Plik obrazu (FieldFile lub przesłany plik) zmapowany w pamięci tylko do odczytu
+
+    Dekoder czyta strony pliku bezpośrednio z pamięci podręcznej systemu.
+    Pliki spoza dysku lokalnego (i puste) otwierane są zwykłym strumieniem.
+    """
+    path = _local_path(file)
+    if path is None:
+        with file.open('rb') as stream:
+            yield stream
+        return
+
+    with open(path, 'rb') as stream:
+        try:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield stream
+            return
+        try:
+            yield mapped
+        finally:
+            mapped.close()
@@ -1,7 +1,8 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 from . import views
 
@@ -21,8 +22,31 @@ urlpatterns = [
     #Detekcja obiektów
     path('detect/', views.object_detection_upload, name='object_detection_upload'),
     path('detect/<int:image_id>/', views.object_detection_process, name='object_detection_process'),
+    path('detect/bulk/', views.object_detection_bulk_upload, name='object_detection_bulk_upload'),
+    path('detect/batch/<int:batch_id>/', views.object_detection_batch, name='object_detection_batch'),
+    path('detect/batch/<int:batch_id>/status/', views.object_detection_batch_status, name='object_detection_batch_status'),
+    path('detect/video/', views.video_detection_upload, name='video_detection_upload'),
+    path('detect/video/<int:video_id>/', views.video_detection_detail, name='video_detection_detail'),
+    path('detect/video/<int:video_id>/status/', views.video_detection_status, name='video_detection_status'),
+    path('detect/video/<int:video_id>/detections/', views.video_detection_results, name='video_detection_results'),
     path('detect/history/', views.object_detection_history, name='object_detection_history'),
+    path('detect/history/api/', views.object_detection_history_api, name='object_detection_history_api'),
+    path('detect/objects/', views.object_search, name='object_search'),
     path('detect/<int:image_id>/', views.object_detection_detail, name='object_detection_detail'),
+    path('detect/<int:image_id>/status/', views.object_detection_status, name='object_detection_status'),
+    path('detect/<int:image_id>/events/', views.object_detection_events, name='object_detection_events'),
+    path('detect/api/upload/', views.object_detection_upload_api, name='object_detection_upload_api'),
+    path('detect/<int:image_id>/render/', views.object_detection_render, name='object_detection_render'),
+    path('detect/<int:image_id>/threshold/', views.object_detection_threshold, name='object_detection_threshold'),
+    path('detect/<int:image_id>/overlay/', views.object_detection_overlay, name='object_detection_overlay'),
+    path('detect/<int:image_id>/derivative/<str:kind>/<str:size_name>/', views.object_detection_derivative, name='object_detection_derivative'),
+    path('detect/models/', views.model_registry_status, name='model_registry_status'),
+    path('detect/dedup/', views.dedup_status, name='dedup_status'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    
+    # API dla klientów maszynowych (token w nagłówku Authorization)
+    path('api/v1/detect/', views.api_detect, name='api_detect'),
+    path('api/v1/detect/<int:image_id>/', views.api_result, name='api_result'),
     
     # Reset hasła
     path('password-reset/', 
@@ -38,5 +62,8 @@ urlpatterns = [
          auth_views.PasswordResetCompleteView.as_view(template_name='registration/password_reset_complete.html'), 
          name='password_reset_complete'),
 ]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+
+# Pliki z MEDIA_ROOT: ETag, długi cache i Range (albo X-Sendfile / X-Accel-Redirect)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), views.serve_media, name='media'),
+]
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+Detekcja obiektów w nagraniach wideo
+
+Klatki czytane są generatorem (OpenCV), próbkowane z zadaną częstotliwością
+i wysyłane do modelu paczkami. Wykrycia dopisywane są przyrostowo do pliku
+binarnego o stałym formacie rekordu, więc zużycie pamięci nie zależy od
+długości nagrania.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .labels import COCO_CLASSES
+from .model_registry import get_detector
+from .postprocess import postprocess_batch
+
+# Jeden rekord na wykrycie - 20 bajtów zamiast ~150 w JSON
+VIDEO_DETECTION_DTYPE = np.dtype([
+    ('frame', '<u4'),
+    ('timestamp', '<f4'),
+    ('class_id', '<u2'),
+    ('score', '<f2'),
+    ('box', '<f2', (4,)),
+])
+
+RESULTS_DIR = 'detection_videos/results'
+
+
+def iter_frames(path, sample_fps):
+    """
+    Generator próbkowanych klatek: (numer klatki, czas w sekundach, obraz RGB)
+
+    Pomijane klatki są tylko pobierane (grab), bez dekodowania do obrazu.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Nie można otworzyć nagrania: {path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        step = max(1, int(round(fps / sample_fps))) if sample_fps > 0 else 1
+        index = 0
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield index, index / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            index += 1
+    finally:
+        capture.release()
+
+
+def probe(path):
+    """
+    Liczba klatek i fps nagrania z nagłówka kontenera
+    """
+    capture = cv2.VideoCapture(path)
+    try:
+        return int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), capture.get(cv2.CAP_PROP_FPS) or 25.0
+    finally:
+        capture.release()
+
+
+def iter_batches(frames, batch_size):
+    batch = []
+    for item in frames:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def to_records(detections, frame_numbers, timestamps):
+    """
+    Wykrycia paczki (postprocess.DETECTION_DTYPE) jako rekordy VIDEO_DETECTION_DTYPE
+    """
+    records = np.empty(len(detections), dtype=VIDEO_DETECTION_DTYPE)
+    records['frame'] = frame_numbers[detections['image']]
+    records['timestamp'] = timestamps[detections['image']]
+    records['class_id'] = detections['class_id']
+    records['score'] = detections['score']
+    records['box'] = detections['box']
+    return records
+
+
+def process_video(detection_video, detector=None, batch_size=None):
+    """
+    Przetworzenie całego nagrania; postęp zapisywany w bazie co paczkę
+    """
+    from .pipeline import _infer
+
+    options = getattr(settings, 'DETECTION_VIDEO', {})
+    batch_size = batch_size or options.get('batch_size', 8)
+    model_height, model_width = getattr(settings, 'DETECTION_PREPROCESS', {}).get('model_input_size', (320, 320))
+    detector = detector or get_detector(detection_video.model_name)
+    video_path = detection_video.video.path
+
+    frames_total, fps = probe(video_path)
+    sampled_total = int(frames_total / max(1, round(fps / detection_video.sample_fps))) if frames_total else 0
+
+    results_name = f'{RESULTS_DIR}/video_{detection_video.id}.bin'
+    results_path = os.path.join(settings.MEDIA_ROOT, results_name)
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+
+    class_counts = np.zeros(max(COCO_CLASSES) + 1, dtype=np.int64)
+    frames_processed = 0
+    objects_detected = 0
+    start_time = time.perf_counter()
+
+    with open(results_path, 'wb') as results_file:
+        for batch in iter_batches(iter_frames(video_path, detection_video.sample_fps), batch_size):
+            frame_numbers = np.array([frame for frame, _, _ in batch], dtype=np.uint32)
+            timestamps = np.array([timestamp for _, timestamp, _ in batch], dtype=np.float32)
+            inputs = [
+                cv2.resize(image, (model_width, model_height), interpolation=cv2.INTER_AREA)
+                for _, _, image in batch
+            ]
+            # Pełne klatki nie są już potrzebne - tylko małe wejścia modelu
+            del batch
+
+            results = _infer(inputs, detection_video.model_name, detector)
+            detections = postprocess_batch(
+                results['detection_boxes'],
+                results['detection_scores'],
+                results['detection_classes'],
+                confidence_threshold=detection_video.confidence_threshold,
+                **getattr(settings, 'DETECTION_POSTPROCESS', {})
+            )
+            to_records(detections, frame_numbers, timestamps).tofile(results_file)
+            results_file.flush()
+
+            np.add.at(class_counts, np.clip(detections['class_id'], 0, len(class_counts) - 1), 1)
+            frames_processed += len(frame_numbers)
+            objects_detected += len(detections)
+            elapsed = time.perf_counter() - start_time
+            # started_at odświeżany po każdej paczce - requeue_stale nie przejmie
+            # długiego nagrania, dopóki worker robi postęp
+            type(detection_video).objects.filter(id=detection_video.id).update(
+                started_at=timezone.now(),
+                frames_processed=frames_processed,
+                frames_total=sampled_total,
+                objects_detected=objects_detected,
+                processing_fps=frames_processed / elapsed if elapsed else 0.0,
+            )
+
+    elapsed = time.perf_counter() - start_time
+    detection_video.results_file = results_name
+    detection_video.frames_total = frames_processed
+    detection_video.frames_processed = frames_processed
+    detection_video.objects_detected = objects_detected
+    detection_video.processing_fps = frames_processed / elapsed if elapsed else 0.0
+    detection_video.summary = {
+        'source_fps': fps,
+        'duration': frames_total / fps if fps else 0.0,
+        'classes': {
+            COCO_CLASSES.get(class_id, 'unknown'): int(count)
+            for class_id, count in enumerate(class_counts) if count
+        },
+    }
+    detection_video.processed_at = timezone.now()
+    detection_video.status = detection_video.STATUS_DONE
+    detection_video.error_message = ''
+    detection_video.save()
+    return detection_video
+
+
+def read_detections(detection_video, start_frame=None, end_frame=None):
+    """
+    Wykrycia z zakresu klatek - plik mapowany w pamięci, bez wczytywania całości
+    """
+    if not detection_video.results_file:
+        return np.empty(0, dtype=VIDEO_DETECTION_DTYPE)
+    path = detection_video.results_file.path
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=VIDEO_DETECTION_DTYPE)
+
+    records = np.memmap(path, dtype=VIDEO_DETECTION_DTYPE, mode='r')
+    # Rekordy zapisywane są w kolejności klatek - wystarczy wyszukiwanie binarne
+    frames = records['frame']
+    start = np.searchsorted(frames, start_frame, side='left') if start_frame is not None else 0
+    end = np.searchsorted(frames, end_frame, side='right') if end_frame is not None else len(records)
+    return np.array(records[start:end])
+
+
+def records_to_json(records):
+    return [
+        {
+            'frame': frame,
+            'timestamp': round(timestamp, 3),
+            'class_id': class_id,
+            'class_name': COCO_CLASSES.get(class_id, 'unknown'),
+            'confidence': round(score, 4),
+            'bbox': [round(coord, 4) for coord in box],
+        }
+        for frame, timestamp, class_id, score, box in zip(
+            records['frame'].tolist(),
+            records['timestamp'].tolist(),
+            records['class_id'].tolist(),
+            records['score'].astype(np.float32).tolist(),
+            records['box'].astype(np.float32).tolist(),
+        )
+    ]
@@ -3,14 +3,22 @@ from django.contrib.auth import login, authenticate, update_session_auth_hash
 from django.contrib.auth import logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .forms import CustomUserCreationForm, UserProfileForm, UserUpdateForm, CustomPasswordChangeForm, ImageUploadForm
+from .forms import CustomUserCreationForm, UserProfileForm, UserUpdateForm, CustomPasswordChangeForm, ImageUploadForm, BulkImageUploadForm, VideoUploadForm
 from django.utils import timezone
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
-from .models import CustomUser, UserProfile, DetectionImage
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, Http404
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from .models import CustomUser, UserProfile, DetectionImage, DetectionBatch, DetectionVideo
+from django.conf import settings
+from .model_registry import registry
+from . import api, dedup, bulk, async_detection, rendering, derivatives, detected_objects, pagination, http_cache, media, raw_results
+from .labels import COCO_CLASSES
+from .metrics import render_prometheus
+import hmac
 import os
-import time as time_module
-from .object_detector import ObjectDetector, COCO_CLASSES
-from django.core.paginator import Paginator
 
 
 def register_view(request):
@@ -174,12 +182,9 @@ def object_detection_upload(request):
     if request.method == 'POST':
         form = ImageUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            # Zapisz obraz bez commita
-            detection_image = form.save(commit=False)
-            detection_image.user = request.user
-            detection_image.save()
+            detection_image = _save_upload(form, request.user)
             
-            # Przekieruj do przetwarzania
+            # Detekcja wykonywana jest przez workera - strona wyników odpytuje status
             return redirect('object_detection_process', image_id=detection_image.id)
         else:
             messages.error(request, 'Popraw błędy w formularzu.')
@@ -197,104 +202,548 @@ def object_detection_upload(request):
     return render(request, 'detect/object_detection_upload.html', context)
 
 
-@login_required
-def object_detection_process(request, image_id):
+def _save_upload(form, user):
     """
-    Widok przetwarzania obrazu i wyświetlania wyników
+    Zapis przesłanego obrazu: wspólny plik i gotowe wyniki dla identycznej
+    zawartości, w przeciwnym razie obraz trafia do kolejki
     """
-    detection_image = get_object_or_404(DetectionImage, id=image_id, user=request.user)
+    # Zapisz obraz bez commita
+    detection_image = form.save(commit=False)
+    detection_image.user = user
+    detection_image.original_filename = os.path.basename(detection_image.original_image.name)
+    detection_image.confidence_threshold = settings.DETECTION_CONFIDENCE_THRESHOLD
     
-    # Sprawdź czy obraz był już przetwarzany
-    if detection_image.processed_image and detection_image.detection_results:
-        return render(request, 'detect/object_detection_results.html', {
-            'detection_image': detection_image,
-            'active_tab': 'detection'
-        })
+    # Identyczna zawartość: wspólny plik na dysku i gotowe wyniki bez inferencji
+    dedup.share_original(detection_image)
+    reused = dedup.reuse_result(detection_image)
+    if not reused:
+        detection_image.status = DetectionImage.STATUS_QUEUED
+    detection_image.save()
+    if reused:
+        detected_objects.replace_objects([detection_image])
+    return detection_image
+
+
+def _upload_from_request(request):
+    form = ImageUploadForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return None, form.errors.get_json_data()
+    return _save_upload(form, request.user), None
+
+
+def _preview_filter(request, detection_image):
+    """
+    Podgląd wyników z innym progiem lub filtrem klas (?threshold=&classes=)
+    z zapisanego wyjścia modelu; zwraca wariant do kluczy cache i ETagów
+    """
+    threshold, class_ids = raw_results.parse_filter(request.GET.get('threshold'), request.GET.get('classes'))
+    if threshold is None and class_ids is None:
+        return ''
+    if not raw_results.is_available(detection_image):
+        raise ValueError("Dla tego obrazu nie zapisano pełnych wyników modelu")
+    raw_results.preview(detection_image, threshold, class_ids)
+    return raw_results.variant(threshold, class_ids)
+
+
+@async_detection.async_login_required
+async def object_detection_upload_api(request):
+    """
+    Przesłanie obrazu bez przeładowania strony (async) - odpowiedź zawiera
+    adresy statusu i strumienia postępu
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    # Formularz i zapis pliku wykonywane są poza pętlą zdarzeń
+    detection_image, errors = await sync_to_async(_upload_from_request)(request)
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
     
-    # Przetwarzanie obrazu
+    if not detection_image.is_finished:
+        try:
+            async_detection.start_detection(detection_image.id)
+        except async_detection.ExecutorBusy:
+            # Zadanie zostanie zlecone ponownie przez strumień postępu
+            pass
+    return JsonResponse({
+        **async_detection.status_payload(detection_image),
+        'status_url': reverse('object_detection_status', args=[detection_image.id]),
+        'events_url': reverse('object_detection_events', args=[detection_image.id]),
+        'results_url': reverse('object_detection_process', args=[detection_image.id]),
+    }, status=202)
+
+
+@async_detection.async_login_required
+async def object_detection_process(request, image_id):
+    """
+    Widok wyników detekcji - w trakcie przetwarzania strona śledzi postęp
+    (strumień SSE pod ASGI, odpytywanie statusu pod WSGI)
+    """
     try:
-        start_time = time_module.time()
-        
-        # Inicjalizacja detektora
-        MODEL_URL = "https://tfhub.dev/tensorflow/ssd_mobilenet_v2/2"
-        detector = ObjectDetector(MODEL_URL)
-        
-        # Wczytanie i przygotowanie obrazu
-        original_image, image_tensor = detector.load_and_preprocess_from_file(
-            detection_image.original_image.file
-        )
-        
-        # Wykonanie detekcji
-        results = detector.detect_objects(image_tensor)
-        
-        # Przetworzenie wyników
-        boxes, scores, classes = detector.process_detections(results, confidence_threshold=0.5)
-        
-        # Przygotowanie wyników do zapisu
-        detection_results = []
-        for i, (box, score, class_id) in enumerate(zip(boxes, scores, classes)):
-            class_name = COCO_CLASSES.get(class_id, 'unknown')
-            detection_results.append({
-                'id': i + 1,
-                'class_id': int(class_id),
-                'class_name': class_name,
-                'confidence': float(score),
-                'bbox': [float(coord) for coord in box]
-            })
-        
-        # Rysowanie detekcji na obrazie
-        image_with_detections = detector.draw_detections(
-            original_image, boxes, scores, classes, COCO_CLASSES
-        )
-        
-        # Zapis przetworzonego obrazu
-        filename = f"processed_{detection_image.id}_{os.path.basename(detection_image.original_image.name)}"
-        processed_image_path = detector.save_processed_image(image_with_detections, filename)
-        
-        # Aktualizacja modelu
-        processing_time = time_module.time() - start_time
-        
-        detection_image.processed_image = processed_image_path
-        detection_image.detection_results = {
-            'objects': detection_results,
-            'total_objects': len(detection_results),
-            'confidence_threshold': 0.5
-        }
-        detection_image.objects_detected = len(detection_results)
-        detection_image.processing_time = processing_time
-        detection_image.processed_at = timezone.now()
-        detection_image.save()
-        
-        messages.success(request, f'Detekcja zakończona sukcesem! Znaleziono {len(detection_results)} obiektów.')
-        
-    except Exception as e:
-        messages.error(request, f'Wystąpił błąd podczas przetwarzania obrazu: {str(e)}')
-        return redirect('object_detection_upload')
+        detection_image = await DetectionImage.objects.aget(id=image_id, user=request.user)
+    except DetectionImage.DoesNotExist:
+        raise Http404
+    
+    # Zakończone przetworzenie się nie zmienia - przeglądarka z aktualną
+    # kopią strony dostaje 304 bez renderowania szablonu
+    use_events = isinstance(request, ASGIRequest)
+    try:
+        # Dekodowanie zapisanych wyników i ponowne filtrowanie poza pętlą zdarzeń
+        variant = await sync_to_async(_preview_filter)(request, detection_image)
+    except ValueError as e:
+        variant = ''
+        messages.error(request, str(e))
+    etag = await sync_to_async(http_cache.result_etag)(request, detection_image, use_events, variant, page=True)
+    response = http_cache.not_modified(request, etag)
+    if response is not None:
+        return response
+    
+    # Bez workera (DETECTION_ASYNC = False) detekcja wykonywana jest w puli
+    # wątków widoków - żądanie nie czeka na inferencję
+    if detection_image.status == DetectionImage.STATUS_QUEUED:
+        try:
+            async_detection.start_detection(detection_image.id)
+        except async_detection.ExecutorBusy:
+            messages.warning(request, 'Serwer jest obciążony - detekcja rozpocznie się za chwilę.')
+    
+    if detection_image.status == DetectionImage.STATUS_FAILED:
+        messages.error(request, f'Wystąpił błąd podczas przetwarzania obrazu: {detection_image.error_message}')
     
     context = {
         'detection_image': detection_image,
+        # Strumień postępu tylko pod ASGI - pod WSGI zająłby wątek serwera
+        'use_events': use_events,
+        # Zmiana progu i filtra klas bez ponownej inferencji
+        'can_refilter': raw_results.is_available(detection_image),
+        'filter_query': request.GET.urlencode() if variant else '',
+        'filter_classes': ','.join(
+            COCO_CLASSES.get(class_id, str(class_id))
+            for class_id in detection_image.detection_results.get('classes', [])
+        ),
+        'active_tab': 'detection'
+    }
+    response = await sync_to_async(render)(request, 'detect/object_detection_results.html', context)
+    return http_cache.set_validators(response, etag)
+
+
+@async_detection.async_login_required
+async def object_detection_status(request, image_id):
+    """
+    Lekki endpoint JSON ze stanem zadania detekcji (odpytywany przez stronę wyników)
+    """
+    try:
+        return JsonResponse(await async_detection.get_status(image_id, request.user))
+    except DetectionImage.DoesNotExist:
+        raise Http404
+
+
+@async_detection.async_login_required
+async def object_detection_events(request, image_id):
+    """
+    Postęp i wynik detekcji jako Server-Sent Events
+    """
+    if not await DetectionImage.objects.filter(id=image_id, user=request.user).aexists():
+        raise Http404
+    return async_detection.event_stream_response(async_detection.progress_events(image_id, request.user))
+
+
+@login_required
+def object_detection_render(request, image_id):
+    """
+    Obraz z naniesionymi wykryciami renderowany na żądanie (?size=&format=)
+    """
+    detection_image = get_object_or_404(
+        DetectionImage, id=image_id, user=request.user, status=DetectionImage.STATUS_DONE
+    )
+    try:
+        size, image_format = rendering.normalize_request(request.GET.get('size'), request.GET.get('format'))
+        variant = _preview_filter(request, detection_image)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    etag = http_cache.result_etag(request, detection_image, 'render', size, image_format, variant)
+    last_modified = http_cache.result_last_modified(detection_image)
+    response = http_cache.not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    data, content_type = rendering.get_rendered(detection_image, size, image_format, variant)
+    return http_cache.set_validators(HttpResponse(data, content_type=content_type), etag, last_modified)
+
+
+@login_required
+@require_http_methods(['POST'])
+def object_detection_threshold(request, image_id):
+    """
+    Zapis wyników dla nowego progu pewności i filtra klas - z zapisanego
+    wyjścia modelu, bez ponownej inferencji
+    """
+    detection_image = get_object_or_404(
+        DetectionImage, id=image_id, user=request.user, status=DetectionImage.STATUS_DONE
+    )
+    try:
+        threshold, class_ids = raw_results.parse_filter(request.POST.get('threshold'), request.POST.get('classes'))
+        if not raw_results.is_available(detection_image):
+            raise ValueError("Dla tego obrazu nie zapisano pełnych wyników modelu")
+        raw_results.apply(detection_image, threshold, class_ids)
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(
+            request,
+            f'Zapisano wyniki dla progu {detection_image.confidence_threshold} '
+            f'({detection_image.objects_detected} obiektów).'
+        )
+    return redirect('object_detection_process', image_id=detection_image.id)
+
+
+@login_required
+def object_detection_overlay(request, image_id):
+    """
+    Geometria ramek do narysowania nakładki w przeglądarce
+    """
+    detection_image = get_object_or_404(
+        DetectionImage.objects.only(
+            'id', 'user_id', 'original_image', 'detection_results', 'raw_output', 'status', 'processed_at',
+            'confidence_threshold'
+        ),
+        id=image_id, user=request.user, status=DetectionImage.STATUS_DONE
+    )
+    try:
+        variant = _preview_filter(request, detection_image)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    etag = http_cache.result_etag(request, detection_image, 'overlay', variant)
+    last_modified = http_cache.result_last_modified(detection_image)
+    response = http_cache.not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    return http_cache.set_validators(
+        JsonResponse(rendering.overlay_geometry(detection_image)), etag, last_modified
+    )
+
+
+@login_required
+def object_detection_derivative(request, image_id, kind, size_name):
+    """
+    Miniatura lub obraz pośredni - generowany przy pierwszym żądaniu
+    """
+    detection_image = get_object_or_404(DetectionImage, id=image_id, user=request.user)
+    if not derivatives.is_available(detection_image, kind):
+        raise Http404
+    try:
+        name = derivatives.generate(detection_image, kind, size_name)
+    except ValueError:
+        raise Http404
+    # Nazwa pliku zawiera wersję - plik można trzymać w cache przeglądarki
+    return media.serve_file(request, name, public=False)
+
+
+@login_required
+def object_detection_bulk_upload(request):
+    """
+    Zbiorcze przesyłanie wielu obrazów lub archiwum ZIP jako jednej paczki
+    """
+    if request.method == 'POST':
+        form = BulkImageUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            entries = bulk.iter_uploads(form.cleaned_data['images'], form.cleaned_data.get('archive'))
+            batch = bulk.create_batch(
+                request.user, entries, name=form.cleaned_data['name'], model_name=form.cleaned_data['model_name']
+            )
+            if not batch.total_images:
+                batch.delete()
+                messages.error(request, 'Nie znaleziono obsługiwanych obrazów.')
+                return redirect('object_detection_bulk_upload')
+            messages.success(request, f'Przesłano {batch.total_images} obrazów do analizy.')
+            return redirect('object_detection_batch', batch_id=batch.id)
+        else:
+            messages.error(request, 'Popraw błędy w formularzu.')
+    else:
+        form = BulkImageUploadForm()
+    
+    context = {
+        'form': form,
+        'user_batches': DetectionBatch.objects.filter(user=request.user)[:5],
+        'active_tab': 'detection'
+    }
+    return render(request, 'detect/object_detection_bulk_upload.html', context)
+
+
+@login_required
+def object_detection_batch(request, batch_id):
+    """
+    Postęp przetwarzania całej paczki obrazów
+    """
+    batch = get_object_or_404(DetectionBatch, id=batch_id, user=request.user)
+    counts = batch.status_counts()
+    
+    context = {
+        'batch': batch,
+        'counts': counts,
+        'finished': counts[DetectionImage.STATUS_DONE] + counts[DetectionImage.STATUS_FAILED],
+        'images': batch.images.defer('detection_results', 'raw_output').order_by('id'),
+        'active_tab': 'detection'
+    }
+    return render(request, 'detect/object_detection_batch.html', context)
+
+
+@login_required
+def object_detection_batch_status(request, batch_id):
+    """
+    Stan paczki w JSON (odpytywany przez stronę postępu)
+    """
+    batch = get_object_or_404(DetectionBatch, id=batch_id, user=request.user)
+    counts = batch.status_counts()
+    finished = counts[DetectionImage.STATUS_DONE] + counts[DetectionImage.STATUS_FAILED]
+    return JsonResponse({
+        'id': batch.id,
+        'total': batch.total_images,
+        'counts': counts,
+        'finished': finished,
+        'complete': finished >= batch.total_images,
+    })
+
+
+@login_required
+def video_detection_upload(request):
+    """
+    Przesyłanie nagrania wideo - przetwarzane w tle przez workera
+    """
+    if request.method == 'POST':
+        form = VideoUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            detection_video = form.save(commit=False)
+            detection_video.user = request.user
+            detection_video.confidence_threshold = settings.DETECTION_CONFIDENCE_THRESHOLD
+            detection_video.save()
+            return redirect('video_detection_detail', video_id=detection_video.id)
+        else:
+            messages.error(request, 'Popraw błędy w formularzu.')
+    else:
+        form = VideoUploadForm()
+    
+    context = {
+        'form': form,
+        'user_videos': DetectionVideo.objects.filter(user=request.user)[:5],
+        'active_tab': 'detection'
+    }
+    return render(request, 'detect/video_detection_upload.html', context)
+
+
+@login_required
+def video_detection_detail(request, video_id):
+    """
+    Postęp i podsumowanie detekcji w nagraniu
+    """
+    detection_video = get_object_or_404(DetectionVideo, id=video_id, user=request.user)
+    if detection_video.status == DetectionVideo.STATUS_FAILED:
+        messages.error(request, f'Wystąpił błąd podczas przetwarzania nagrania: {detection_video.error_message}')
+    
+    context = {
+        'detection_video': detection_video,
         'active_tab': 'detection'
     }
-    return render(request, 'detect/object_detection_results.html', context)
+    return render(request, 'detect/video_detection_detail.html', context)
+
+
+@login_required
+def video_detection_status(request, video_id):
+    """
+    Stan przetwarzania nagrania w JSON
+    """
+    detection_video = get_object_or_404(DetectionVideo, id=video_id, user=request.user)
+    return JsonResponse({
+        'id': detection_video.id,
+        'status': detection_video.status,
+        'finished': detection_video.is_finished,
+        'frames_processed': detection_video.frames_processed,
+        'frames_total': detection_video.frames_total,
+        'objects_detected': detection_video.objects_detected,
+        'processing_fps': detection_video.processing_fps,
+        'error': detection_video.error_message,
+    })
+
+
+@login_required
+def video_detection_results(request, video_id):
+    """
+    Wykrycia dla zakresu klatek (?start_frame=&end_frame=) w JSON
+
+    Zakres ograniczony jest do max_result_frames klatek i max_result_records
+    rekordów. Odpowiedź kończy się na granicy klatki; tylko klatka z większą
+    liczbą wykryć niż limit dzielona jest na części - wtedy start_record
+    (pozycja w klatce start_frame) wskazuje dalszy ciąg. Kolejną część
+    zwraca zapytanie z next_start_frame i next_start_record.
+    """
+    from .video import read_detections, records_to_json
+    
+    detection_video = get_object_or_404(DetectionVideo, id=video_id, user=request.user)
+    options = getattr(settings, 'DETECTION_VIDEO', {})
+    max_frames = options.get('max_result_frames', 500)
+    max_records = options.get('max_result_records', 10000)
+    try:
+        start_frame = int(request.GET.get('start_frame', 0))
+        start_record = int(request.GET.get('start_record', 0))
+        end_frame = int(request.GET['end_frame']) if 'end_frame' in request.GET else start_frame + max_frames - 1
+    except ValueError:
+        return JsonResponse({'error': 'Nieprawidłowy zakres klatek'}, status=400)
+    if start_frame < 0 or start_record < 0 or end_frame < start_frame:
+        return JsonResponse({'error': 'Nieprawidłowy zakres klatek'}, status=400)
+    end_frame = min(end_frame, start_frame + max_frames - 1)
+    
+    records = read_detections(detection_video, start_frame, end_frame)
+    if start_record:
+        # Rekordy klatki start_frame są na początku (kolejność klatek w pliku)
+        records = records[min(start_record, int((records['frame'] == start_frame).sum())):]
+    next_start_frame, next_start_record = end_frame + 1, 0
+    if len(records) > max_records:
+        next_start_frame = int(records['frame'][max_records])
+        first_frame = int(records['frame'][0])
+        if next_start_frame > first_frame:
+            # Obcięcie na granicy klatki
+            records = records[records['frame'] < next_start_frame]
+        else:
+            # Cała część to jedna klatka - dalszy ciąg od pozycji w klatce
+            records = records[:max_records]
+            next_start_record = max_records + (start_record if first_frame == start_frame else 0)
+    return JsonResponse({
+        'id': detection_video.id,
+        'start_frame': start_frame,
+        'start_record': start_record,
+        'end_frame': next_start_frame if next_start_record else next_start_frame - 1,
+        'next_start_frame': next_start_frame,
+        'next_start_record': next_start_record,
+        'detections': records_to_json(records),
+    })
 
 
 @login_required
 def object_detection_history(request):
     
-    user_images = DetectionImage.objects.filter(user=request.user).order_by('-uploaded_at')
+    user_images, class_id, min_confidence = _history_queryset(request)
+    
+    # Paginacja po kluczu (uploaded_at, id) - stały koszt strony niezależnie od jej numeru
+    try:
+        page = pagination.paginate(user_images, request.GET.get('after'), request.GET.get('before'), per_page=10)
+    except ValueError:
+        page = pagination.paginate(user_images, per_page=10)
+    detected_objects.attach_top_objects(page.items)
     
-    # Paginacja
-    paginator = Paginator(user_images, 10)  # 10 elementów na stronę
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Parametry filtrów zachowywane w linkach paginacji
+    filter_query = request.GET.copy()
+    for key in ('page', 'after', 'before'):
+        filter_query.pop(key, None)
     
     context = {
-        'user_images': page_obj,
+        'user_images': page,
+        'total_images': pagination.cached_count(user_images, f'history:{request.user.id}:{filter_query.urlencode()}'),
+        'class_choices': sorted(COCO_CLASSES.items(), key=lambda item: item[1]),
+        'selected_class': class_id,
+        'min_confidence': request.GET.get('min_confidence', ''),
+        'filter_query': filter_query.urlencode() + '&' if filter_query else '',
         'active_tab': 'history'
     }
     return render(request, 'detect/object_detection_history.html', context)
 
 
+def _object_filter(request):
+    """
+    Parametry ?class= i ?min_confidence= (niepoprawne wartości są pomijane)
+    """
+    class_id = min_confidence = None
+    if request.GET.get('class'):
+        try:
+            class_id = detected_objects.parse_class(request.GET['class'])
+        except ValueError:
+            messages.warning(request, f"Nieznana klasa obiektu: {request.GET['class']}")
+    if request.GET.get('min_confidence'):
+        try:
+            min_confidence = float(request.GET['min_confidence'])
+        except ValueError:
+            messages.warning(request, 'Niepoprawny próg pewności.')
+    return class_id, min_confidence
+
+
+def _history_queryset(request):
+    """
+    Obrazy użytkownika z filtrami historii - bez wczytywania pól JSON
+    """
+    user_images = (
+        DetectionImage.objects
+        .filter(user=request.user)
+        .defer('detection_results', 'raw_output', 'stage_timings')
+    )
+    
+    # Filtr statusu zadania
+    status_filter = request.GET.get('status')
+    if status_filter == 'completed':
+        user_images = user_images.filter(status=DetectionImage.STATUS_DONE)
+    elif status_filter == 'pending':
+        user_images = user_images.filter(status__in=[DetectionImage.STATUS_QUEUED, DetectionImage.STATUS_RUNNING])
+    
+    # Filtr wykrytych obiektów (tabela DetectedObject)
+    class_id, min_confidence = _object_filter(request)
+    user_images = detected_objects.filter_images(user_images, request.user, class_id, min_confidence)
+    return user_images, class_id, min_confidence
+
+
+@login_required
+def object_detection_history_api(request):
+    """
+    API historii z paginacją po kursorze (?after=<next_cursor>&limit=)
+    """
+    user_images, _, _ = _history_queryset(request)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 50)), 200))
+        page = pagination.paginate(user_images, request.GET.get('after'), request.GET.get('before'), per_page=limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'results': [
+            {
+                'id': image.id,
+                'status': image.status,
+                'uploaded_at': image.uploaded_at.isoformat(),
+                'processed_at': image.processed_at.isoformat() if image.processed_at else None,
+                'objects_detected': image.objects_detected,
+                'url': reverse('object_detection_process', args=[image.id]),
+            }
+            for image in page
+        ],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+@login_required
+def object_search(request):
+    """
+    API: obrazy użytkownika z obiektami danej klasy powyżej progu pewności
+    (?class=dog&min_confidence=0.8&limit=50)
+    """
+    try:
+        class_id = detected_objects.parse_class(request.GET['class']) if request.GET.get('class') else None
+        min_confidence = float(request.GET['min_confidence']) if request.GET.get('min_confidence') else None
+        limit = max(1, min(int(request.GET.get('limit', 50)), 500))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    rows = detected_objects.search(request.user, class_id, min_confidence, limit)
+    return JsonResponse({
+        'class_id': class_id,
+        'class_name': COCO_CLASSES.get(class_id) if class_id is not None else None,
+        'min_confidence': min_confidence,
+        'results': [
+            {
+                'image_id': row['image_id'],
+                'matches': row['matches'],
+                'best_confidence': row['best_confidence'],
+                'url': reverse('object_detection_process', args=[row['image_id']]),
+            }
+            for row in rows
+        ],
+    })
+
+
 @login_required
 def object_detection_detail(request, image_id):
     """
@@ -306,4 +755,107 @@ def object_detection_detail(request, image_id):
         'detection_image': detection_image,
         'active_tab': 'history'
     }
-    return render(request, 'detect/object_detection_detail.html', context)
\ No newline at end of file
+    return render(request, 'detect/object_detection_detail.html', context)
+
+
+@api.token_required
+@require_http_methods(['POST'])
+def api_detect(request):
+    """
+    API: detekcja dla jednego lub wielu obrazów (pola 'image'), format wyniku
+    według nagłówka Accept - JSON, NumPy .npz albo MessagePack
+    """
+    fmt = api.negotiate(request.META.get('HTTP_ACCEPT'))
+    if fmt is None:
+        return JsonResponse(
+            {'error': 'Nieobsługiwany format odpowiedzi', 'formats': list(api.CONTENT_TYPES.values())},
+            status=406
+        )
+    try:
+        results = api.detect_uploads(
+            request.user,
+            request.FILES.getlist('image'),
+            model_name=request.POST.get('model'),
+            threshold=request.POST.get('threshold'),
+            annotated=request.POST.get('annotated') in ('1', 'true'),
+        )
+    except api.ApiError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return api.serialize(results, fmt)
+
+
+@api.token_required
+@require_http_methods(['GET', 'HEAD'])
+def api_result(request, image_id):
+    """
+    API: zapisany wynik detekcji (w formacie według nagłówka Accept) z
+    walidatorami - klient z aktualną kopią dostaje 304
+    """
+    fmt = api.negotiate(request.META.get('HTTP_ACCEPT'))
+    if fmt is None:
+        return JsonResponse(
+            {'error': 'Nieobsługiwany format odpowiedzi', 'formats': list(api.CONTENT_TYPES.values())},
+            status=406
+        )
+    detection_image = get_object_or_404(DetectionImage, id=image_id, user=request.user)
+    annotated = request.GET.get('annotated') in ('1', 'true')
+    try:
+        variant = _preview_filter(request, detection_image)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    etag = http_cache.result_etag(request, detection_image, 'api', fmt, annotated, variant)
+    last_modified = http_cache.result_last_modified(detection_image)
+    response = http_cache.not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    response = api.serialize([api.stored_result(detection_image, annotated, variant)], fmt)
+    return http_cache.set_validators(response, etag, last_modified)
+
+
+@require_http_methods(['GET', 'HEAD'])
+def serve_media(request, path):
+    """
+    Pliki z MEDIA_ROOT z walidatorami, długim cache i obsługą Range
+    (albo przez X-Sendfile / X-Accel-Redirect - DETECTION_HTTP_CACHE)
+
+    Poza katalogami publicznymi pliki dostępne są tylko przy DEBUG (jak
+    wcześniej static()).
+    """
+    if not media.is_public(path) and not settings.DEBUG:
+        raise Http404
+    return media.serve_file(request, path)
+
+
+@staff_member_required
+def model_registry_status(request):
+    """
+    Statystyki załadowanych modeli: czas ładowania, rozgrzewania i pamięć
+    """
+    return JsonResponse(registry.stats())
+
+
+@staff_member_required
+def dedup_status(request):
+    """
+    Skuteczność deduplikacji przesyłanych obrazów
+    """
+    return JsonResponse(dedup.stats())
+
+
+def _metrics_allowed(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(authorization, f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+
+
+def metrics_view(request):
+    """
+    Metryki procesu w formacie tekstowym Prometheus
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'detection_app.settings')
 
 application = get_wsgi_application()
+
+# Model detekcji ładowany raz na proces, przed pierwszym żądaniem - tylko gdy
+# proces WWW wykonuje inferencję (DETECTION_PRELOAD_MODELS, DETECTION_ASYNC = False)
+from .model_registry import preload_models  # noqa: E402
+
+preload_models()